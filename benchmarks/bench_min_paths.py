@@ -0,0 +1,92 @@
+'''Benchmark of minimal isoform search on synthetic splice graphs.
+
+Compares get_min_isoforms.get_min_paths with the max flow based
+get_min_paths_maxflow on loci of 50 to 5000 edges.
+
+Please run from a program main directory:
+
+    python benchmarks/bench_min_paths.py [number of edges ...]
+
+'''
+
+import os
+import sys
+import time
+import random
+
+import networkx as nx
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import get_min_isoforms
+
+SIZES = [50, 200, 1000, 5000]
+MAX_SKIP = 4  # the maximum number of exons skipped by an edge
+TIME_LIMIT = 10.0  # seconds; larger loci are not run with max flow
+
+
+def make_locus(num_edges, seed=0):
+    '''Returns a splice graph of a locus with about num_edges edges.
+
+    Exons are connected in order and alternative splicing events
+    skip up to MAX_SKIP exons.
+
+    '''
+    random.seed(seed)
+    num_exons = max(num_edges / 2, 2)
+    exons = ['chr1:%d-%d' % (1000 + i * 500, 1100 + i * 500)
+                for i in range(num_exons)]
+
+    g = nx.DiGraph()
+    g.add_path(exons)
+    while g.number_of_edges() < num_edges:
+        i = random.randint(0, num_exons - 2)
+        j = min(i + random.randint(2, MAX_SKIP + 1), num_exons - 1)
+        g.add_edge(exons[i], exons[j])
+
+    g.add_edge('Start', exons[0])
+    g.add_edge(exons[-1], 'End')
+    for i in random.sample(range(1, num_exons - 1), num_exons / 20):
+        g.add_edge('Start', exons[i])  # alternative first exons
+    for i in random.sample(range(1, num_exons - 1), num_exons / 20):
+        g.add_edge(exons[i], 'End')  # alternative last exons
+
+    return g
+
+
+def run(func, g):
+    start = time.time()
+    paths = func(g, False)
+    return time.time() - start, len(paths)
+
+
+def main(sizes):
+    print '%8s %10s %10s %10s %10s %8s' % ('edges', 'paths', 'time(s)',
+                                    'mf_paths', 'mf_time(s)', 'speedup')
+    skip_maxflow = False
+    for num_edges in sizes:
+        g = make_locus(num_edges)
+        elapsed, num_paths = run(get_min_isoforms.get_min_paths, g)
+
+        if skip_maxflow:
+            print '%8d %10d %10.4f %10s %10s %8s' % (g.number_of_edges(),
+                                    num_paths, elapsed, '-', '-', '-')
+            continue
+
+        mf_elapsed, mf_num_paths = run(
+                            get_min_isoforms.get_min_paths_maxflow, g)
+        print '%8d %10d %10.4f %10d %10.4f %8.1f' % (g.number_of_edges(),
+                                num_paths, elapsed, mf_num_paths,
+                                mf_elapsed, mf_elapsed / elapsed)
+        sys.stdout.flush()
+        if mf_elapsed > TIME_LIMIT:
+            skip_maxflow = True
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main([int(size) for size in sys.argv[1:]])
+    else:
+        main(SIZES)
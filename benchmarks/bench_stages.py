@@ -0,0 +1,223 @@
+'''Benchmark of stages of assembly on synthetic alignments.
+
+Alignments of 100 to 2500 loci are generated with a fixed seed by
+generate_alignments.py, parsed and assembled, and calls and times of
+parse_psl, add_intron, collapse_exon, split_strand.split,
+build_gene_model and get_min_isoforms.get_min_paths are recorded
+with utils.profiler. The best time of --repeat runs is reported.
+
+Please run from a program main directory:
+
+    python benchmarks/bench_stages.py -o results.json [number of loci ...]
+
+Results are saved in JSON and can be compared with earlier results,
+reporting stages slower than --tolerance times the baseline:
+
+    python benchmarks/bench_stages.py --compare results.json
+
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+from collections import OrderedDict
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+import gimme
+from utils import profiler, split_strand, get_min_isoforms
+from utils.genome import open_genome
+
+import generate_alignments
+
+SCALES = [100, 500, 2500]
+STAGES = [(gimme, 'parse_psl', 'parse_psl'),
+            (gimme, 'add_intron', 'add_intron'),
+            (gimme, 'collapse_exon', 'collapse_exon'),
+            (split_strand, 'split', 'split_strand'),
+            (gimme, 'build_gene_model', 'build_gene_model'),
+            (get_min_isoforms, 'get_min_paths', 'get_min_paths')]
+
+
+def get_commit():
+    '''Returns a git commit of the program or None.'''
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short',
+                                        'HEAD'], stderr=open(os.devnull, 'w'),
+                                        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(alignment_file, genome_file):
+    '''Assembles alignments once and returns a Profiler.'''
+
+    prof = profiler.Profiler()
+    for module, attr, name in STAGES:
+        prof.patch(module, attr, name)
+    try:
+        genome = open_genome(genome_file)
+        align_db = gimme.read_alignment_db([alignment_file])
+        with open(os.devnull, 'w') as output:
+            gimme.assemble(genome, align_db, False, output=output,
+                            verbose=False,
+                            junctions=split_strand.JunctionCache())
+    finally:
+        prof.restore()
+    return prof
+
+
+def bench_scale(tmpdir, num_loci, options):
+    prefix = os.path.join(tmpdir, 'loci%d' % num_loci)
+    alignment_file, genome_file, num_reads = generate_alignments.generate(
+                                prefix, num_loci, options.exons,
+                                options.alt_splicing,
+                                options.single_exon_fraction,
+                                options.depth, options.seed)
+
+    best = None
+    for i in range(options.repeat):
+        start = time.time()
+        prof = run(alignment_file, genome_file)
+        elapsed = time.time() - start
+        stages = prof.report()['stages']
+        if best is None:
+            best = OrderedDict([('total', elapsed)])
+            best.update(stages)
+            continue
+        best['total'] = min(best['total'], elapsed)
+        for name, stage in stages.iteritems():
+            for key in ('wall_seconds', 'cpu_seconds'):
+                best[name][key] = min(best[name][key], stage[key])
+
+    total = best.pop('total')
+    return OrderedDict([('loci', num_loci),
+                        ('alignments', num_reads),
+                        ('total_seconds', round(total, 6)),
+                        ('stages', best)])
+
+
+def print_results(results):
+    print '%8s %10s  %-18s %10s %10s' % ('loci', 'alignments', 'stage',
+                                            'calls', 'time(s)')
+    for result in results:
+        print '%8d %10d  %-18s %10s %10.4f' % (result['loci'],
+                            result['alignments'], 'total', '-',
+                            result['total_seconds'])
+        for name, stage in result['stages'].iteritems():
+            print '%8s %10s  %-18s %10d %10.4f' % ('', '', name,
+                            stage['calls'], stage['wall_seconds'])
+
+
+def compare(results, baseline, tolerance):
+    '''Prints ratios of times to a baseline and returns
+    the number of stages slower than tolerance times the baseline.
+
+    '''
+    baseline = dict((result['loci'], result)
+                        for result in baseline['results'])
+    print '\n%8s  %-18s %10s %10s %8s' % ('loci', 'stage', 'base(s)',
+                                            'time(s)', 'ratio')
+    slower = 0
+    for result in results:
+        base = baseline.get(result['loci'])
+        if base is None:
+            continue
+        times = [('total', base['total_seconds'],
+                    result['total_seconds'])]
+        for name, stage in result['stages'].iteritems():
+            if name in base['stages']:
+                times.append((name, base['stages'][name]['wall_seconds'],
+                                stage['wall_seconds']))
+        for name, base_time, elapsed in times:
+            if not base_time:
+                continue
+            ratio = elapsed / base_time
+            flag = ''
+            if ratio > tolerance:
+                flag = ' SLOWER'
+                slower += 1
+            print '%8d  %-18s %10.4f %10.4f %8.2f%s' % (result['loci'],
+                                    name, base_time, elapsed, ratio, flag)
+    return slower
+
+
+def main(options):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        results = [bench_scale(tmpdir, num_loci, options)
+                        for num_loci in options.loci or SCALES]
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print_results(results)
+
+    report = OrderedDict([('version', gimme.VERSION),
+                            ('commit', get_commit()),
+                            ('python', sys.version.split()[0]),
+                            ('seed', options.seed),
+                            ('exons', options.exons),
+                            ('alt_splicing', options.alt_splicing),
+                            ('single_exon_fraction',
+                                options.single_exon_fraction),
+                            ('depth', options.depth),
+                            ('repeat', options.repeat),
+                            ('results', results)])
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+
+    if options.compare:
+        with open(options.compare) as fp:
+            slower = compare(results, json.load(fp), options.tolerance)
+        if slower:
+            print '\n%d stage(s) slower than %.2f times the baseline' % \
+                                                (slower, options.tolerance)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench_stages.py')
+    parser.add_argument('loci', type=int, nargs='*',
+            help='numbers of loci (default=%s)' %
+                    ' '.join(map(str, SCALES)))
+    parser.add_argument('--exons', type=int, metavar='int', default=8,
+            help='a number of exons of a multi-exon gene ' +
+                    '(default=%(default)s)')
+    parser.add_argument('--alt_splicing', type=float, metavar='float',
+            default=0.2,
+            help='a probability that a read skips an internal exon ' +
+                    '(default=%(default)s)')
+    parser.add_argument('--single_exon_fraction', type=float,
+            metavar='float', default=0.2,
+            help='a fraction of single-exon genes (default=%(default)s)')
+    parser.add_argument('--depth', type=float, metavar='float', default=10,
+            help='a mean number of reads of a gene (default=%(default)s)')
+    parser.add_argument('--seed', type=int, metavar='int', default=0,
+            help='a random seed (default=%(default)s)')
+    parser.add_argument('--repeat', type=int, metavar='int', default=3,
+            help='a number of runs of each scale (default=%(default)s)')
+    parser.add_argument('-o', '--output', type=str, metavar='file',
+            help='save results to a JSON file')
+    parser.add_argument('--compare', type=str, metavar='file',
+            help='compare results with results saved with -o')
+    parser.add_argument('--tolerance', type=float, metavar='float',
+            default=1.25,
+            help='a ratio to a baseline time reported as slower ' +
+                    '(default=%(default)s)')
+
+    options = parser.parse_args()
+    if options.exons < 2:
+        parser.error('--exons must be at least 2')
+    if options.repeat <= 0:
+        parser.error('--repeat must be positive')
+    main(options)
@@ -0,0 +1,148 @@
+'''Benchmark of startup time of the gimme command.
+
+Each command is run --repeat times in a new interpreter and the best
+wall time is reported: listing subcommands, help of assembly through
+the dispatcher and gimme.py directly, a light utility (psl2bed) through
+the dispatcher and directly, and assembly of a small synthetic data
+set from generate_alignments.py. An empty interpreter and one that
+only imports numpy, which psl2bed loads through pslparser, are timed
+as baselines.
+
+Please run from a program main directory:
+
+    python benchmarks/bench_startup.py -o startup.json
+
+Results are saved in JSON and can be compared with earlier results,
+reporting commands slower than --tolerance times the baseline:
+
+    python benchmarks/bench_startup.py --compare startup.json
+
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+from collections import OrderedDict
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+import generate_alignments
+
+CLI = os.path.join(source_path, 'gimme_cli.py')
+GIMME = os.path.join(source_path, 'gimme.py')
+PSL2BED = os.path.join(source_path, 'utils', 'psl2bed.py')
+
+
+def get_commands(alignment_file, genome_file):
+    '''Returns (name, command line) of commands to be timed.'''
+
+    python = sys.executable
+    return [('python', [python, '-c', 'pass']),
+            ('import numpy', [python, '-c', 'import numpy']),
+            ('gimme help', [python, CLI, 'help']),
+            ('gimme assemble -h', [python, CLI, 'assemble', '-h']),
+            ('gimme.py -h', [python, GIMME, '-h']),
+            ('gimme psl2bed', [python, CLI, 'psl2bed', alignment_file]),
+            ('psl2bed.py', [python, PSL2BED, alignment_file]),
+            ('gimme assemble', [python, CLI, 'assemble', '-r', genome_file,
+                                alignment_file]),
+            ]
+
+
+def time_command(command, repeat):
+    '''Returns the best wall time of running a command in seconds.'''
+
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for i in range(repeat):
+            start = time.time()
+            subprocess.check_call(command, stdout=devnull, stderr=devnull)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(results, baseline, tolerance):
+    '''Prints ratios of times to a baseline and returns
+    the number of commands slower than tolerance times the baseline.
+
+    '''
+    print '\n%-20s %10s %10s %8s' % ('command', 'base(s)', 'time(s)', 'ratio')
+    slower = 0
+    for name, elapsed in results.iteritems():
+        base_time = baseline['results'].get(name)
+        if not base_time:
+            continue
+        ratio = elapsed / base_time
+        flag = ''
+        if ratio > tolerance:
+            flag = ' SLOWER'
+            slower += 1
+        print '%-20s %10.4f %10.4f %8.2f%s' % (name, base_time, elapsed,
+                                                ratio, flag)
+    return slower
+
+
+def main(options):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        alignment_file, genome_file, num_reads = generate_alignments.generate(
+                                os.path.join(tmpdir, 'startup'),
+                                options.loci, seed=options.seed)
+        results = OrderedDict()
+        for name, command in get_commands(alignment_file, genome_file):
+            results[name] = round(time_command(command, options.repeat), 6)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print '%-20s %10s' % ('command', 'time(s)')
+    for name, elapsed in results.iteritems():
+        print '%-20s %10.4f' % (name, elapsed)
+
+    report = OrderedDict([('python', sys.version.split()[0]),
+                            ('loci', options.loci),
+                            ('seed', options.seed),
+                            ('repeat', options.repeat),
+                            ('results', results)])
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
+
+    if options.compare:
+        with open(options.compare) as fp:
+            slower = compare(results, json.load(fp), options.tolerance)
+        if slower:
+            print '\n%d command(s) slower than %.2f times the baseline' % \
+                                                (slower, options.tolerance)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench_startup.py')
+    parser.add_argument('--loci', type=int, metavar='int', default=10,
+            help='a number of loci assembled (default=%(default)s)')
+    parser.add_argument('--seed', type=int, metavar='int', default=0,
+            help='a random seed (default=%(default)s)')
+    parser.add_argument('--repeat', type=int, metavar='int', default=10,
+            help='a number of runs of each command (default=%(default)s)')
+    parser.add_argument('-o', '--output', type=str, metavar='file',
+            help='save results to a JSON file')
+    parser.add_argument('--compare', type=str, metavar='file',
+            help='compare results with results saved with -o')
+    parser.add_argument('--tolerance', type=float, metavar='float',
+            default=1.25,
+            help='a ratio to a baseline time reported as slower ' +
+                    '(default=%(default)s)')
+
+    options = parser.parse_args()
+    if options.repeat <= 0:
+        parser.error('--repeat must be positive')
+    main(options)
@@ -0,0 +1,197 @@
+'''Seeded generator of synthetic alignments and a reference genome.
+
+Genes are laid out one after another on a random chromosome with
+canonical splice sites (GT-AG, or CT-AC on the minus strand) at
+every intron. Reads of a multi-exon gene skip internal exons with
+a probability of alt_splicing and cover the whole gene or a part of
+it with at least two exons. Reads of a single-exon gene cover a part
+of its exon. Alignments are written sorted by start position, so
+they can also be used with --stream.
+
+Please run from a program main directory:
+
+    python benchmarks/generate_alignments.py --loci 1000 --depth 10 out
+
+writes out.psl (or out.bed with --format bed) and out.fa.
+
+'''
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils.genome import write_fasta
+
+CHROM = 'chrS'
+EXON_SIZE = (80, 300)
+INTRON_SIZE = (200, 2000)
+SINGLE_EXON_SIZE = (600, 2000)
+INTERGENIC_SIZE = (1000, 3000)
+MIN_SINGLE_READ = 300  # the minimum length of a single-exon read (bp)
+BASES = np.frombuffer('ACGT', dtype=np.uint8)
+
+
+def randint(rng, bounds):
+    '''Returns a random integer from bounds, both inclusive.'''
+
+    return int(rng.randint(bounds[0], bounds[1] + 1))
+
+
+def make_genes(rng, num_loci, exons_per_gene, single_exon_fraction):
+    '''Returns the chromosome length and a list of genes,
+    (strand, [(start, end), ...]).
+
+    '''
+    genes = []
+    pos = randint(rng, INTERGENIC_SIZE)
+    for i in range(num_loci):
+        strand = '+' if rng.rand() < 0.5 else '-'
+        if rng.rand() < single_exon_fraction:
+            exons = [(pos, pos + randint(rng, SINGLE_EXON_SIZE))]
+        else:
+            exons = []
+            for j in range(exons_per_gene):
+                if exons:
+                    pos = exons[-1][1] + randint(rng, INTRON_SIZE)
+                exons.append((pos, pos + randint(rng, EXON_SIZE)))
+        genes.append((strand, exons))
+        pos = exons[-1][1] + randint(rng, INTERGENIC_SIZE)
+
+    return pos, genes
+
+
+def make_sequence(rng, length, genes):
+    '''Returns a random sequence with splice sites of genes.'''
+
+    seq = bytearray(BASES[rng.randint(0, 4, length)].tostring())
+    for strand, exons in genes:
+        donor, acceptor = ('GT', 'AG') if strand == '+' else ('CT', 'AC')
+        for (start1, end1), (start2, end2) in zip(exons, exons[1:]):
+            seq[end1:end1 + 2] = donor
+            seq[start2 - 2:start2] = acceptor
+
+    return str(seq)
+
+
+def make_reads(rng, exons, depth, alt_splicing):
+    '''Returns blocks of reads of a gene, lists of (start, end).'''
+
+    reads = []
+    for i in range(rng.poisson(depth) + 1):
+        if len(exons) == 1:
+            start, end = exons[0]
+            size = randint(rng, (min(MIN_SINGLE_READ, end - start),
+                                    end - start))
+            start += randint(rng, (0, end - start - size))
+            reads.append([(start, start + size)])
+            continue
+
+        chain = [exons[0]] + [exon for exon in exons[1:-1]
+                                if rng.rand() >= alt_splicing] + [exons[-1]]
+        if rng.rand() >= 0.5:  # a partial read
+            first = randint(rng, (0, len(chain) - 2))
+            last = randint(rng, (first + 1, len(chain) - 1))
+            chain = chain[first:last + 1]
+
+        blocks = list(chain)
+        start, end = blocks[0]
+        blocks[0] = (start + randint(rng, (0, (end - start) / 2)), end)
+        start, end = blocks[-1]
+        blocks[-1] = (start, end - randint(rng, (0, (end - start) / 2)))
+        reads.append(blocks)
+
+    reads.sort()
+    return reads
+
+
+def format_psl(name, strand, blocks, chrom, chrom_size):
+    sizes = [end - start for start, end in blocks]
+    q_starts = [sum(sizes[:i]) for i in range(len(sizes))]
+    q_size = sum(sizes)
+    return '\t'.join(map(str, [q_size, 0, 0, 0, 0, 0,
+                    len(blocks) - 1, blocks[-1][1] - blocks[0][0] - q_size,
+                    strand, name, q_size, 0, q_size, chrom, chrom_size,
+                    blocks[0][0], blocks[-1][1], len(blocks),
+                    ''.join('%d,' % size for size in sizes),
+                    ''.join('%d,' % start for start in q_starts),
+                    ''.join('%d,' % start for start, end in blocks)])) + '\n'
+
+
+def format_bed(name, strand, blocks, chrom, chrom_size):
+    start, end = blocks[0][0], blocks[-1][1]
+    return '\t'.join(map(str, [chrom, start, end, name, 1000, strand,
+                    start, end, '0,0,0', len(blocks),
+                    ','.join(str(e - s) for s, e in blocks),
+                    ','.join(str(s - start) for s, e in blocks)])) + '\n'
+
+
+def generate(prefix, num_loci=1000, exons_per_gene=8, alt_splicing=0.2,
+                single_exon_fraction=0.2, depth=10, seed=0, format='psl'):
+    '''Writes alignments to prefix.psl or prefix.bed and a reference
+    genome to prefix.fa.
+
+    Returns names of the alignment and the genome files and
+    the number of alignments.
+
+    '''
+    rng = np.random.RandomState(seed)
+    length, genes = make_genes(rng, num_loci, exons_per_gene,
+                                    single_exon_fraction)
+    seq = make_sequence(rng, length, genes)
+
+    genome_file = prefix + '.fa'
+    with open(genome_file, 'w') as fp:
+        write_fasta(fp, seq, CHROM)
+    del seq
+
+    formatter = format_psl if format == 'psl' else format_bed
+    alignment_file = '%s.%s' % (prefix, format)
+    num_reads = 0
+    with open(alignment_file, 'w') as fp:
+        for gene_id, (strand, exons) in enumerate(genes):
+            for blocks in make_reads(rng, exons, depth, alt_splicing):
+                num_reads += 1
+                fp.write(formatter('read%d.%d' % (gene_id, num_reads),
+                                    strand, blocks, CHROM, length))
+
+    return alignment_file, genome_file, num_reads
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='generate_alignments.py')
+    parser.add_argument('--loci', type=int, metavar='int', default=1000,
+            help='a number of genes (default=%(default)s)')
+    parser.add_argument('--exons', type=int, metavar='int', default=8,
+            help='a number of exons of a multi-exon gene ' +
+                    '(default=%(default)s)')
+    parser.add_argument('--alt_splicing', type=float, metavar='float',
+            default=0.2,
+            help='a probability that a read skips an internal exon ' +
+                    '(default=%(default)s)')
+    parser.add_argument('--single_exon_fraction', type=float,
+            metavar='float', default=0.2,
+            help='a fraction of single-exon genes (default=%(default)s)')
+    parser.add_argument('--depth', type=float, metavar='float', default=10,
+            help='a mean number of reads of a gene (default=%(default)s)')
+    parser.add_argument('--seed', type=int, metavar='int', default=0,
+            help='a random seed (default=%(default)s)')
+    parser.add_argument('--format', choices=['psl', 'bed'], default='psl',
+            help='a format of alignments (default=%(default)s)')
+    parser.add_argument('prefix', type=str,
+            help='a prefix of output files')
+
+    args = parser.parse_args()
+    if args.exons < 2:
+        parser.error('--exons must be at least 2')
+    alignment_file, genome_file, num_reads = generate(args.prefix,
+                            args.loci, args.exons, args.alt_splicing,
+                            args.single_exon_fraction, args.depth,
+                            args.seed, args.format)
+    print >> sys.stderr, 'Wrote %d alignments to %s and a genome to %s' % \
+                                    (num_reads, alignment_file, genome_file)
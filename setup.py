@@ -8,10 +8,16 @@ setup(
         # package structure
         packages=find_packages('src'),
         package_dir={'':'src'},
+        py_modules=['gimme', 'gimme_cli'],
+
+        # a single command of Gimme and its utilities
+        entry_points = {
+                        'console_scripts': ['gimme = gimme_cli:main'],
+                        },
 
         install_requires = [
                             'networkx == 1.7',
-                            'pygr == 0.8.2',
+                            'numpy',
                             'bx-python == 0.7.1',
                             ]
         )
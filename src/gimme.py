@@ -20,18 +20,27 @@
 '''
 #!/usr/bin/env python
 
+import os
 import sys
 import csv
+import bisect
 import argparse
+import heapq
+import multiprocessing
+from array import array
+from collections import OrderedDict
+from itertools import chain, islice, izip, product
+from cStringIO import StringIO
 
 from sys import stderr, stdout
 
 import networkx as nx
+import numpy as np
 
 #from matplotlib import pyplot as plt
-from utils import pslparser, get_min_isoforms, split_strand
-from bx.intervals.intersection import Interval, IntervalTree
-from pygr import seqdb
+from utils import pslparser, get_min_isoforms, split_strand, bedwriter
+from utils import snapshot, inputs, profiler, watchdog, tabix
+from utils.genome import open_genome
 
 
 gap_size = 50  # a minimum intron size (bp)
@@ -41,18 +50,126 @@ min_transcript_len = 300  # a minimum length for multiple exon transcript(bp)
 min_single_exon_len = 500  # a minimum length for a single exon(bp)
 max_isoforms = 20   # minimal isoforms will be searched
                     #if the number of isoforms exceed this number
+max_paths = 10000  # the maximum number of isoforms reported for a locus
 VERSION = '0.97'
+SNAPSHOT_LAYOUT = 2  # a version of arrays saved by save_snapshot()
+locus_budget = None  # a watchdog.Budget of each locus or None
+over_budget_loci = []  # (locus, strand, reason, fallback) of loci
+                       # over locus_budget
+
+# functions timed by --profile_report and their stage names
+PROFILED_STAGES = [('read_snapshot_or_alignments', 'read_alignments'),
+                    ('parse_psl', 'parse'),
+                    ('parse_bed', 'parse'),
+                    ('add_intron', 'add_intron'),
+                    ('merge_cluster', 'merge_cluster'),
+                    ('build_splice_graphs', 'build_splice_graphs'),
+                    ('collapse_exon', 'collapse_exon'),
+                    ('count_paths', 'count_paths'),
+                    ('iter_paths', 'iter_paths'),
+                    ]
+
+
+class Parameters(object):
+    '''Parameters of an assembly.
+
+    Defaults are those of the module. A time limit in seconds and
+    a memory limit in bytes of building each locus can be given
+    as in watchdog.Budget.
+
+        params = Parameters(min_utr=50, find_max=True)
+        other = params.replace(max_isoforms=10)
 
+    '''
+    names = ('gap_size', 'max_intron', 'min_utr', 'min_transcript_len',
+                'min_single_exon_len', 'max_isoforms', 'max_paths',
+                'find_max', 'locus_time_limit', 'locus_memory_limit')
+
+    def __init__(self, gap_size=gap_size, max_intron=max_intron,
+                    min_utr=min_utr, min_transcript_len=min_transcript_len,
+                    min_single_exon_len=min_single_exon_len,
+                    max_isoforms=max_isoforms, max_paths=max_paths,
+                    find_max=False, locus_time_limit=None,
+                    locus_memory_limit=None):
+        self.gap_size = gap_size
+        self.max_intron = max_intron
+        self.min_utr = min_utr
+        self.min_transcript_len = min_transcript_len
+        self.min_single_exon_len = min_single_exon_len
+        self.max_isoforms = max_isoforms
+        self.max_paths = max_paths
+        self.find_max = find_max
+        self.locus_time_limit = locus_time_limit
+        self.locus_memory_limit = locus_memory_limit
+
+    def __eq__(self, other):
+        return isinstance(other, Parameters) and \
+                    self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Parameters(%s)' % ', '.join('%s=%r' % item
+                                            for item in self.to_dict().items())
+
+    def to_dict(self):
+        return OrderedDict((name, getattr(self, name))
+                            for name in self.names)
+
+    def replace(self, **changes):
+        '''Returns a copy with given parameters changed.'''
+
+        values = self.to_dict()
+        for name in changes:
+            if name not in values:
+                raise TypeError('Unknown parameter %s' % name)
+        values.update(changes)
+        return Parameters(**values)
+
+    def get_budget(self):
+        '''Returns a watchdog.Budget of each locus or None.'''
+
+        if not self.locus_time_limit and not self.locus_memory_limit:
+            return None
+        return watchdog.Budget(self.locus_time_limit,
+                                self.locus_memory_limit)
+
+
+def get_parameters(find_max=False):
+    '''Returns Parameters from current values of the module,
+    e.g. set from a command line.
+
+    '''
+    params = Parameters(gap_size, max_intron, min_utr, min_transcript_len,
+                        min_single_exon_len, max_isoforms, max_paths,
+                        find_max)
+    if locus_budget is not None:
+        params.locus_time_limit = locus_budget.time_limit
+        params.locus_memory_limit = locus_budget.memory_limit
+    return params
+
+
+class ExonObj(object):
+    '''An exon of an alignment.
+
+    Exons stored in AlignmentDB are identified by integer IDs which
+    are also used as nodes of splice graphs. A name of an exon is
+    formatted only when it is printed.
+
+    intron is the first intron added to the exon or -1.
+
+    '''
+    __slots__ = ('chrom', 'start', 'end', 'terminal', 'id',
+                    'intron', 'remove')
 
-class ExonObj:
     def __init__(self, chrom, start, end):
-        self.chrom = chrom
+        self.chrom = intern(chrom)
         self.start = start
         self.end = end
         self.terminal = None
-        self.next_exons = set()
-        self.introns = set()
-        self.single = False
+        self.id = None
+        self.intron = -1
         self.remove = False
 
     def __str__(self):
@@ -62,20 +179,348 @@ class ExonObj:
         return self.end - self.start + 1
 
 
+class DisjointSet(object):
+    '''Disjoint sets of integer IDs with path compression
+    and union by rank.
+
+    '''
+    def __init__(self):
+        self.parents = array('l')
+        self.ranks = array('b')
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self):
+        '''Returns an ID of a new singleton set.'''
+
+        item = len(self.parents)
+        self.parents.append(item)
+        self.ranks.append(0)
+        return item
+
+    def find(self, item):
+        '''Returns a root of a set containing an item.'''
+
+        parents = self.parents
+        root = item
+        while parents[root] != root:
+            root = parents[root]
+
+        while parents[item] != root:  # compress the path
+            parents[item], item = root, parents[item]
+
+        return root
+
+    def union(self, item1, item2):
+        '''Merges sets containing two items and returns a new root.'''
+
+        root1 = self.find(item1)
+        root2 = self.find(item2)
+        if root1 == root2:
+            return root1
+
+        if self.ranks[root1] < self.ranks[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        if self.ranks[root1] == self.ranks[root2]:
+            self.ranks[root1] += 1
+
+        return root1
+
+    def copy(self):
+        other = DisjointSet()
+        other.parents = array('l', self.parents)
+        other.ranks = array('b', self.ranks)
+        return other
+
+    def groups(self):
+        '''Returns lists of items of each set in order of
+        their smallest items.
+
+        '''
+        groups = {}
+        roots = []
+        for item in xrange(len(self.parents)):
+            root = self.find(item)
+            try:
+                groups[root].append(item)
+            except KeyError:
+                groups[root] = [item]
+                roots.append(root)
+
+        return [groups[root] for root in roots]
+
+
+class IntronTable(object):
+    '''Stores introns in arrays indexed by intron IDs.
+
+    Chromosome names are interned to integer IDs. Exons connected
+    by each intron are stored as (donor, acceptor) pairs of exon IDs
+    in a linked list of edges. Introns from the same alignment are
+    merged into the same cluster in a disjoint set.
+
+    '''
+    columns = ('chrom', 'starts', 'ends', 'first_edge',
+                'donors', 'acceptors', 'next_edge')
+
+    def __init__(self):
+        self.chrom_ids = {}
+        self.chroms = []
+        self.chrom = array('i')
+        self.starts = array('l')
+        self.ends = array('l')
+        self.clusters = DisjointSet()
+        self.first_edge = array('l')  # the last edge added to each intron
+        self.donors = array('l')
+        self.acceptors = array('l')
+        self.next_edge = array('l')
+        self.index = {}  # {chrom ID: {start << 32 | end: intron ID}}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def get_chrom_id(self, chrom):
+        try:
+            return self.chrom_ids[chrom]
+        except KeyError:
+            chrom_id = self.chrom_ids[chrom] = len(self.chroms)
+            self.chroms.append(chrom)
+            self.index[chrom_id] = {}
+            return chrom_id
+
+    def get(self, chrom, start, end):
+        '''Returns an intron ID or None if the intron is not found.'''
+
+        try:
+            chrom_index = self.index[self.chrom_ids[chrom]]
+        except KeyError:
+            return None
+        return chrom_index.get(start << 32 | end)
+
+    def add(self, chrom, start, end):
+        '''Returns an ID of a new intron.'''
+
+        chrom_id = self.get_chrom_id(chrom)
+        intron = len(self.starts)
+        self.index[chrom_id][start << 32 | end] = intron
+        self.chrom.append(chrom_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.clusters.add()
+        self.first_edge.append(-1)
+        return intron
+
+    def add_edge(self, intron, donor, acceptor):
+        '''Connects a donor exon to an acceptor exon by an intron.'''
+
+        edge = self.first_edge[intron]
+        while edge >= 0:
+            if self.donors[edge] == donor and \
+                    self.acceptors[edge] == acceptor:
+                return
+            edge = self.next_edge[edge]
+
+        self.donors.append(donor)
+        self.acceptors.append(acceptor)
+        self.next_edge.append(self.first_edge[intron])
+        self.first_edge[intron] = len(self.donors) - 1
+
+    def edges(self, intron):
+        '''Returns (donor, acceptor) exon IDs of an intron.'''
+
+        edges = []
+        edge = self.first_edge[intron]
+        while edge >= 0:
+            edges.append((self.donors[edge], self.acceptors[edge]))
+            edge = self.next_edge[edge]
+        edges.reverse()  # in order of addition
+        return edges
+
+    def get_name(self, intron):
+        return '%s:%d-%d' % (self.chroms[self.chrom[intron]],
+                                self.starts[intron], self.ends[intron])
+
+    def update(self, other, exon_ids):
+        '''Adds introns, edges and clusters of another table.
+
+        exon_ids maps exon IDs of the other table to exon IDs of
+        this table. Returns IDs of introns of the other table.
+
+        '''
+        intron_ids = array('l')
+        for intron in xrange(len(other)):
+            chrom = other.chroms[other.chrom[intron]]
+            start, end = other.starts[intron], other.ends[intron]
+            intron_ = self.get(chrom, start, end)
+            if intron_ is None:
+                intron_ = self.add(chrom, start, end)
+            intron_ids.append(intron_)
+
+            for donor, acceptor in other.edges(intron):
+                self.add_edge(intron_, exon_ids[donor], exon_ids[acceptor])
+
+        for intron in xrange(len(other)):
+            self.clusters.union(intron_ids[other.clusters.find(intron)],
+                                intron_ids[intron])
+
+        return intron_ids
+
+
+class SingleExonIndex(object):
+    '''Merged single exons of a chromosome in sorted arrays.
+
+    Overlapping single exons are merged, so merged exons do not
+    overlap each other and are sorted by both start and end positions.
+    Overlaps of many exons are found with two binary searches of
+    the arrays. removed marks merged exons that are redundant with
+    exons of multi-exon genes.
+
+    '''
+    def __init__(self, chrom, starts, ends):
+        self.chrom = chrom
+        order = np.argsort(starts, kind='mergesort')
+        starts = starts[order]
+        ends = np.maximum.accumulate(ends[order])
+
+        # an exon starts a new group if it starts after all previous exons
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] > ends[:-1]
+        last = np.ones(len(starts), dtype=bool)
+        last[:-1] = first[1:]
+
+        self.starts = starts[first]
+        self.ends = ends[last]
+        self.removed = np.zeros(len(self.starts), dtype=bool)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for start, end, removed in izip(self.starts.tolist(),
+                                        self.ends.tolist(),
+                                        self.removed.tolist()):
+            exon = ExonObj(self.chrom, start, end)
+            exon.remove = removed
+            yield exon
+
+    def find(self, starts, ends):
+        '''Returns indices of query intervals and merged exons
+        overlapping each other.
+
+        '''
+        first = np.searchsorted(self.ends, starts, side='right')
+        last = np.searchsorted(self.starts, ends, side='left')
+        counts = np.maximum(last - first, 0)
+        queries = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(counts.sum()) - \
+                    np.repeat(np.cumsum(counts) - counts, counts)
+        return queries, first[queries] + offsets
+
+
 class AlignmentDB(object):
     def __init__(self):
-        self.exon_db = {}  # store all exon objects
-        self.intron_db = {}  # store all intron objects
+        self.exons = []  # exon objects indexed by exon IDs
+        self.exon_index = {}  # {chrom: {start << 32 | end: exon ID}}
+        self.intron_db = IntronTable()  # store all introns
         self.single_exons_db = {}  # store all single exon objects
-        self.single_exons_intervals = {}  # store intersecter objects for
+        self.single_exons_intervals = {}  # SingleExonIndex of merged
                                           # single exons
+        self.chain_counts = {}  # {chain key: number of alignments}
+        self.changed_spans = None  # (chrom, start, end) of new multi-exon
+                                   # chains if they are recorded
+        self.collapsed_exons = None  # (start, end) of exons checked against
+                                     # single exons if they are recorded
+
+    def add_exon(self, exon):
+        '''Stores a new exon object and assigns an exon ID to it.'''
+
+        exon.id = len(self.exons)
+        try:
+            chrom_index = self.exon_index[exon.chrom]
+        except KeyError:
+            chrom_index = self.exon_index[exon.chrom] = {}
+        chrom_index[exon.start << 32 | exon.end] = exon.id
+        self.exons.append(exon)
+
+    def add_chain(self, exons):
+        '''Counts an exon chain and returns True if it has not
+        been added before.
 
+        '''
+        key = get_chain_key(exons)
+        count = self.chain_counts.get(key, 0)
+        self.chain_counts[key] = count + 1
+        return count == 0
+
+    def get_chain_count(self, exons):
+        '''Returns a number of alignments with an exon chain.'''
+
+        return self.chain_counts.get(get_chain_key(exons), 0)
+
+    def get_exon(self, chrom, start, end):
+        '''Returns a stored exon object or None if it is not found.'''
+
+        try:
+            exon_id = self.exon_index[chrom][start << 32 | end]
+        except KeyError:
+            return None
+        return self.exons[exon_id]
+
+    def update(self, other):
+        '''Adds exons, introns and single exons of another database.
+
+        Exons and introns get the same IDs and terminals as they
+        would if alignments of the other database were added after
+        alignments of this database.
+
+        '''
+        exon_ids = array('l')
+        new_exons = []
+        for exon in other.exons:
+            exon_ = self.get_exon(exon.chrom, exon.start, exon.end)
+            if exon_ is None:
+                self.add_exon(exon)
+                new_exons.append(exon)
+                exon_ids.append(exon.id)
+            else:
+                if exon_.terminal != exon.terminal:
+                    exon_.terminal = None
+                exon_ids.append(exon_.id)
+
+        intron_ids = self.intron_db.update(other.intron_db, exon_ids)
+        for exon in new_exons:
+            if exon.intron >= 0:
+                exon.intron = intron_ids[exon.intron]
+
+        for chrom, exons in other.single_exons_db.iteritems():
+            try:
+                self.single_exons_db[chrom].extend(exons)
+            except KeyError:
+                self.single_exons_db[chrom] = exons
 
-def parse_bed(bed_file):
+        for key, count in other.chain_counts.iteritems():
+            self.chain_counts[key] = self.chain_counts.get(key, 0) + count
+
+
+def get_chain_key(exons):
+    '''Returns a hashable key of a chromosome and exon coordinates
+    of an exon chain.
+
+    '''
+    coords = array('l', [pos for exon in exons
+                            for pos in (exon.start, exon.end)])
+    return exons[0].chrom, coords.tostring()
+
+
+def parse_bed(bed_file, params=None):
     '''Reads alignments from BED format and creates
     exon objects from a transcript.
 
+    Gaps are filled up to gap_size of params or the module.
+
     '''
+    max_gap = (params or get_parameters()).gap_size
     reader = csv.reader(bed_file, dialect='excel-tab')
     for row in reader:
         exons = []
@@ -92,27 +537,33 @@ def parse_bed(bed_file):
             exon = ExonObj(chrom, exon_start, exon_end)
             exons.append(exon)
 
-        exons = delete_gap(exons, gap_size)
+        exons = delete_gap(exons, max_gap)
         yield exons
 
 
-def parse_psl(psl_file):
+def parse_psl(psl_file, params=None):
     '''Reads alignments from PSL format and creates
     exon objects from each transcript.
 
-    '''
-    for pslobj in pslparser.read(psl_file):
-        exons = []
+    Gaps are filled up to gap_size of params or the module.
 
-        for i in range(len(pslobj.tStarts)):
-            exon_start = pslobj.tStarts[i]
-            exon_end = exon_start + pslobj.blockSizes[i]
+    '''
+    max_gap = (params or get_parameters()).gap_size
+    for chunk in pslparser.read_chunks(psl_file):
+        chrom_names = chunk.chrom_names
+        chrom_codes = chunk.chrom_codes.tolist()
+        offsets = chunk.offsets.tolist()
+        block_starts = chunk.t_block_starts.tolist()
+        block_sizes = chunk.block_sizes.tolist()
 
-            exon = ExonObj(pslobj.tName, exon_start, exon_end)
-            exons.append(exon)
+        for i in xrange(len(chunk)):
+            chrom = chrom_names[chrom_codes[i]]
+            exons = [ExonObj(chrom, block_starts[j],
+                                block_starts[j] + block_sizes[j])
+                        for j in xrange(offsets[i], offsets[i + 1])]
 
-        exons = delete_gap(exons, gap_size)
-        yield exons
+            exons = delete_gap(exons, max_gap)
+            yield exons
 
 
 def remove_large_intron(exons, max_intron=1e6):
@@ -150,94 +601,76 @@ def remove_large_intron(exons, max_intron=1e6):
     return all_exon_groups
 
 
-def add_intron(exons, align_db, clusters, cluster_no):
+def add_intron(exons, align_db):
     '''Get introns from a set of exons.
 
-    Intron object is created for each intron with all connected exons
-    as an attribute.
-    '''
-
-    introns = []
-    existing_clusters = set()
-
-    for i in range(len(exons)):
-        curr_exon = exons[i]
-        try:
-            next_exon = exons[i + 1]
-        except IndexError:
-            pass
-        else:
-            intron_start = curr_exon.end + 1
-            intron_end = next_exon.start - 1
+    Each intron is added to the intron table with all connected exons.
+    Introns from the same set of exons are merged into one cluster.
 
-            curr_exon.next_exons.add(str(next_exon))
+    '''
 
-            intron_name = '%s:%d-%d' % (curr_exon.chrom,
-                                            intron_start,
-                                            intron_end)
-            intron = nx.DiGraph(name=intron_name, cluster=None)
+    intron_db = align_db.intron_db
 
-            try:
-                intron_ = align_db.intron_db[intron.graph['name']]
-            except KeyError:
-                align_db.intron_db[intron.graph['name']] = intron
-                intron.add_edge(str(curr_exon), str(next_exon))
-                introns.append(intron)
+    for exon in exons:
+        if exon.id is None:  # exons were not added by add_exon()
+            align_db.add_exon(exon)
 
-                curr_exon.introns.add(intron.graph['name'])
-                next_exon.introns.add(intron.graph['name'])
-            else:
-                intron_.add_edge(str(curr_exon), str(next_exon))
-                introns.append(intron_)
-                existing_clusters.add(intron_.graph['cluster'])
-
-                curr_exon.introns.add(intron_.graph['name'])
-                next_exon.introns.add(intron_.graph['name'])
-
-    if introns:
-        cluster_no += 1  # create new cluster index
-        if not existing_clusters:
-            cluster = nx.DiGraph()
-            if len(introns) > 1:
-                cluster.add_path([i.graph['name'] for i in introns])
-                for intron in introns:
-                    intron.graph['cluster'] = cluster_no
-            else:
-                cluster.add_node(introns[0].graph['name'])
-                introns[0].graph['cluster'] = cluster_no
-        else:
-            cluster = nx.DiGraph(exons=set())
-            for cl in existing_clusters:
-                cluster.add_edges_from(clusters[cl].edges())
-                clusters.pop(cl)
+    first_intron = None
+    for i in range(len(exons) - 1):
+        curr_exon = exons[i]
+        next_exon = exons[i + 1]
 
-            for intron in cluster.nodes():
-                align_db.intron_db[intron].graph['cluster'] = cluster_no
+        intron_start = curr_exon.end + 1
+        intron_end = next_exon.start - 1
 
-            if len(introns) > 1:
-                cluster.add_path([i.graph['name'] for i in introns])
+        intron = intron_db.get(curr_exon.chrom, intron_start, intron_end)
+        if intron is None:
+            intron = intron_db.add(curr_exon.chrom, intron_start, intron_end)
 
-                for intron in introns:
-                    intron.graph['cluster'] = cluster_no
-            else:
-                cluster.add_node(introns[0].graph['name'])
-                introns[0].graph['cluster'] = cluster_no
+        intron_db.add_edge(intron, curr_exon.id, next_exon.id)
 
-        clusters[cluster_no] = cluster
+        if curr_exon.intron < 0:
+            curr_exon.intron = intron
+        if next_exon.intron < 0:
+            next_exon.intron = intron
 
-    return cluster_no
+        if first_intron is None:
+            first_intron = intron
+        else:
+            intron_db.clusters.union(first_intron, intron)
 
 
-def collapse_exon(g, align_db):
+def collapse_exon(g, align_db, terminals=None, params=None):
     '''Merge overlapped exons together.
 
     An exon gets extended when they are merged with a larger exon.
 
     A smaller exon is then removed from the graph.
 
+    Nodes of a graph are exon IDs. Terminals of exons are taken from
+    exon objects unless terminals, a dictionary of terminals of
+    nodes, is given. Single exons are only checked in the latter case.
+
+    min_utr is taken from params or the module.
+
     '''
+    if params is None:
+        params = get_parameters()
+    min_utr = params.min_utr
+
+    if terminals is None:
+        terminals = dict((node, align_db.exons[node].terminal)
+                            for node in g.nodes())
+        check_singles = True
+    else:
+        check_singles = False
+
+    def set_terminal(exon, terminal):
+        terminals[exon.id] = terminal
+        if check_singles:
+            exon.terminal = terminal
 
-    exons = [align_db.exon_db[e] for e in g.nodes()]
+    exons = [align_db.exons[e] for e in g.nodes()]
     sorted_exons = sorted(exons, key=lambda x: (x.end, x.start))
     chromosome = exons[0].chrom
 
@@ -250,25 +683,25 @@ def collapse_exon(g, align_db):
             pass
         else:
             if curr_exon.end == next_exon.end:
-                if next_exon.terminal == 1:  # left terminal
-                    g.add_edges_from([(str(curr_exon), n)\
-                            for n in g.successors(str(next_exon))])
-                    g.remove_node(str(next_exon))
-                    if curr_exon.terminal == 2:
-                        curr_exon.terminal = None
+                if terminals[next_exon.id] == 1:  # left terminal
+                    g.add_edges_from([(curr_exon.id, n)
+                            for n in g.successors(next_exon.id)])
+                    g.remove_node(next_exon.id)
+                    if terminals[curr_exon.id] == 2:
+                        set_terminal(curr_exon, None)
                 else:
-                    if (curr_exon.terminal == 1 and
+                    if (terminals[curr_exon.id] == 1 and
                             next_exon.start - curr_exon.start <= min_utr):
-                        g.add_edges_from([(str(next_exon), n) for n in
-                                            g.successors(str(curr_exon))])
-                        g.remove_node(str(curr_exon))
+                        g.add_edges_from([(next_exon.id, n) for n in
+                                            g.successors(curr_exon.id)])
+                        g.remove_node(curr_exon.id)
                     curr_exon = next_exon
             else:
                 curr_exon = next_exon
         i += 1
 
     i = 0
-    exons = [align_db.exon_db[e] for e in g.nodes()]
+    exons = [align_db.exons[e] for e in g.nodes()]
     sorted_exons = sorted(exons, key=lambda x: (x.start, x.end))
     curr_exon = sorted_exons[0]
     while i <= len(sorted_exons):
@@ -278,17 +711,17 @@ def collapse_exon(g, align_db):
             pass
         else:
             if curr_exon.start == next_exon.start:
-                if curr_exon.terminal == 2:
-                    g.add_edges_from([(n, str(next_exon))\
-                            for n in g.predecessors(str(curr_exon))])
-                    g.remove_node(str(curr_exon))
+                if terminals[curr_exon.id] == 2:
+                    g.add_edges_from([(n, next_exon.id)
+                            for n in g.predecessors(curr_exon.id)])
+                    g.remove_node(curr_exon.id)
                     curr_exon = next_exon
                 else:
-                    if next_exon.terminal == 2:
+                    if terminals[next_exon.id] == 2:
                         if next_exon.end - curr_exon.end <= min_utr:
-                            g.add_edges_from([(n, str(curr_exon))\
-                                    for n in g.predecessors(str(next_exon))])
-                            g.remove_node(str(next_exon))
+                            g.add_edges_from([(n, curr_exon.id)
+                                    for n in g.predecessors(next_exon.id)])
+                            g.remove_node(next_exon.id)
                         else:
                             curr_exon = next_exon
                     else:
@@ -296,6 +729,12 @@ def collapse_exon(g, align_db):
             else:
                 curr_exon = next_exon
         i += 1
+    if not check_singles:
+        return
+    if align_db.collapsed_exons is not None:
+        align_db.collapsed_exons.extend((align_db.exons[node].start,
+                                            align_db.exons[node].end)
+                                            for node in g.nodes())
     try:
         '''If there are single exons in this chromosome,
         remove or extend them according to how they overlap with
@@ -306,41 +745,36 @@ def collapse_exon(g, align_db):
     except KeyError:
         pass
     else:
-        for node in g.nodes():
-            exon = align_db.exon_db[node]
-            remove_redundant_exon(exon, singles, set())
+        remove_redundant_exons([align_db.exons[node] for node in g.nodes()],
+                                singles, params)
 
 
-def remove_redundant_exon(exon, singles, unmergables):
-    '''Recursively remove exons that are subset of a given exon.'''
+def remove_redundant_exons(exons, singles, params=None):
+    '''Mark single exons that are subset of given exons as removed.
 
-    overlaps = [o for o in singles.find(exon.start, exon.end) \
-                                if not o.value['exon'].remove and \
-                                str(o.value['exon']) not in unmergables]
-    if not overlaps:
-        return
-    for o in overlaps:
-        if o.start >= exon.start and o.end <= exon.end:
-            o.value['exon'].remove = True  # mark the exon as removed
-        elif o.start >= exon.start and o.end > exon.end:
-            if o.end - exon.end < min_utr:
-                o.value['exon'].remove = True
-            else:
-                unmergables.add(str(o.value['exon']))
-        elif o.start < exon.start and o.end <= exon.end:
-            if exon.start - o.start < min_utr:
-                o.value['exon'].remove = True
-            else:
-                unmergables.add(str(o.value['exon']))
-        elif o.start < exon.start and o.end > exon.end:
-            if (exon.start - o.start) + (o.end - exon.end) < min_utr:
-                o.value['exon'].remove = True
-            else:
-                unmergables.add(str(o.value['exon']))
-        else:
-            unmergables.add(str(o.value['exon']))
+    A single exon is removed if it is contained in an exon or
+    extends past it by less than min_utr bp in total.
+    singles is a SingleExonIndex and all exons are checked at once.
+
+    '''
+    starts = np.fromiter((exon.start for exon in exons), dtype=np.int64,
+                            count=len(exons))
+    ends = np.fromiter((exon.end for exon in exons), dtype=np.int64,
+                            count=len(exons))
+    remove_redundant_intervals(starts, ends, singles, params)
+
+
+def remove_redundant_intervals(starts, ends, singles, params=None):
+    '''Removes single exons redundant with exons given as arrays of
+    start and end positions as in remove_redundant_exons().
 
-    remove_redundant_exon(exon, singles, unmergables)
+    '''
+    min_utr = (params or get_parameters()).min_utr
+    queries, overlaps = singles.find(starts, ends)
+    overhangs = np.maximum(starts[queries] - singles.starts[overlaps], 0) + \
+                np.maximum(singles.ends[overlaps] - ends[queries], 0)
+    redundant = (overhangs == 0) | (overhangs < min_utr)
+    singles.removed[overlaps[redundant]] = True
 
 
 def delete_gap(exons, gap_size=0):
@@ -387,11 +821,11 @@ def add_exon(align_db, exons):
     exons[-1].terminal = 2  # right end
 
     for exon in exons:
-        try:
-            exon_ = align_db.exon_db[str(exon)]
-        except KeyError:
-            align_db.exon_db[str(exon)] = exon
+        exon_ = align_db.get_exon(exon.chrom, exon.start, exon.end)
+        if exon_ is None:
+            align_db.add_exon(exon)
         else:
+            exon.id = exon_.id
             if ((exon.terminal and exon_.terminal) and
                         exon.terminal != exon_.terminal):
                 exon.terminal = None
@@ -401,35 +835,103 @@ def add_exon(align_db, exons):
 
 
 def merge_cluster(align_db):
-    '''Connect introns from the same gene together.'''
-
-    big_cluster = nx.Graph()
-    paths = []
-    for exon in align_db.exon_db.itervalues():
-        pth = []
-        for intron in exon.introns:
-            cluster = align_db.intron_db[intron].graph['cluster']
-            pth.append(cluster)
-            # exon.clusters.add(cluster)
-        paths.append(pth)
-
-    for pth in paths:
-        if len(pth) > 2:
-            big_cluster.add_path(pth)
-        elif len(pth) == 2:
-            big_cluster.add_edges_from([pth])
-        elif len(pth) == 1:
-            big_cluster.add_nodes_from(pth)
+    '''Connect introns from the same gene together.
+
+    Only clusters with an intron recorded in an exon in the exon
+    database are reported. Introns of an exon are all from the same
+    alignment, so they are already in the same cluster.
+    Returns introns of each gene.
+
+    '''
+
+    genes = align_db.intron_db.clusters
+    linked_genes = set(genes.find(exon.intron) for exon in align_db.exons
+                        if exon.intron >= 0)
+    return [introns for introns in genes.groups()
+                if genes.find(introns[0]) in linked_genes]
+
+
+def count_paths(g, source, target):
+    '''Returns a number of paths from source to target in
+    a directed acyclic graph without enumerating them.
+
+    '''
+    num_paths = dict.fromkeys(g.nodes(), 0)
+    num_paths[source] = 1
+    for node in nx.topological_sort(g):
+        if num_paths[node]:
+            for successor in g.successors(node):
+                num_paths[successor] += num_paths[node]
+
+    return num_paths[target]
+
+
+def iter_paths(g, source, target):
+    '''Yields paths from source to target in a directed acyclic graph.
+
+    Paths are generated in the same order as nx.all_simple_paths.
+
+    '''
+    path = [source]
+    stack = [iter(g[source])]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            path.pop()
+        elif child == target:
+            yield path + [target]
         else:
-            pass
+            path.append(child)
+            stack.append(iter(g[child]))
+
+
+def get_intron_locus(align_db, introns):
+    '''Returns a location of introns of a gene.'''
+
+    intron_db = align_db.intron_db
+    return '%s:%d-%d' % (intron_db.chroms[intron_db.chrom[introns[0]]],
+                            min(intron_db.starts[i] for i in introns),
+                            max(intron_db.ends[i] for i in introns))
+
+
+def add_over_budget_locus(over_budget, locus, strand, reason, method):
+    '''Records a locus over budget and the method that built it,
+    or None if it was skipped.
+
+    '''
+    fallback = method or 'skipped'
+    over_budget.append((locus, strand, reason, fallback))
+    if method:
+        print >> stderr, '\nWARNING: %s exceeded a %s limit and is ' \
+                            'reported with %s.' % (locus, reason, method)
+    else:
+        print >> stderr, '\nWARNING: %s exceeded a %s limit and is ' \
+                            'skipped.' % (locus, reason)
+
+
+def write_over_budget_loci(output, over_budget):
+    '''Writes loci over budget in a tab-delimited format.'''
 
-    return big_cluster
+    print >> output, '#locus\tstrand\treason\tfallback'
+    for record in over_budget:
+        print >> output, '\t'.join(record)
 
 
-def print_bed(align_db, transcript, strand, gene_id, tran_id):
+def get_locus(g, align_db):
+    '''Returns a location of exons in a graph.'''
+
+    exons = [align_db.exons[node] for node in g.nodes()
+                if node not in ('Start', 'End')]
+    return '%s:%d-%d' % (exons[0].chrom,
+                            min(exon.start for exon in exons),
+                            max(exon.end for exon in exons))
+
+
+def print_bed(align_db, transcript, strand, gene_id, tran_id, output=stdout):
     '''Print a splice graph in BED format.'''
 
-    exons = [align_db.exon_db[e] for e in transcript]
+    exons = [align_db.exons[e] for e in transcript]
 
     chrom_start = exons[0].start
     chrom_end = exons[-1].end
@@ -439,241 +941,344 @@ def print_bed(align_db, transcript, strand, gene_id, tran_id):
     block_sizes = ','.join([str(exon.end - exon.start) for exon in exons])
 
     name = '%s:%d.%d' % (chrom, gene_id, tran_id)
-    score = 1000
-    item_RGB = '0,0,0'
-    thick_start = chrom_start
-    thick_end = chrom_end
-    block_count = len(exons)
-
-    writer = csv.writer(stdout, dialect='excel-tab')
-    writer.writerow((chrom,
-                    chrom_start,
-                    chrom_end,
-                    name,
-                    score,
-                    strand,
-                    thick_start,
-                    thick_end,
-                    item_RGB,
-                    block_count,
-                    block_sizes,
-                    block_starts))
-
-
-def print_bed_single(exon, gene_id, tran_id):
+    output.write(bedwriter.format_bed(chrom, chrom_start, chrom_end, name,
+                                        strand, block_sizes, block_starts))
+
+
+def print_bed_single(exon, gene_id, tran_id, output=stdout):
     '''Print a splice graph in BED format.'''
 
     chrom_start = exon.start
     chrom_end = exon.end
     chrom = exon.chrom
 
-    block_starts = ','.join([str(exon.start - chrom_start)])
-    block_sizes = ','.join([str(exon.end - exon.start)])
+    block_starts = '0'
+    block_sizes = str(exon.end - exon.start)
 
     name = '%s:%d.%d' % (chrom, gene_id, tran_id)
-    score = 1000
-    item_RGB = '0,0,0'
-    thick_start = chrom_start
-    thick_end = chrom_end
-    strand = '+'
-    block_count = 1
-
-    writer = csv.writer(stdout, dialect='excel-tab')
-    writer.writerow((chrom,
-                    chrom_start,
-                    chrom_end,
-                    name,
-                    score,
-                    strand,
-                    thick_start,
-                    thick_end,
-                    item_RGB,
-                    block_count,
-                    block_sizes,
-                    block_starts))
+    output.write(bedwriter.format_bed(chrom, chrom_start, chrom_end, name,
+                                        '+', block_sizes, block_starts))
+
+
+def check_criteria(align_db, transcript, two_exon_trns,
+                    min_transcript_len=0):
+    '''Return True or False whether a transcript pass or
+    fail the criteria.
+
+    two_exon_trns is a set of two-exon transcripts that passed,
+    so the same two-exon transcript is only reported once.
+
+    '''
+    transcript_length = sum([align_db.exons[e].get_size() \
+                                            for e in transcript])
+
+    if transcript_length <= min_transcript_len:
+        return False  # fail
+    else:
+        if len(transcript) == 2:
+            trns = tuple(transcript)
+            if trns in two_exon_trns:
+                return False  # fail
+            else:
+                two_exon_trns.add(trns)
+                return True  # pass
+        else:
+            return True
+
+
+def build_splice_graphs(genome, align_db, introns, junctions=None,
+                            params=None):
+    '''Returns splice graphs of each strand of a gene with
+    Start and End nodes.
+
+    introns are introns of a gene from merge_cluster().
+    Exons are collapsed with min_utr of params or the module.
+
+    '''
+    if params is None:
+        params = get_parameters()
+    g = nx.DiGraph()
+    for intron in introns:
+        for donor, acceptor in align_db.intron_db.edges(intron):
+            g.add_edge(donor, acceptor)
+
+    # # nx.draw_spring(nx.algorithms.dfs_tree(g))
+    # nx.draw_spring(g)
+    # plt.show()
+    # for node in g.nodes():
+    #     print node, g[node]
+    # raise SystemExit
+    collapse_exon(g, align_db, params=params)
+
+    graphs = []
+    for g in split_strand.split(g, genome, align_db.exons, junctions):
+        if g.nodes():
+            '''Exons only found as donors or acceptors in a graph
+            of one strand are terminals of the graph.
+
+            '''
+            terminals = {}
+            for node in g.nodes():
+                if not g.in_degree(node):
+                    terminals[node] = 1
+                elif not g.out_degree(node):
+                    terminals[node] = 2
+                else:
+                    terminals[node] = None
+            collapse_exon(g, align_db, terminals, params)
+
+            for node in g.nodes():
+                if not g.predecessors(node):
+                    g.add_edge('Start', node)
+                if not g.successors(node):
+                    g.add_edge(node, 'End')
+            graphs.append(g)
+
+    return graphs
+
+
+def get_transcripts(g, align_db, method, num_paths, max_paths):
+    '''Returns transcripts of a splice graph found by a method.
+
+    all_paths: all paths or the first max_paths paths with a warning
+    min_isoforms: a minimal set of paths covering all edges
+    capped_paths: the first max_paths paths without a warning
+
+    num_paths is a number of paths from count_paths().
+
+    '''
+    if method == 'min_isoforms':
+        exons = align_db.exons
+        return get_min_isoforms.get_min_paths(g, False,
+                            key=lambda node: (exons[node].start,
+                                                exons[node].end))
+
+    transcripts = iter_paths(g, 'Start', 'End')
+    if num_paths > max_paths:
+        if method == 'all_paths':
+            print >> stderr, '\nWARNING: %s has %d isoforms, ' \
+                        'only %d isoforms are reported.' % \
+                        (get_locus(g, align_db), num_paths, max_paths)
+        transcripts = islice(transcripts, max_paths)
+    return (path[1:-1] for path in transcripts)
+
+
+def get_transcripts_in_budget(g, align_db, find_max, max_isoforms,
+                                max_paths, budget):
+    '''Returns transcripts of a splice graph found within a budget.
+
+    Transcripts are found as in write_gene_model(). If the budget
+    is exceeded, minimal isoforms and then the first max_isoforms
+    paths are tried, each with a new budget.
+
+    Returns a method that found the transcripts or None if all
+    methods exceeded the budget, a list of transcripts and a reason
+    the budget was exceeded or None.
+
+    '''
+    num_paths = count_paths(g, 'Start', 'End')
+    if find_max or num_paths <= max_isoforms:
+        methods = ['all_paths', 'min_isoforms', 'capped_paths']
+    else:
+        methods = ['min_isoforms', 'capped_paths']
+
+    reason = None
+    for method in methods:
+        limit = max_isoforms if method == 'capped_paths' else max_paths
+        try:
+            with budget:
+                transcripts = list(get_transcripts(g, align_db, method,
+                                                    num_paths, limit))
+        except watchdog.BudgetExceeded as e:
+            reason = e.reason
+        else:
+            return method, transcripts, reason
+
+    return None, [], reason
+
+
+def write_gene_model(g, align_db, gene_id, find_max,
+                        min_transcript_len=0,
+                        max_isoforms=1e6,
+                        max_paths=1000000,
+                        two_exon_trns=None,
+                        output=stdout,
+                        transcripts=None,
+                    ):
+    '''Print out isoforms of a splice graph from build_splice_graphs().
+
+    Isoforms are counted without enumerating paths. With find_max,
+    isoforms are written out as they are enumerated and at most
+    max_paths isoforms are reported.
+
+    Transcripts already found, e.g. by get_transcripts_in_budget(),
+    can be given to write them out instead.
+
+    Returns numbers of isoforms and excluded transcripts.
+
+    '''
+    if two_exon_trns is None:
+        two_exon_trns = set()
+
+    transcripts_num = 0
+    excluded = 0
+    trans_id = 0
+    strand = g.graph['strand']
+
+    if transcripts is None:
+        num_paths = count_paths(g, 'Start', 'End')
+        if find_max or num_paths <= max_isoforms:
+            '''Report all maximum isoforms.'''
+
+            transcripts = get_transcripts(g, align_db, 'all_paths',
+                                            num_paths, max_paths)
+        else:
+            '''Report minimal isoforms if maximum isoforms exceeds
+            max_isoforms.
+
+            '''
+            transcripts = get_transcripts(g, align_db, 'min_isoforms',
+                                            num_paths, max_paths)
+
+    for transcript in transcripts:
+        if check_criteria(align_db, transcript, two_exon_trns,
+                            min_transcript_len):
+            transcripts_num += 1
+            trans_id += 1
+            print_bed(align_db,
+                        transcript,
+                        strand,
+                        gene_id,
+                        trans_id,
+                        output)
+        else:
+            excluded += 1
+
+    return transcripts_num, excluded
 
 
 def build_gene_model(genome,
                         align_db,
-                        clusters,
-                        big_cluster,
+                        genes,
                         find_max,
                         min_transcript_len=0,
                         max_isoforms=1e6,
+                        output=stdout,
+                        verbose=True,
+                        gene_id=0,
+                        max_paths=1000000,
+                        junctions=None,
+                        budget=None,
+                        over_budget=None,
+                        two_exon_trns=None,
+                        params=None,
                     ):
 
-    '''Build and print out gene models.'''
+    '''Build and print out gene models.
 
-    visited_clusters = set()
-    transcripts_num = 0
-    gene_id = 0
-    excluded = 0
-    two_exon_trns = set()
+    Genes are lists of introns from merge_cluster().
+    Gene IDs are numbered from gene_id + 1.
+    Splice sites are looked up in a junction cache shared across loci.
 
-    def check_criteria(transcript, two_exon_trns):
-        '''Return True or False whether a transcript pass or
-        fail the criteria.
+    Isoforms are counted without enumerating paths. With find_max,
+    isoforms are written out as they are enumerated and at most
+    max_paths isoforms are reported for each locus.
 
-        '''
-        transcript_length = sum([align_db.exon_db[e].get_size() \
-                                                for e in transcript])
+    With a watchdog.Budget, splice graphs and transcripts of each
+    locus are built within the budget as in get_transcripts_in_budget()
+    and a locus over budget is skipped. (locus, strand, reason,
+    fallback) of loci over budget are added to over_budget.
+
+    A set of two-exon transcripts can be shared across calls, so each
+    two-exon transcript is reported once. Splice graphs are built with
+    params or parameters of the module.
+
+    '''
 
-        if transcript_length <= min_transcript_len:
-            return False  # fail
+    transcripts_num = 0
+    excluded = 0
+    if two_exon_trns is None:
+        two_exon_trns = set()
+    if over_budget is None:
+        over_budget = []
+
+    for introns in genes:
+        if budget is None:
+            graphs = build_splice_graphs(genome, align_db, introns,
+                                            junctions, params)
         else:
-            if len(transcript) == 2:
-                trns = ','.join(transcript)
-                if trns in two_exon_trns:
-                    return False  # fail
-                else:
-                    two_exon_trns.add(trns)
-                    return True  # pass
-            else:
-                return True
-
-    def exon_to_exonobj(exon):
-        '''Returns an exon objects from a given exon coordinate.'''
-        chrom, coord = exon.split(':')
-        start, end = coord.split('-')
-        return ExonObj(chrom, int(start), int(end))
-
-    for cl_num, cl in enumerate(big_cluster.nodes(), start=1):
-        if cl not in visited_clusters:
-            g = nx.DiGraph()
-            for intron in clusters[cl].nodes():
-                g.add_edges_from(align_db.intron_db[intron].edges())
-
-            visited_clusters.add(cl)
-
-            for neighbor in nx.dfs_tree(big_cluster, cl):
-                neighbor_cluster = clusters[neighbor]
-                for intron in neighbor_cluster.nodes():
-                    g.add_edges_from(align_db.intron_db[intron].edges())
-
-                visited_clusters.add(neighbor)
-            # # nx.draw_spring(nx.algorithms.dfs_tree(g))
-            # nx.draw_spring(g)
-            # plt.show()
-            # for node in g.nodes():
-            #     print node, g[node]
-            # raise SystemExit
-            collapse_exon(g, align_db)
-            for g in split_strand.split(g, genome):
-                if g.nodes():
-                    subalign_db = AlignmentDB()
-                    for edge in g.edges():
-                        exon1 = exon_to_exonobj(edge[0])
-                        exon2 = exon_to_exonobj(edge[1])
-                        add_exon(subalign_db, [exon1, exon2])
-                    collapse_exon(g, subalign_db)
-
-                    trans_id = 0
-                    gene_id += 1
-                    strand = g.graph['strand']
-                    for node in g.nodes():
-                        if not g.predecessors(node):
-                            g.add_edge('Start', node)
-                        if not g.successors(node):
-                            g.add_edge(node, 'End')
-
-                    max_paths = [path for path in \
-                                    nx.all_simple_paths(g, 'Start', 'End')]
-
-                    if find_max:
-                        '''Report all maximum isoforms.'''
-
-                        for transcript in max_paths:
-                            transcript = transcript[1:-1]
-                            if check_criteria(transcript, two_exon_trns):
-                                transcripts_num += 1
-                                trans_id += 1
-                                print_bed(align_db,
-                                            transcript,
-                                            strand,
-                                            gene_id,
-                                            trans_id)
-                            else:
-                                excluded += 1
-                    else:
-                        '''Report minimal isoforms if maximum isoforms exceeds
-                        max_isoforms.
-
-                        '''
-                        if len(max_paths) > max_isoforms:
-                            for transcript in \
-                                    get_min_isoforms.get_min_paths(g, False):
-                                if check_criteria(transcript, two_exon_trns):
-                                    transcripts_num += 1
-                                    trans_id += 1
-                                    print_bed(align_db,
-                                                transcript,
-                                                strand,
-                                                gene_id,
-                                                trans_id)
-                                else:
-                                    excluded += 1
-                        else:
-                            for transcript in max_paths:
-                                transcript = transcript[1:-1]
-                                if check_criteria(transcript, two_exon_trns):
-                                    transcripts_num += 1
-                                    trans_id += 1
-                                    print_bed(align_db,
-                                                transcript,
-                                                strand,
+            try:
+                with budget:
+                    graphs = build_splice_graphs(genome, align_db, introns,
+                                                    junctions, params)
+            except watchdog.BudgetExceeded as e:
+                add_over_budget_locus(over_budget,
+                                        get_intron_locus(align_db, introns),
+                                        '.', e.reason, None)
+                continue
+
+        for g in graphs:
+            gene_id += 1
+            transcripts = None
+            if budget is not None:
+                method, transcripts, reason = get_transcripts_in_budget(g,
+                                                align_db, find_max,
+                                                max_isoforms, max_paths,
+                                                budget)
+                if reason:
+                    add_over_budget_locus(over_budget,
+                                            get_locus(g, align_db),
+                                            g.graph['strand'], reason,
+                                            method)
+
+            gene_transcripts, gene_excluded = write_gene_model(g,
+                                                align_db,
                                                 gene_id,
-                                                trans_id)
-                                else:
-                                    excluded += 1
-
-        print >> stderr, '\r  |--Multi-exon\t\t%d genes, %d isoforms ' % \
-                                            (gene_id, transcripts_num),
+                                                find_max,
+                                                min_transcript_len,
+                                                max_isoforms,
+                                                max_paths,
+                                                two_exon_trns,
+                                                output,
+                                                transcripts)
+            transcripts_num += gene_transcripts
+            excluded += gene_excluded
+
+        if verbose:
+            print >> stderr, '\r  |--Multi-exon\t\t%d genes, %d isoforms ' % \
+                                                (gene_id, transcripts_num),
 
     return gene_id, transcripts_num, excluded
 
 
 def merge_exon(align_db):
-    '''Return merged exons from exons overlapped to each other.'''
-
-    exons = {}
-    for chrom in align_db.single_exons_db:
-        exons[chrom] = []
-        for exn in align_db.single_exons_db[chrom]:
-            if not exn.remove:
-                exons[chrom].append(exn)
-        exons[chrom] = sorted(exons[chrom], key=lambda x: x.start)
+    '''Return a SingleExonIndex of merged single exons
+    of each chromosome.
 
+    '''
     new_exons = {}
-
-    for chrom in exons:
-        i = 0
-        new_exons[chrom] = []
-        curr_exon = exons[chrom][i]
-        while i < len(exons[chrom]):
-            try:
-                next_exon = exons[chrom][i + 1]
-            except IndexError:
-                new_exons[chrom].append(curr_exon)
-                break
-            else:
-                if next_exon.start <= curr_exon.end:
-                    if next_exon.end > curr_exon.end:
-                        next_exon.start = curr_exon.start
-                        curr_exon = next_exon
-                else:
-                    new_exons[chrom].append(curr_exon)
-                    curr_exon = next_exon
-            i += 1
+    for chrom, exons in align_db.single_exons_db.iteritems():
+        exons = [exon for exon in exons if not exon.remove]
+        if not exons:
+            continue
+        starts = np.fromiter((exon.start for exon in exons),
+                                dtype=np.int64, count=len(exons))
+        ends = np.fromiter((exon.end for exon in exons),
+                                dtype=np.int64, count=len(exons))
+        new_exons[chrom] = SingleExonIndex(chrom, starts, ends)
 
     return new_exons
 
 
 def detect_format(input_file):
-    '''Returns a file format detected from input file.'''
+    '''Returns a file format detected from the first line of
+    an input file object from inputs.open_input().
+
+    The line is not consumed, so the file can be parsed from
+    the beginning.
 
-    fp = open(input_file)
-    cols = fp.readline().split()
-    fp.close()
+    '''
+    cols = inputs.peek_line(input_file).split()
 
     if len(cols) == 21:
         if int(cols[11]) <= int(cols[12]) and cols[8] in ['+', '.', '-']:
@@ -685,96 +1290,1774 @@ def detect_format(input_file):
         return None
 
 
-def main(input_files):
-    print >> stderr, 'Gimme : Alignment-based assembler'
-    print >> stderr, 'Version : %s' % (VERSION)
-    print >> stderr, 'Source code : https://github.com/ged-lab/gimme.git\n'
-    print >> stderr, 'Building a sequence DB...'
-    genome = seqdb.SequenceFileDB(args.reference)
+def get_parser(input_file):
+    '''Returns a parser of a format detected from an input file object.'''
 
-    if args.debug:
-        print >> stderr, 'DEBBUG MODE\t' + \
-                'Use this mode for debugging only!\n'
+    input_format = detect_format(input_file)
+    if input_format == 'PSL':
+        return parse_psl
+    elif input_format == 'BED':
+        return parse_bed
+    else:
+        print >> stderr, 'ERROR: Unrecognized input format. ' + \
+                'Use utils/gff2bed.py to convert GFF to BED.'
+        raise SystemExit
 
-    print >> stderr, '[Run...]'
 
-    cluster_no = 0
-    clusters = {}
-    align_db = AlignmentDB()
+def read_alignments(input_files, params=None):
+    '''Yields exons of each alignment from all input files.
+
+    Gaps are filled up to gap_size of params or the module.
+
+    '''
 
-    '''======Detect input format======'''
     for input_file in input_files:
-        input_format = detect_format(input_file)
-        if input_format == 'PSL':
-            parse = parse_psl
-        elif input_format == 'BED':
-            parse = parse_bed
-        else:
-            print >> stderr, 'ERROR: Unrecognized input format. ' + \
-                    'Use utils/gff2bed.py to convert GFF to BED.'
-            raise SystemExit
+        fp = inputs.open_input(input_file)
+
+        '''======Detect input format======'''
+        parse = get_parser(fp)
 
         '''====Parse alignments and build exon objects===='''
         print >> stderr, 'Input\t\t\t%s' % input_file
-        for n, exons in enumerate(parse(open(input_file)), start=1):
-            for group in remove_large_intron(exons, max_intron):
-                if len(group) > 1:
-                    add_exon(align_db, group)  # add exons to exon db
-                    cluster_no = add_intron(group, align_db,
-                                                clusters, cluster_no)
-                else:
-                    exon = group[0]  # add a lone exon to single exon db
-                    if exon.chrom not in align_db.single_exons_db:
-                        align_db.single_exons_db[exon.chrom] = [exon]
-                    else:
-                        align_db.single_exons_db[exon.chrom].append(exon)
+        for n, exons in enumerate(parse(fp, params), start=1):
+            yield exons
 
             if n % 100 == 0:
                 print >> stderr, '\r  |--Parsing\t\t%d alignments' % n,
         print >> stderr, '\r  |--Parsing\t\t%d alignments' % n
+        fp.close()
 
-    '''====Merge overlapped single exons===='''
-    merged_single_exons = merge_exon(align_db)
 
-    '''====Build intervals from single exons.===='''
-    for chrom in merged_single_exons:
-        align_db.single_exons_intervals[chrom] = IntervalTree()
-        for exon in merged_single_exons[chrom]:
-            interval = Interval(exon.start, exon.end, value={'exon': exon})
-            align_db.single_exons_intervals[chrom].insert_interval(interval)
+def parse_file(job):
+    '''Adds alignments of one input file to a new AlignmentDB.
 
-    '''====Connect introns from the same gene to each other===='''
-    big_cluster = merge_cluster(align_db)
+    Job is a tuple of a parser and an input file.
+    Returns a number of alignments and the database.
 
-    '''====Build gene models===='''
-    print >> stderr, 'Constructing'
-    return_items = build_gene_model(genome,
-                                        align_db,
-                                        clusters,
-                                        big_cluster,
-                                        args.max,
-                                        min_transcript_len,
-                                        max_isoforms,
-                                    )
+    '''
+    parse, input_file = job
+    align_db = AlignmentDB()
+    n = 0
+    with inputs.open_input(input_file) as fp:
+        for n, exons in enumerate(parse(fp), start=1):
+            add_alignment(align_db, exons)
+    return n, align_db
+
+
+def parse_file_by_chrom(job):
+    '''Reads alignments of one input file.
+
+    Job is a tuple of a parser and an input file.
+    Returns a number of alignments and a dictionary of lists of
+    alignments of each chromosome. An alignment is a list of
+    (start, end) of exons.
+
+    '''
+    parse, input_file = job
+    alignments = {}
+    n = 0
+    with inputs.open_input(input_file) as fp:
+        for n, exons in enumerate(parse(fp), start=1):
+            alignment = [(exon.start, exon.end) for exon in exons]
+            try:
+                alignments[exons[0].chrom].append(alignment)
+            except KeyError:
+                alignments[exons[0].chrom] = [alignment]
+    return n, alignments
+
+
+def parse_parallel(reader, input_files, processes):
+    '''Parses input files in a pool of processes.
+
+    reader is parse_file() or parse_file_by_chrom().
+    Yields results of each input file in order of input files.
+
+    '''
+    jobs = []
+    for input_file in input_files:
+        with inputs.open_input(input_file) as fp:
+            jobs.append((get_parser(fp), input_file))
+    pool = multiprocessing.Pool(min(processes, len(jobs)))
+    for input_file, (n, result) in izip(input_files,
+                                        pool.imap(reader, jobs)):
+        print >> stderr, 'Input\t\t\t%s' % input_file
+        print >> stderr, '  |--Parsing\t\t%d alignments' % n
+        yield result
+
+    pool.close()
+    pool.join()
+
+
+def read_alignment_db(input_files, processes=None):
+    '''Returns an AlignmentDB of alignments from all input files.
+
+    With more than one process, each input file is parsed into
+    its own database in a pool of processes and the databases are
+    merged in order of input files, which gives the same database
+    as adding alignments one by one.
+
+    '''
+    if not processes or processes < 2 or len(input_files) < 2:
+        align_db = AlignmentDB()
+        for exons in read_alignments(input_files):
+            add_alignment(align_db, exons)
+    else:
+        align_db = None
+        for other in parse_parallel(parse_file, input_files, processes):
+            if align_db is None:
+                align_db = other
+            else:
+                align_db.update(other)
+
+    print >> stderr, '  |--Distinct		%d exon chains' % \
+                                                len(align_db.chain_counts)
+    return align_db
+
+
+def save_snapshot(align_db, filename, key):
+    '''Saves exons, introns, clusters and single exons of
+    an AlignmentDB to a snapshot file.
+
+    '''
+    arrays, meta = get_snapshot_arrays(align_db)
+    snapshot.save(filename, key, arrays, meta)
+
+
+def get_snapshot_arrays(align_db):
+    '''Returns arrays and metadata of an AlignmentDB
+    saved by save_snapshot().
+
+    '''
+    chrom_ids = {}
+    chroms = []
+
+    def get_chrom_id(chrom):
+        try:
+            return chrom_ids[chrom]
+        except KeyError:
+            chrom_ids[chrom] = len(chroms)
+            chroms.append(chrom)
+            return chrom_ids[chrom]
+
+    def to_numpy(values):  # a copy, as values can grow after this
+        return np.frombuffer(values, values.typecode).copy() if values \
+                    else np.zeros(0, values.typecode)
+
+    exons = align_db.exons
+    single_exons = [exon for chrom in sorted(align_db.single_exons_db)
+                        for exon in align_db.single_exons_db[chrom]]
+    intron_db = align_db.intron_db
+    arrays = {
+            'exon_chroms': np.array([get_chrom_id(exon.chrom)
+                                        for exon in exons], dtype=np.int32),
+            'exon_starts': np.array([exon.start for exon in exons],
+                                        dtype=np.int64),
+            'exon_ends': np.array([exon.end for exon in exons],
+                                        dtype=np.int64),
+            'exon_terminals': np.array([exon.terminal or 0
+                                        for exon in exons], dtype=np.int8),
+            'exon_introns': np.array([exon.intron for exon in exons],
+                                        dtype=np.int64),
+            'single_chroms': np.array([get_chrom_id(exon.chrom)
+                                        for exon in single_exons],
+                                        dtype=np.int32),
+            'single_starts': np.array([exon.start for exon in single_exons],
+                                        dtype=np.int64),
+            'single_ends': np.array([exon.end for exon in single_exons],
+                                        dtype=np.int64),
+            'single_removes': np.array([exon.remove
+                                        for exon in single_exons],
+                                        dtype=np.int8),
+            }
+    chains = sorted(align_db.chain_counts.iteritems())
+    arrays['chain_chroms'] = np.array([get_chrom_id(chain[0][0])
+                                        for chain in chains], dtype=np.int32)
+    arrays['chain_sizes'] = np.array([len(chain[0][1]) for chain in chains],
+                                        dtype=np.int64)
+    arrays['chain_coords'] = np.frombuffer(''.join(chain[0][1]
+                                        for chain in chains),
+                                        dtype=np.int_).astype(np.int64)
+    arrays['chain_counts'] = np.array([chain[1] for chain in chains],
+                                        dtype=np.int64)
+    for name in IntronTable.columns:
+        arrays['intron_' + name] = to_numpy(getattr(intron_db, name))
+    arrays['cluster_parents'] = to_numpy(intron_db.clusters.parents)
+    arrays['cluster_ranks'] = to_numpy(intron_db.clusters.ranks)
+
+    return arrays, {'chroms': chroms,
+                    'intron_chroms': list(intron_db.chroms)}
+
+
+def load_snapshot(filename, key):
+    '''Returns an AlignmentDB loaded from a snapshot file or None
+    if the file is not found or it was saved with another key.
+
+    '''
+    saved = snapshot.load(filename, key)
+    if saved is None:
+        return None
 
-    print >> stderr, ''
-    gene_id, transcripts_num, excluded = return_items
+    align_db = read_alignment_snapshot(saved)
+    saved.close()
+    return align_db
+
+
+def read_alignment_snapshot(saved):
+    '''Returns an AlignmentDB from arrays of a Snapshot.'''
+
+    def to_array(typecode, values):
+        return array(typecode, values.astype(typecode).tostring())
+
+    align_db = AlignmentDB()
+    chroms = [intern(chrom) for chrom in saved.meta['chroms']]
+
+    for chrom_id, start, end, terminal, intron in izip(
+                                saved['exon_chroms'].tolist(),
+                                saved['exon_starts'].tolist(),
+                                saved['exon_ends'].tolist(),
+                                saved['exon_terminals'].tolist(),
+                                saved['exon_introns'].tolist()):
+        exon = ExonObj(chroms[chrom_id], start, end)
+        exon.terminal = terminal or None
+        exon.intron = intron
+        align_db.add_exon(exon)
+
+    for chrom_id, start, end, remove in izip(
+                                saved['single_chroms'].tolist(),
+                                saved['single_starts'].tolist(),
+                                saved['single_ends'].tolist(),
+                                saved['single_removes'].tolist()):
+        exon = ExonObj(chroms[chrom_id], start, end)
+        exon.remove = bool(remove)
+        try:
+            align_db.single_exons_db[exon.chrom].append(exon)
+        except KeyError:
+            align_db.single_exons_db[exon.chrom] = [exon]
+
+    coords = saved['chain_coords'].astype(np.int_).tostring()
+    offset = 0
+    for chrom_id, size, count in izip(saved['chain_chroms'].tolist(),
+                                        saved['chain_sizes'].tolist(),
+                                        saved['chain_counts'].tolist()):
+        align_db.chain_counts[chroms[chrom_id],
+                                coords[offset:offset + size]] = count
+        offset += size
+
+    intron_db = align_db.intron_db
+    for chrom in saved.meta['intron_chroms']:
+        intron_db.get_chrom_id(chrom)
+    for name in IntronTable.columns:
+        values = getattr(intron_db, name)
+        setattr(intron_db, name,
+                to_array(values.typecode, saved['intron_' + name]))
+    intron_db.clusters.parents = to_array('l', saved['cluster_parents'])
+    intron_db.clusters.ranks = to_array('b', saved['cluster_ranks'])
+
+    keys = (saved['intron_starts'].astype(np.int64) << 32 |
+                saved['intron_ends']).tolist()
+    for intron, (chrom_id, key) in enumerate(izip(
+                                saved['intron_chrom'].tolist(), keys)):
+        intron_db.index[chrom_id][key] = intron
+
+    return align_db
+
+
+def read_snapshot_or_alignments(input_files, processes=None,
+                                load_from=None, save_to=None):
+    '''Returns an AlignmentDB loaded from a snapshot file or
+    parsed from input files.
+
+    A snapshot is keyed on contents of input files, gap_size,
+    max_intron and SNAPSHOT_LAYOUT. It is not used if any of them
+    has changed, and
+    alignments parsed from input files are saved to save_to.
+
+    '''
+    if load_from or save_to:
+        key = snapshot.file_digest(input_files, gap_size, max_intron,
+                                    SNAPSHOT_LAYOUT)
+
+    if load_from:
+        align_db = load_snapshot(load_from, key)
+        if align_db is not None:
+            print >> stderr, 'Loaded alignments from %s' % load_from
+            return align_db
+        print >> stderr, 'WARNING: %s is not a snapshot of input ' \
+                            'files with current parameters ' \
+                            'and is not used.' % load_from
+
+    align_db = read_alignment_db(input_files, processes)
+    if save_to:
+        save_snapshot(align_db, save_to, key)
+        print >> stderr, 'Saved alignments to %s' % save_to
+    return align_db
+
+
+def merge_regions(regions):
+    '''Returns sorted (chrom, start, end) of regions with overlapping
+    and adjacent regions merged.
+
+    '''
+    merged = []
+    for chrom, start, end in sorted(regions):
+        if merged and merged[-1][0] == chrom and start <= merged[-1][2]:
+            if end > merged[-1][2]:
+                merged[-1] = (chrom, merged[-1][1], end)
+        else:
+            merged.append((chrom, start, end))
+    return merged
+
+
+def parse_regions(specs):
+    '''Returns merged (chrom, start, end) of regions from
+    specifications of regions, e.g. ['chr1:10,001-20,000', 'chr2'].
+
+    A specification is a chromosome, a region with 1-based inclusive
+    positions or a BED file of regions. Positions are 0-based and
+    half-open as in BED.
+
+    '''
+    regions = []
+    for spec in specs:
+        if os.path.isfile(spec):
+            with inputs.open_input(spec) as fp:
+                for line in fp:
+                    cols = line.split()
+                    if not cols or cols[0] in ('track', 'browser') or \
+                            cols[0].startswith('#'):
+                        continue
+                    try:
+                        regions.append((cols[0], int(cols[1]),
+                                            int(cols[2])))
+                    except (IndexError, ValueError):
+                        raise ValueError('Invalid region in %s: %s' %
+                                            (spec, line.strip()))
+            continue
+
+        chrom, sep, span = spec.rpartition(':')
+        if not sep:
+            regions.append((spec, 0, tabix.MAX_POSITION))
+            continue
+        try:
+            start, end = [int(position.replace(',', ''))
+                            for position in span.split('-')]
+        except ValueError:
+            raise ValueError('Invalid region: %s (use chr:start-end '
+                                'or a BED file)' % spec)
+        if start <= 0 or end < start:
+            raise ValueError('Invalid region: %s' % spec)
+        regions.append((chrom, start - 1, end))
+
+    return merge_regions(regions)
+
+
+def expand_regions(tabix_files, regions):
+    '''Returns merged regions extended to the extent of alignments
+    overlapping or adjacent to them in indexed input files.
+
+    Regions are extended until no more alignments are found, so
+    they cover whole loci of alignments overlapping given regions.
+    Only parts of regions not searched before are searched again.
+
+    '''
+    searched = []
+    while True:
+        queries = []
+        for chrom, start, end in merge_regions(
+                                    (chrom, max(start - 1, 0), end + 1)
+                                    for chrom, start, end in regions):
+            for other_chrom, other_start, other_end in searched:
+                if other_chrom != chrom or other_end <= start or \
+                        other_start >= end:
+                    continue
+                if other_start > start:
+                    queries.append((chrom, start, other_start))
+                start = max(start, other_end)
+            if start < end:
+                queries.append((chrom, start, end))
+        if not queries:
+            return regions
+
+        extents = list(regions)
+        for tabix_file in tabix_files:
+            for chrom, start, end in queries:
+                extents.extend((chrom, align_start, align_end)
+                                for align_start, align_end, line in
+                                tabix_file.fetch(chrom, start, end))
+        searched = merge_regions(searched + queries)
+        regions = merge_regions(extents)
+
+
+def read_region_alignments(input_files, regions, params=None):
+    '''Yields exons of alignments of loci overlapping regions from
+    BGZF-compressed input files with tabix indexes.
+
+    Regions are extended to whole loci with expand_regions() and
+    alignments are read in order of input files and lines in a file,
+    so loci are built as from whole input files.
+
+    '''
+    tabix_files = [tabix.TabixFile(input_file)
+                    for input_file in input_files]
+    try:
+        regions = expand_regions(tabix_files, regions)
+        for tabix_file in tabix_files:
+            tids = tabix_file.index.tids
+            lines = [line for chrom, start, end in
+                        sorted((region for region in regions
+                                if region[0] in tids),
+                                key=lambda region: (tids[region[0]],
+                                                    region[1]))
+                        for align_start, align_end, line in
+                            tabix_file.fetch(chrom, start, end)]
+            if not lines:
+                continue
+            fp = StringIO(''.join(lines))
+            parse = get_parser(fp)
+            for exons in parse(fp, params):
+                yield exons
+    finally:
+        for tabix_file in tabix_files:
+            tabix_file.close()
+
+
+def read_region_db(input_files, regions, params=None):
+    '''Returns an AlignmentDB of alignments of loci overlapping
+    regions from indexed input files.
+
+    Alignments are added with params or parameters of the module.
+
+    '''
+    align_db = AlignmentDB()
+    n = 0
+    for n, exons in enumerate(read_region_alignments(input_files,
+                                                        regions, params),
+                                start=1):
+        add_alignment(align_db, exons, params)
+    print >> stderr, 'Input\t\t\t%d regions' % len(regions)
+    print >> stderr, '  |--Reading\t\t%d alignments' % n
+    print >> stderr, '  |--Distinct\t\t%d exon chains' % \
+                                                len(align_db.chain_counts)
+    return align_db
+
+
+def add_alignment(align_db, exons, params=None):
+    '''Adds exons of an alignment to the database.
+
+    Exons are split at introns larger than max_intron of params
+    or the module before they are added.
+
+    '''
+    limit = max_intron if params is None else params.max_intron
+    for group in remove_large_intron(exons, limit):
+        add_exon_group(align_db, group)
+
+
+def add_exon_group(align_db, exons):
+    '''Adds a group of exons to the exon and intron databases
+    or adds a lone exon to the single exon database.
+
+    Identical exon chains are added once and counted in
+    align_db.chain_counts. Adding a chain again does not change
+    exons, introns or single exons that are built into gene models.
+
+    '''
+    if not align_db.add_chain(exons):
+        return
+
+    if len(exons) > 1:
+        if align_db.changed_spans is not None:
+            align_db.changed_spans.append((exons[0].chrom, exons[0].start,
+                                            exons[-1].end))
+        add_exon(align_db, exons)  # add exons to exon db
+        add_intron(exons, align_db)
+    else:
+        exon = exons[0]  # add a lone exon to single exon db
+        if exon.chrom not in align_db.single_exons_db:
+            align_db.single_exons_db[exon.chrom] = [exon]
+        else:
+            align_db.single_exons_db[exon.chrom].append(exon)
+
+
+def build_single_exon_intervals(align_db):
+    '''Merges overlapped single exons and builds intervals
+    from them.
+
+    Returns merged single exons of each chromosome.
+
+    '''
+    merged_single_exons = merge_exon(align_db)
+    align_db.single_exons_intervals.update(merged_single_exons)
+
+    return merged_single_exons
+
+
+def print_single_exon_genes(merged_single_exons, gene_id,
+                                output=stdout, verbose=True,
+                                min_exon_len=None):
+    '''Print single exon genes that pass the criteria.
+
+    Exons longer than min_exon_len or min_single_exon_len if it
+    is not given are reported.
+
+    Returns the last gene ID, a number of single exon genes and
+    a number of excluded exons.
+
+    '''
+    if min_exon_len is None:
+        min_exon_len = min_single_exon_len
 
     single_exon_gene_num = 0
+    excluded = 0
     for chrom in merged_single_exons:
         for exon in merged_single_exons[chrom]:
-            if (exon.get_size() > min_single_exon_len
+            if (exon.get_size() > min_exon_len
                                     and not exon.remove):
                 gene_id += 1
-                transcripts_num += 1
                 single_exon_gene_num += 1
-                print_bed_single(exon, gene_id, 1)
-                print >> stderr, '\r  |--Single-exon\t%d genes' % \
+                print_bed_single(exon, gene_id, 1, output)
+                if verbose:
+                    print >> stderr, '\r  |--Single-exon\t%d genes' % \
                                                     single_exon_gene_num,
             else:
                 excluded += 1
 
-    '''====Print out summary report to standard error===='''
+    return gene_id, single_exon_gene_num, excluded
+
+
+def assemble(genome, align_db, find_max,
+                gene_id=0, output=stdout, verbose=True, junctions=None,
+                params=None, over_budget=None):
+    '''Build and print out gene models and single exon genes
+    from alignments in the database.
+
+    Gene models are built with params or parameters of the module.
+    Loci over the locus budget of params are added to over_budget
+    or over_budget_loci.
+
+    Returns the last gene ID and numbers of isoforms, excluded
+    transcripts and single exon genes.
+
+    '''
+    if params is None:
+        params = get_parameters()
+    if over_budget is None:
+        over_budget = over_budget_loci
+
+    '''====Merge overlapped single exons and build intervals===='''
+    merged_single_exons = build_single_exon_intervals(align_db)
+
+    '''====Connect introns from the same gene to each other===='''
+    genes = merge_cluster(align_db)
+
+    '''====Build gene models===='''
+    gene_id, transcripts_num, excluded = build_gene_model(genome,
+                                                align_db,
+                                                genes,
+                                                find_max,
+                                                params.min_transcript_len,
+                                                params.max_isoforms,
+                                                output,
+                                                verbose,
+                                                gene_id,
+                                                params.max_paths,
+                                                junctions,
+                                                params.get_budget(),
+                                                over_budget,
+                                                params=params,
+                                            )
+    if verbose:
+        print >> stderr, ''
+
+    gene_id, single_exon_gene_num, single_excluded = \
+                print_single_exon_genes(merged_single_exons, gene_id,
+                                            output, verbose,
+                                            params.min_single_exon_len)
+
+    return (gene_id, transcripts_num + single_exon_gene_num,
+                excluded + single_excluded, single_exon_gene_num)
+
+
+class AssembledLocus(object):
+    '''Gene models of a cluster of introns kept in an assembly state.
+
+    span = (chrom, start, end) of exons of the cluster
+    models = gene models in BED format with gene IDs from 1
+    exon_starts, exon_ends = arrays of exons checked against single
+        exons, so single exons are removed again without rebuilding
+
+    '''
+    __slots__ = ('span', 'genes', 'transcripts', 'excluded', 'models',
+                    'exon_starts', 'exon_ends')
+
+    def __init__(self, span, genes, transcripts, excluded, models,
+                    exon_starts, exon_ends):
+        self.span = span
+        self.genes = genes
+        self.transcripts = transcripts
+        self.excluded = excluded
+        self.models = models
+        self.exon_starts = exon_starts
+        self.exon_ends = exon_ends
+
+
+def get_cluster_span(align_db, introns):
+    '''Returns (chrom, start, end) of exons of a cluster of introns.'''
+
+    intron_db = align_db.intron_db
+    exons = [align_db.exons[exon_id] for intron in introns
+                for edge in intron_db.edges(intron) for exon_id in edge]
+    return (exons[0].chrom, min(exon.start for exon in exons),
+                max(exon.end for exon in exons))
+
+
+def find_changed_loci(align_db, genes, loci, changed_spans):
+    '''Returns a list of True for clusters of introns from
+    merge_cluster() that have to be rebuilt and False for clusters
+    with gene models in loci.
+
+    A cluster is rebuilt if it is not in loci or its exons overlap
+    a new exon chain in changed_spans. Clusters can share exons and
+    terminals of shared exons are changed while a cluster is built,
+    so overlapping clusters are rebuilt together.
+
+    '''
+    new_spans = {}
+    for chrom, start, end in sorted(changed_spans):
+        spans = new_spans.setdefault(chrom, ([], []))
+        if spans[0] and start <= spans[1][-1]:
+            spans[1][-1] = max(spans[1][-1], end)
+        else:
+            spans[0].append(start)
+            spans[1].append(end)
+
+    def is_new(span):
+        chrom, start, end = span
+        try:
+            starts, ends = new_spans[chrom]
+        except KeyError:
+            return False
+        i = bisect.bisect_right(starts, end) - 1
+        return i >= 0 and ends[i] >= start
+
+    spans = []
+    changed = []
+    for introns in genes:
+        locus = loci.get(introns[0])
+        if locus is None or is_new(locus.span):
+            spans.append(get_cluster_span(align_db, introns))
+            changed.append(True)
+        else:
+            spans.append(locus.span)
+            changed.append(False)
+
+    component = []
+    component_changed = False
+    last_chrom, last_end = None, None
+    for i in sorted(range(len(spans)), key=spans.__getitem__):
+        chrom, start, end = spans[i]
+        if chrom != last_chrom or start > last_end:
+            if component_changed:
+                for j in component:
+                    changed[j] = True
+            component = []
+            component_changed = False
+            last_chrom, last_end = chrom, end
+        component.append(i)
+        component_changed = component_changed or changed[i]
+        last_end = max(last_end, end)
+
+    if component_changed:
+        for j in component:
+            changed[j] = True
+
+    return changed
+
+
+def build_locus(genome, align_db, introns, find_max, junctions=None,
+                    two_exon_trns=None, params=None, over_budget=None):
+    '''Builds gene models of a cluster of introns and returns
+    an AssembledLocus.
+
+    Gene models are built with params or parameters of the module as
+    in assemble() and loci over the locus budget of params are added
+    to over_budget or over_budget_loci.
+
+    '''
+    if params is None:
+        params = get_parameters()
+    if over_budget is None:
+        over_budget = over_budget_loci
+
+    output = StringIO()
+    align_db.collapsed_exons = []
+    try:
+        genes, transcripts_num, excluded = build_gene_model(genome,
+                                                align_db,
+                                                [introns],
+                                                find_max,
+                                                params.min_transcript_len,
+                                                params.max_isoforms,
+                                                output,
+                                                False,
+                                                0,
+                                                params.max_paths,
+                                                junctions,
+                                                params.get_budget(),
+                                                over_budget,
+                                                two_exon_trns,
+                                                params=params,
+                                            )
+        exons = align_db.collapsed_exons
+    finally:
+        align_db.collapsed_exons = None
+
+    return AssembledLocus(get_cluster_span(align_db, introns), genes,
+                            transcripts_num, excluded, output.getvalue(),
+                            np.array([start for start, end in exons],
+                                        dtype=np.int64),
+                            np.array([end for start, end in exons],
+                                        dtype=np.int64))
+
+
+def write_locus(locus, gene_id, output=stdout):
+    '''Writes gene models of a locus with gene IDs from gene_id + 1.'''
+
+    if not gene_id:
+        output.write(locus.models)
+        return
+
+    for line in locus.models.splitlines(True):
+        fields = line.split('\t', 4)
+        name, tran_id = fields[3].rsplit('.', 1)
+        chrom, locus_gene_id = name.rsplit(':', 1)
+        fields[3] = '%s:%d.%s' % (chrom, int(locus_gene_id) + gene_id,
+                                    tran_id)
+        output.write('\t'.join(fields))
+
+
+def assemble_incremental(genome, align_db, find_max, loci, changed_spans,
+                            output=stdout, verbose=True, junctions=None,
+                            params=None, over_budget=None):
+    '''Build and print out gene models as in assemble() with gene
+    models of unchanged loci taken from a previous run.
+
+    loci is a dictionary of an AssembledLocus of each cluster keyed on
+    its first intron and changed_spans are (chrom, start, end) of exon
+    chains added after it. Only clusters found by find_changed_loci()
+    are rebuilt and single exons are removed by exons of other
+    clusters kept in loci. Loci are built with params or parameters
+    of the module as in build_locus().
+
+    Returns the last gene ID and numbers of isoforms, excluded
+    transcripts and single exon genes as assemble() and
+    a dictionary of an AssembledLocus of each cluster.
+
+    '''
+    if params is None:
+        params = get_parameters()
+
+    merged_single_exons = build_single_exon_intervals(align_db)
+    genes = merge_cluster(align_db)
+    changed = find_changed_loci(align_db, genes, loci, changed_spans)
+
+    new_loci = {}
+    two_exon_trns = set()
+    gene_id = 0
+    transcripts_num = 0
+    excluded = 0
+    rebuilt = 0
+    for introns, is_changed in izip(genes, changed):
+        if is_changed:
+            locus = build_locus(genome, align_db, introns, find_max,
+                                    junctions, two_exon_trns, params,
+                                    over_budget)
+            rebuilt += 1
+        else:
+            locus = loci[introns[0]]
+            try:
+                singles = align_db.single_exons_intervals[locus.span[0]]
+            except KeyError:
+                pass
+            else:
+                remove_redundant_intervals(locus.exon_starts,
+                                            locus.exon_ends, singles)
+
+        new_loci[introns[0]] = locus
+        write_locus(locus, gene_id, output)
+        gene_id += locus.genes
+        transcripts_num += locus.transcripts
+        excluded += locus.excluded
+
+        if verbose:
+            print >> stderr, '\r  |--Multi-exon\t\t%d genes, %d isoforms ' % \
+                                                (gene_id, transcripts_num),
+    if verbose:
+        print >> stderr, ''
+        print >> stderr, '  |--Rebuilt\t\t%d of %d loci' % (rebuilt,
+                                                            len(genes))
+
+    gene_id, single_exon_gene_num, single_excluded = \
+                print_single_exon_genes(merged_single_exons, gene_id,
+                                            output, verbose,
+                                            params.min_single_exon_len)
+
+    return (gene_id, transcripts_num + single_exon_gene_num,
+                excluded + single_excluded, single_exon_gene_num), new_loci
+
+
+def get_state_key(params=None):
+    '''Returns a key of an assembly state saved by save_state()
+    with params or parameters of the module.
+
+    '''
+    params = params or get_parameters()
+    return ('state', params.gap_size, params.max_intron, SNAPSHOT_LAYOUT)
+
+
+def get_assembly_settings(find_max, params=None):
+    '''Returns parameters of gene models kept in an assembly state
+    from params or parameters of the module.
+
+    '''
+    params = params or get_parameters()
+    limits = None
+    if params.get_budget() is not None:
+        limits = (params.locus_time_limit, params.locus_memory_limit)
+    return (params.min_utr, params.min_transcript_len,
+                params.min_single_exon_len, params.max_isoforms,
+                params.max_paths, bool(find_max), limits)
+
+
+def save_state(filename, arrays, meta, loci, params=None):
+    '''Saves an assembly state, arrays and metadata of an AlignmentDB
+    from get_snapshot_arrays() and a dictionary of an AssembledLocus
+    of each cluster, to a file.
+
+    The state is written to a temporary file first, so the previous
+    state is kept if saving fails. It is keyed on params or parameters
+    of the module as in get_state_key().
+
+    '''
+    keys = sorted(loci)
+    records = [loci[key] for key in keys]
+    models = ''.join(locus.models for locus in records)
+    arrays = dict(arrays)
+    arrays.update({
+            'locus_keys': np.array(keys, dtype=np.int64),
+            'locus_starts': np.array([locus.span[1] for locus in records],
+                                        dtype=np.int64),
+            'locus_ends': np.array([locus.span[2] for locus in records],
+                                        dtype=np.int64),
+            'locus_genes': np.array([locus.genes for locus in records],
+                                        dtype=np.int64),
+            'locus_transcripts': np.array([locus.transcripts
+                                        for locus in records],
+                                        dtype=np.int64),
+            'locus_excluded': np.array([locus.excluded
+                                        for locus in records],
+                                        dtype=np.int64),
+            'locus_text_offsets': np.cumsum([0] + [len(locus.models)
+                                        for locus in records],
+                                        dtype=np.int64),
+            'locus_text': np.frombuffer(models, dtype=np.uint8),
+            'locus_exon_offsets': np.cumsum([0] + [len(locus.exon_starts)
+                                        for locus in records],
+                                        dtype=np.int64),
+            'locus_exon_starts': np.concatenate([np.zeros(0, np.int64)] +
+                                        [locus.exon_starts
+                                        for locus in records]),
+            'locus_exon_ends': np.concatenate([np.zeros(0, np.int64)] +
+                                        [locus.exon_ends
+                                        for locus in records]),
+            })
+    snapshot.save(filename + '.tmp', get_state_key(params), arrays, meta)
+    os.rename(filename + '.tmp', filename)
+
+
+def load_state(filename, params=None):
+    '''Returns an AlignmentDB, a dictionary of an AssembledLocus of
+    each cluster and metadata loaded from an assembly state file.
+
+    None is returned if the file is not found and SystemExit is
+    raised if it is not a state saved with params or current parameters.
+
+    '''
+    if not os.path.exists(filename):
+        return None
+
+    saved = snapshot.load(filename, get_state_key(params))
+    if saved is None:
+        print >> stderr, 'ERROR: %s is not an assembly state saved ' \
+                            'with current parameters.' % filename
+        raise SystemExit
+
+    align_db = read_alignment_snapshot(saved)
+    intron_db = align_db.intron_db
+    chroms = intron_db.chroms
+    models = saved['locus_text'].tostring()
+    text_offsets = saved['locus_text_offsets'].tolist()
+    exon_offsets = saved['locus_exon_offsets'].tolist()
+    exon_starts = saved['locus_exon_starts'].copy()
+    exon_ends = saved['locus_exon_ends'].copy()
+
+    loci = {}
+    for i, (key, start, end, genes, transcripts_num, excluded) in \
+                                enumerate(izip(saved['locus_keys'].tolist(),
+                                    saved['locus_starts'].tolist(),
+                                    saved['locus_ends'].tolist(),
+                                    saved['locus_genes'].tolist(),
+                                    saved['locus_transcripts'].tolist(),
+                                    saved['locus_excluded'].tolist())):
+        loci[key] = AssembledLocus((chroms[intron_db.chrom[key]], start, end),
+                        genes, transcripts_num, excluded,
+                        models[text_offsets[i]:text_offsets[i + 1]],
+                        exon_starts[exon_offsets[i]:exon_offsets[i + 1]],
+                        exon_ends[exon_offsets[i]:exon_offsets[i + 1]])
+
+    meta = saved.meta
+    saved.close()
+    return align_db, loci, meta
+
+
+def assemble_state(input_files, genome, find_max, state_file,
+                    output=stdout, junctions=None, params=None):
+    '''Adds alignments of input files to an assembly state, writes
+    gene models of all alignments in the state and saves the state.
+
+    Only loci changed by new alignments are rebuilt, see
+    assemble_incremental(). Input files already added to the state
+    are skipped. All loci are rebuilt if parameters of gene models
+    have changed. A new state is started if the file is not found.
+    Gene models are built with params or parameters of the module.
+
+    Returns the last gene ID and numbers of isoforms, excluded
+    transcripts and single exon genes as assemble().
+
+    '''
+    if params is None:
+        params = get_parameters()
+    settings = get_assembly_settings(find_max, params)
+    state = load_state(state_file, params)
+    if state is None:
+        align_db, loci, meta = AlignmentDB(), {}, {'inputs': []}
+        print >> stderr, 'Starting a new assembly state %s' % state_file
+    else:
+        align_db, loci, meta = state
+        print >> stderr, 'Loaded an assembly state of %d files and %d ' \
+                            'loci from %s' % (len(meta['inputs']),
+                                                len(loci), state_file)
+        if meta['settings'] != settings:
+            print >> stderr, 'WARNING: parameters of gene models have ' \
+                                'changed and all loci are rebuilt.'
+            loci = {}
+
+    added = list(meta['inputs'])
+    new_files = []
+    for input_file in input_files:
+        digest = snapshot.file_digest([input_file])
+        if digest in added:
+            print >> stderr, 'WARNING: %s is already in the assembly ' \
+                                'state and is skipped.' % input_file
+            continue
+        added.append(digest)
+        new_files.append(input_file)
+
+    align_db.changed_spans = []
+    for exons in read_alignments(new_files, params):
+        add_alignment(align_db, exons, params)
+    changed_spans = align_db.changed_spans
+    align_db.changed_spans = None
+
+    '''====Keep alignments before terminals are changed by assembly===='''
+    arrays, db_meta = get_snapshot_arrays(align_db)
+
+    print >> stderr, 'Constructing'
+    return_items, loci = assemble_incremental(genome, align_db, find_max,
+                                                loci, changed_spans, output,
+                                                junctions=junctions,
+                                                params=params)
+
+    db_meta.update({'inputs': added, 'settings': settings})
+    save_state(state_file, arrays, db_meta, loci, params)
+    print >> stderr, 'Saved an assembly state to %s' % state_file
+
+    return return_items
+
+
+SWEEP_PARAMETERS = ('min_utr', 'max_isoforms', 'min_transcript_len',
+                        'min_single_exon_len', 'max_paths')
+
+
+def parse_sweep(specs):
+    '''Returns names of swept parameters and a list of settings
+    from specifications of parameters, e.g. ['min_utr=50,100'].
+
+    A setting is a dictionary of values of all SWEEP_PARAMETERS.
+    Settings are all combinations of given values and parameters
+    not given keep their current values.
+
+    '''
+    names = []
+    values = []
+    for spec in specs:
+        name, _, spec_values = spec.partition('=')
+        name = name.strip()
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError('Unknown sweep parameter: %s (use %s)' %
+                                (name, ', '.join(SWEEP_PARAMETERS)))
+        if name in names:
+            raise ValueError('Sweep parameter given twice: %s' % name)
+        try:
+            spec_values = [int(value) for value in spec_values.split(',')]
+        except ValueError:
+            raise ValueError('Invalid sweep values: %s' % spec)
+        if min(spec_values) <= 0:
+            raise ValueError('Invalid sweep values (<=0): %s' % spec)
+        names.append(name)
+        values.append(spec_values)
+
+    current = dict((name, globals()[name]) for name in SWEEP_PARAMETERS)
+    settings = []
+    for combination in product(*values):
+        setting = dict(current)
+        setting.update(zip(names, combination))
+        settings.append(setting)
+
+    return names, settings
+
+
+def get_sweep_label(names, setting):
+    return '.'.join('%s_%d' % (name, setting[name]) for name in names)
+
+
+def assemble_sweep(genome, align_db, find_max, settings, outputs,
+                    verbose=True, junctions=None):
+    '''Build and print out gene models with each setting
+    of parameters from parse_sweep() to its output.
+
+    Single exons are merged and introns are clustered once for all
+    settings. Splice graphs are built once for settings with the same
+    min_utr, which is the only parameter used before isoforms are
+    searched.
+
+    Returns the last gene ID and numbers of isoforms, excluded
+    transcripts and single exon genes of each setting.
+
+    '''
+    merged_single_exons = build_single_exon_intervals(align_db)
+    genes = merge_cluster(align_db)
+    terminals = [exon.terminal for exon in align_db.exons]
+    default_params = get_parameters(find_max)
+
+    results = [None] * len(settings)
+    utrs = []
+    for setting in settings:
+        if setting['min_utr'] not in utrs:
+            utrs.append(setting['min_utr'])
+
+    for utr in utrs:
+        '''Exon terminals and single exons are changed
+        by collapse_exon() and are reset for each min_utr.
+
+        '''
+        params = default_params.replace(min_utr=utr)
+        for exon, terminal in izip(align_db.exons, terminals):
+            exon.terminal = terminal
+        for singles in merged_single_exons.itervalues():
+            singles.removed[:] = False
+
+        group = [i for i, setting in enumerate(settings)
+                    if setting['min_utr'] == utr]
+        counts = dict((i, [0, 0]) for i in group)
+        two_exon_trns = dict((i, set()) for i in group)
+        gene_id = 0
+        for introns in genes:
+            for g in build_splice_graphs(genome, align_db, introns,
+                                            junctions, params):
+                gene_id += 1
+                for i in group:
+                    setting = settings[i]
+                    transcripts_num, excluded = write_gene_model(g,
+                                            align_db,
+                                            gene_id,
+                                            find_max,
+                                            setting['min_transcript_len'],
+                                            setting['max_isoforms'],
+                                            setting['max_paths'],
+                                            two_exon_trns[i],
+                                            outputs[i])
+                    counts[i][0] += transcripts_num
+                    counts[i][1] += excluded
+
+            if verbose:
+                print >> stderr, '\r  |--min_utr=%d\t\t%d genes ' % \
+                                                        (utr, gene_id),
+
+        for i in group:
+            last_gene_id, single_exon_gene_num, single_excluded = \
+                    print_single_exon_genes(merged_single_exons,
+                                    gene_id, outputs[i], False,
+                                    settings[i]['min_single_exon_len'])
+            transcripts_num, excluded = counts[i]
+            results[i] = (last_gene_id,
+                            transcripts_num + single_exon_gene_num,
+                            excluded + single_excluded,
+                            single_exon_gene_num)
+
+    if verbose:
+        print >> stderr, ''
+
+    for exon, terminal in izip(align_db.exons, terminals):
+        exon.terminal = terminal
+
+    return results
+
+
+def write_sweep_summary(output, names, settings, results):
+    '''Writes numbers of genes and isoforms of each setting
+    in a tab-delimited table.
+
+    '''
+    print >> output, '\t'.join(names + ['genes', 'isoforms',
+                                        'single_exon_genes', 'excluded'])
+    for setting, (gene_id, transcripts_num, excluded,
+                    single_exon_gene_num) in izip(settings, results):
+        print >> output, '\t'.join([str(setting[name]) for name in names] +
+                                    [str(gene_id), str(transcripts_num),
+                                        str(single_exon_gene_num),
+                                        str(excluded)])
+
+
+def init_worker(reference):
+    '''Opens a reference genome in a worker process.'''
+
+    global worker_genome
+    worker_genome = open_genome(reference)
+
+
+def assemble_chrom(job):
+    '''Build gene models from alignments of one chromosome
+    with a genome opened by init_worker().
+
+    Job is a tuple of a chromosome name, a list of alignments,
+    find_max flag, junctions of the chromosome from a junction cache
+    or None and Parameters or None for parameters of the module.
+    An alignment is a list of (start, end) of exons.
+
+    Returns results of assemble_chrom_alignments().
+
+    '''
+    return assemble_chrom_alignments(worker_genome, *job)
+
+
+def assemble_chrom_alignments(genome, chrom, alignments, find_max,
+                                junctions=None, params=None):
+    '''Build gene models from alignments of one chromosome as
+    in assemble_chrom().
+
+    Gene IDs start from one in each chromosome. Single exon genes are
+    numbered after multi-exon genes of the same chromosome.
+
+    Returns a chromosome name, gene models in BED format, numbers
+    of genes, isoforms, excluded transcripts and single exon genes,
+    updated junctions of the chromosome if junctions are given and
+    loci over the locus budget.
+
+    '''
+    if params is None:
+        params = get_parameters()
+    over_budget = []
+
+    junction_cache = split_strand.JunctionCache()
+    if junctions is not None:
+        junction_cache.junctions[chrom] = junctions
+
+    align_db = AlignmentDB()
+    for alignment in alignments:
+        exons = [ExonObj(chrom, start, end) for start, end in alignment]
+        add_alignment(align_db, exons, params)
+
+    output = StringIO()
+    gene_id, transcripts_num, excluded, single_exon_gene_num = \
+                assemble(genome, align_db, find_max,
+                            output=output, verbose=False,
+                            junctions=junction_cache, params=params,
+                            over_budget=over_budget)
+
+    if junctions is not None:
+        junctions = junction_cache.junctions.get(chrom, {})
+
+    return (chrom, output.getvalue(), gene_id, transcripts_num,
+                excluded, single_exon_gene_num, junctions, over_budget)
+
+
+def assemble_parallel(input_files, reference, find_max, processes,
+                        junction_cache=None, output=stdout,
+                        parse_processes=None):
+    '''Build gene models of each chromosome in a pool of processes.
+
+    Alignments are partitioned by chromosome and gene models are
+    written out in order of chromosome names, so the output does not
+    depend on the number of processes.
+
+    Junctions of each chromosome are sent to a worker with a job
+    and junctions found by the worker are added back to junction_cache.
+    Loci over locus_budget in workers are added to over_budget_loci.
+
+    Input files are parsed in parallel with parse_processes processes.
+
+    '''
+    alignments = {}
+    if parse_processes and parse_processes > 1 and len(input_files) > 1:
+        for file_alignments in parse_parallel(parse_file_by_chrom,
+                                        input_files, parse_processes):
+            for chrom, chrom_alignments in file_alignments.iteritems():
+                try:
+                    alignments[chrom].extend(chrom_alignments)
+                except KeyError:
+                    alignments[chrom] = chrom_alignments
+    else:
+        for exons in read_alignments(input_files):
+            chrom = exons[0].chrom
+            alignment = [(exon.start, exon.end) for exon in exons]
+            try:
+                alignments[chrom].append(alignment)
+            except KeyError:
+                alignments[chrom] = [alignment]
+
+    params = get_parameters(find_max)
+    if junction_cache is None:
+        jobs = [(chrom, alignments.pop(chrom), find_max, None, params)
+                    for chrom in sorted(alignments)]
+    else:
+        jobs = [(chrom, alignments.pop(chrom), find_max,
+                    junction_cache.junctions.get(chrom, {}), params)
+                    for chrom in sorted(alignments)]
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, init_worker, (reference,))
+        results = pool.imap(assemble_chrom, jobs)
+    else:
+        init_worker(reference)
+        results = (assemble_chrom(job) for job in jobs)
+
+    total_genes = total_transcripts = total_excluded = 0
+    total_single_exon_genes = 0
+    for chrom, models, gene_id, transcripts_num, excluded, \
+            single_exon_gene_num, junctions, over_budget in results:
+        output.write(models)
+        over_budget_loci.extend(over_budget)
+        if junction_cache is not None:
+            junction_cache.junctions[chrom] = junctions
+        total_genes += gene_id
+        total_transcripts += transcripts_num
+        total_excluded += excluded
+        total_single_exon_genes += single_exon_gene_num
+        print >> stderr, '\r  |--Chromosome\t\t%s done' % chrom,
+
+    if processes > 1:
+        pool.close()
+        pool.join()
+
+    return (total_genes, total_transcripts,
+                total_excluded, total_single_exon_genes)
+
+
+class Transcript(object):
+    '''A gene model reported by an Assembler.
+
+    exons = a list of (start, end) of exons
+    gene_id and transcript_id are numbered in each chromosome as in
+    names of gene models, chrom:gene_id.transcript_id.
+
+    '''
+    __slots__ = ('chrom', 'start', 'end', 'strand', 'gene_id',
+                    'transcript_id', 'exons')
+
+    def __init__(self, chrom, start, end, strand, gene_id, transcript_id,
+                    exons):
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.strand = strand
+        self.gene_id = gene_id
+        self.transcript_id = transcript_id
+        self.exons = exons
+
+    @classmethod
+    def from_bed(cls, line):
+        '''Returns a Transcript of a line written by print_bed().'''
+
+        fields = line.rstrip('\r\n').split('\t')
+        chrom_start = int(fields[1])
+        gene_id, transcript_id = fields[3].rsplit(':', 1)[1].split('.')
+        exons = []
+        for size, start in izip(fields[10].split(','),
+                                fields[11].split(',')):
+            start = chrom_start + int(start)
+            exons.append((start, start + int(size)))
+        return cls(fields[0], chrom_start, int(fields[2]), fields[5],
+                    int(gene_id), int(transcript_id), exons)
+
+    @property
+    def name(self):
+        return '%s:%d.%d' % (self.chrom, self.gene_id, self.transcript_id)
+
+    def to_bed(self):
+        '''Returns a line of the gene model in BED format.'''
+
+        return bedwriter.format_bed(self.chrom, self.start, self.end,
+                    self.name, self.strand,
+                    ','.join(str(end - start) for start, end in self.exons),
+                    ','.join(str(start - self.start)
+                                for start, end in self.exons))
+
+
+class Assembler(object):
+    '''Builds gene models of alignments with a reference genome,
+    a junction cache and a pool of processes kept open across
+    assemblies, so many small assemblies can be run in one process
+    with different parameters.
+
+        with Assembler('genome.fa', Parameters(min_utr=50)) as assembler:
+            for transcript in assembler.assemble(assembler.read(files)):
+                print transcript.name, transcript.exons
+
+    Alignments are lists of ExonObj of each alignment, e.g. from
+    read(). Exons are copied to a database of each assembly, so
+    alignments are not changed and can be reused. Gene models of each
+    chromosome are built as with --processes, so gene IDs start from
+    one in each chromosome.
+
+    genome = a reference genome or a file name of a genome,
+        which is required with more than one process
+    params = Parameters or None for defaults
+    junctions = a split_strand.JunctionCache shared across assemblies
+
+    Loci over a budget of params are added to over_budget.
+
+    '''
+    def __init__(self, genome, params=None, processes=None,
+                    junctions=None):
+        if processes and processes > 1 and \
+                not isinstance(genome, basestring):
+            raise ValueError('A file name of a genome is required '
+                                'with more than one process')
+        self.reference = genome
+        if isinstance(genome, basestring):
+            genome = open_genome(genome)
+        self.genome = genome
+        self.params = params or Parameters()
+        self.junctions = junctions or split_strand.JunctionCache()
+        self.over_budget = []
+        self.pool = None
+        if processes and processes > 1:
+            self.pool = multiprocessing.Pool(processes, init_worker,
+                                                (self.reference,))
+
+    def read(self, input_files, regions=None):
+        '''Yields alignments of PSL or BED files parsed with
+        gap_size of the parameters.
+
+        With regions from parse_regions(), only alignments of loci
+        overlapping regions are read from indexed input files.
+
+        '''
+        if regions is not None:
+            for exons in read_region_alignments(input_files, regions,
+                                                self.params):
+                yield exons
+            return
+
+        for input_file in input_files:
+            with inputs.open_input(input_file) as fp:
+                parse = get_parser(fp)
+                for exons in parse(fp, self.params):
+                    yield exons
+
+    def assemble_chroms(self, alignments, params=None):
+        '''Yields results of assemble_chrom_alignments() of each
+        chromosome in order of chromosome names.
+
+        Parameters of the assembler are used unless params is given.
+
+        '''
+        params = params or self.params
+        chrom_alignments = {}
+        for exons in alignments:
+            alignment = [(exon.start, exon.end) for exon in exons]
+            try:
+                chrom_alignments[exons[0].chrom].append(alignment)
+            except KeyError:
+                chrom_alignments[exons[0].chrom] = [alignment]
+
+        jobs = ((chrom, chrom_alignments.pop(chrom), params.find_max,
+                    self.junctions.junctions.get(chrom, {}), params)
+                    for chrom in sorted(chrom_alignments))
+        if self.pool:
+            results = self.pool.imap(assemble_chrom, jobs)
+        else:
+            results = (assemble_chrom_alignments(self.genome, *job)
+                        for job in jobs)
+
+        for result in results:
+            self.junctions.junctions[result[0]] = result[-2]
+            self.over_budget.extend(result[-1])
+            yield result
+
+    def assemble(self, alignments, params=None):
+        '''Yields a Transcript of each gene model of alignments.'''
+
+        for result in self.assemble_chroms(alignments, params):
+            for line in result[1].splitlines():
+                yield Transcript.from_bed(line)
+
+    def write(self, alignments, output=stdout, params=None):
+        '''Writes gene models of alignments in BED format.
+
+        Returns numbers of genes, isoforms, excluded transcripts and
+        single exon genes of all chromosomes.
+
+        '''
+        totals = [0, 0, 0, 0]
+        for result in self.assemble_chroms(alignments, params):
+            output.write(result[1])
+            for i, count in enumerate(result[2:6]):
+                totals[i] += count
+        return tuple(totals)
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def merge_sorted_alignments(input_files, params=None):
+    '''Yields exons of each alignment from coordinate-sorted input files.
+
+    Files are merged one chromosome at a time. The next chromosome is
+    the current chromosome of the first file with alignments left and
+    its alignments are merged from all files by start positions, so
+    chromosomes are merged in order of the first file, then of later
+    files, and every file must list its chromosomes in this order.
+    Gaps are filled as in read_alignments().
+
+    '''
+    if len(input_files) == 1:
+        for exons in read_alignments(input_files, params):
+            yield exons
+        return
+
+    heads = []  # [exons, alignments] of the next alignment of each file
+    for input_file in input_files:
+        alignments = read_alignments([input_file], params)
+        exons = next(alignments, None)
+        if exons is not None:
+            heads.append([exons, alignments])
+
+    merged_chroms = set()
+    while heads:
+        chrom = heads[0][0][0].chrom
+        if chrom in merged_chroms:
+            print >> stderr, '\nERROR: Input is not sorted by ' + \
+                    'chromosome (%s). Input files must list ' % chrom + \
+                    'chromosomes in the same order.'
+            raise SystemExit(1)
+        merged_chroms.add(chrom)
+
+        heap = [(exons[0].start, n, exons, alignments)
+                    for n, (exons, alignments) in enumerate(heads)
+                    if exons[0].chrom == chrom]
+        heapq.heapify(heap)
+        while heap:
+            start, n, exons, alignments = heap[0]
+            yield exons
+            exons = next(alignments, None)
+            if exons is not None and exons[0].chrom == chrom:
+                heapq.heapreplace(heap, (exons[0].start, n, exons,
+                                            alignments))
+            else:
+                heapq.heappop(heap)
+                heads[n][0] = exons
+
+        heads = [head for head in heads if head[0] is not None]
+
+
+def read_loci(alignments, params=None):
+    '''Yields groups of exons of each locus from coordinate-sorted
+    alignments. Alignments are split at introns larger than
+    max_intron of params or the module.
+
+    A locus is closed when an alignment starts past the rightmost end
+    of all groups in the locus. Groups split by large introns are kept
+    in a heap until alignments reach their start positions.
+
+    '''
+    limit = (params or get_parameters()).max_intron
+    pending = []  # groups not yet added to a locus
+    locus = []
+    locus_end = None
+    chrom = None
+    start = None
+    seen_chroms = set()
+
+    for n, exons in enumerate(chain(alignments, [None])):
+        released = []
+        if exons is None or exons[0].chrom != chrom:
+            if exons is not None and exons[0].chrom in seen_chroms:
+                print >> stderr, '\nERROR: Input is not sorted by ' + \
+                                    'chromosome (%s).' % exons[0].chrom
+                raise SystemExit(1)
+
+            while pending:  # release all groups of the last chromosome
+                released.append(heapq.heappop(pending)[-1])
+        elif exons[0].start < start:
+            print >> stderr, '\nERROR: Input is not sorted by ' + \
+                    'start position (%s:%d).' % (chrom, exons[0].start)
+            raise SystemExit(1)
+
+        if exons is not None:
+            chrom = exons[0].chrom
+            start = exons[0].start
+            seen_chroms.add(chrom)
+
+            for group in remove_large_intron(exons, limit):
+                heapq.heappush(pending, (group[0].start, n, group))
+
+            while pending and pending[0][0] <= start:
+                released.append(heapq.heappop(pending)[-1])
+
+        for group in released:
+            if locus and (group[0].chrom != locus[0][0].chrom or
+                                        group[0].start > locus_end):
+                yield locus
+                locus = []
+
+            if locus:
+                locus_end = max(locus_end, group[-1].end)
+            else:
+                locus_end = group[-1].end
+            locus.append(group)
+
+    if locus:
+        yield locus
+
+
+def assemble_stream(input_files, genome, find_max, junctions=None,
+                        output=stdout, params=None):
+    '''Build gene models one locus at a time from coordinate-sorted
+    alignments.
+
+    Each locus is assembled, written out and freed before the next
+    locus is read. Gene IDs start from one in each chromosome.
+    Gene models are built with params or parameters of the module.
+
+    '''
+    if params is None:
+        params = get_parameters()
+
+    chrom = None
+    total_genes = total_transcripts = total_excluded = 0
+    total_single_exon_genes = 0
+    for n, groups in enumerate(
+            read_loci(merge_sorted_alignments(input_files, params),
+                        params), start=1):
+        if groups[0][0].chrom != chrom:
+            chrom = groups[0][0].chrom
+            gene_id = 0
+
+        align_db = AlignmentDB()
+        for group in groups:
+            add_exon_group(align_db, group)
+
+        last_gene_id = gene_id
+        gene_id, transcripts_num, excluded, single_exon_gene_num = \
+                assemble(genome, align_db, find_max, gene_id, output,
+                            verbose=False, junctions=junctions,
+                            params=params)
+
+        total_genes += gene_id - last_gene_id
+        total_transcripts += transcripts_num
+        total_excluded += excluded
+        total_single_exon_genes += single_exon_gene_num
+
+        if n % 100 == 0:
+            print >> stderr, '\r  |--Locus\t\t%d loci, %d genes' % \
+                                                        (n, total_genes),
+
+    return (total_genes, total_transcripts,
+                total_excluded, total_single_exon_genes)
+
+
+def main(input_files):
+    print >> stderr, 'Gimme : Alignment-based assembler'
+    print >> stderr, 'Version : %s' % (VERSION)
+    print >> stderr, 'Source code : https://github.com/ged-lab/gimme.git\n'
+    print >> stderr, 'Opening a reference genome...'
+    genome = open_genome(args.reference)
+
+    if args.debug:
+        print >> stderr, 'DEBBUG MODE\t' + \
+                'Use this mode for debugging only!\n'
+
+    if args.junction_cache:
+        junctions = split_strand.load_junction_cache(args.junction_cache,
+                                                        genome)
+        print >> stderr, 'Loaded %d junctions from %s' % \
+                                        (len(junctions), args.junction_cache)
+    else:
+        junctions = split_strand.JunctionCache()
+
+    if args.sweep:
+        names, settings = parse_sweep(args.sweep)
+        if args.compress in ('gzip', 'bgzf') or args.index:
+            extension = '.bed.gz'
+        else:
+            extension = '.bed'
+        outputs = [bedwriter.open_output('%s.%s%s' % (args.output,
+                                            get_sweep_label(names, setting),
+                                            extension),
+                                        args.compress, args.sort, args.index)
+                    for setting in settings]
+    else:
+        output = bedwriter.open_output(args.output, args.compress,
+                                        args.sort, args.index)
+
+    print >> stderr, '[Run...]'
+
+    if args.sweep:
+        '''====Build gene models with each setting of parameters===='''
+        align_db = read_snapshot_or_alignments(input_files,
+                                                args.parse_processes,
+                                                args.load_snapshot,
+                                                args.save_snapshot)
+
+        print >> stderr, 'Constructing %d settings' % len(settings)
+        results = assemble_sweep(genome, align_db, args.max, settings,
+                                    outputs, junctions=junctions)
+        for output in outputs:
+            output.close()
+
+        with open(args.output + '.summary.txt', 'w') as fp:
+            write_sweep_summary(fp, names, settings, results)
+        if args.junction_cache:
+            junctions.save(args.junction_cache)
+
+        print >> stderr, '\n[Done]'
+        write_sweep_summary(stderr, names, settings, results)
+        return
+
+    if args.processes:
+        '''====Build gene models of each chromosome in parallel===='''
+        return_items = assemble_parallel(input_files,
+                                            args.reference,
+                                            args.max,
+                                            args.processes,
+                                            junctions if args.junction_cache
+                                                else None,
+                                            output,
+                                            args.parse_processes,
+                                        )
+        print >> stderr, ''
+    elif args.state:
+        '''====Rebuild loci changed by new alignments===='''
+        return_items = assemble_state(input_files,
+                                        genome,
+                                        args.max,
+                                        args.state,
+                                        output,
+                                        junctions,
+                                    )
+    elif args.stream:
+        '''====Build gene models one locus at a time===='''
+        return_items = assemble_stream(input_files,
+                                        genome,
+                                        args.max,
+                                        junctions,
+                                        output,
+                                    )
+    else:
+        if args.region:
+            '''====Read alignments of loci in regions===='''
+            align_db = read_region_db(input_files,
+                                        parse_regions(args.region))
+        else:
+            align_db = read_snapshot_or_alignments(input_files,
+                                                    args.parse_processes,
+                                                    args.load_snapshot,
+                                                    args.save_snapshot)
+
+        print >> stderr, 'Constructing'
+        return_items = assemble(genome, align_db, args.max,
+                                    output=output, junctions=junctions)
+
+    output.close()
+
+    if args.junction_cache:
+        junctions.save(args.junction_cache)
+
+    if args.skipped_loci:
+        with open(args.skipped_loci, 'w') as fp:
+            write_over_budget_loci(fp, over_budget_loci)
+
+    gene_id, transcripts_num, excluded, single_exon_gene_num = return_items
+    report_summary(gene_id, transcripts_num, single_exon_gene_num, excluded)
+    if over_budget_loci:
+        print >> stderr, '%d loci exceeded a time or memory limit.' % \
+                                                    len(over_budget_loci)
+
+
+def start_profiler():
+    '''Returns a Profiler timing stages of assembly.
+
+    Functions of this module, split_strand.split() and
+    get_min_isoforms.get_min_paths() are replaced with timed
+    functions until Profiler.restore() is called.
+
+    '''
+    prof = profiler.Profiler()
+    module = sys.modules[__name__]
+    for attr, name in PROFILED_STAGES:
+        prof.patch(module, attr, name)
+    prof.patch(split_strand, 'split', 'split_strand')
+    prof.patch(get_min_isoforms, 'get_min_paths')
+    return prof
+
+
+def write_profile_report(prof, filename):
+    '''Writes a JSON report of stages recorded by a Profiler
+    from start_profiler().
+
+    Alignments are counted as they are parsed and loci are
+    clusters of introns built into splice graphs.
+
+    '''
+    parameters = [('gap_size', gap_size),
+                    ('max_intron', max_intron),
+                    ('min_utr', min_utr),
+                    ('min_transcript_len', min_transcript_len),
+                    ('min_single_exon_len', min_single_exon_len),
+                    ('max_isoforms', max_isoforms),
+                    ('max_paths', max_paths)]
+    info = [('version', VERSION),
+            ('command', sys.argv),
+            ('parameters', OrderedDict(parameters))]
+    prof.write(filename, info,
+                alignments=prof.stages['parse'].items,
+                loci=prof.stages['build_splice_graphs'].calls)
+
+
+def report_summary(gene_id, transcripts_num, single_exon_gene_num, excluded):
+    '''Print out summary report to standard error.'''
+
     print >> stderr, '\n[Done]'
     if gene_id > 0:
         print >> stderr, \
@@ -814,21 +3097,86 @@ if __name__ == '__main__':
             metavar='int', default=min_single_exon_len,
             help='the minimum size of a transcript with a single exon (bp)' +
                     '(default: %(default)s)')
+    parser.add_argument('--max_paths', type=int, metavar='int',
+            default=max_paths,
+            help='the maximum number of isoforms reported ' +
+            'for each locus, also with -x (default: %(default)s)')
     parser.add_argument('-x', '--max', action='store_true',
-            help='report all putative isoforms')
+            help='report all putative isoforms, ' +
+                    'at most --max_paths for each locus')
     parser.add_argument('--debug', action='store_true',
             help='reset parameters (for debugging purpose only)')
     parser.add_argument('input', type=str, nargs='+',
-            help='input file(s) in PSL/BED format')
+            help='input file(s) in PSL/BED format, ' +
+                    'optionally gzip-compressed, or - for standard input')
     parser.add_argument('-v', '--version', action='version',
             version='%(prog)s version ' + VERSION)
     parser.add_argument('-r','--reference', type=str,
-            help='a reference genome in FASTA format')
+            help='a reference genome in FASTA or 2bit format')
+    parser.add_argument('--stream', action='store_true',
+            help='build gene models one locus at a time ' +
+                    'from coordinate-sorted input')
+    parser.add_argument('-p', '--processes', type=int, metavar='int',
+            help='build gene models of each chromosome in parallel ' +
+                    'using a given number of processes')
+    parser.add_argument('--parse_processes', type=int, metavar='int',
+            help='parse input files in parallel ' +
+                    'using a given number of processes')
+    parser.add_argument('--load_snapshot', type=str, metavar='file',
+            help='load parsed alignments from a snapshot file ' +
+                    'saved from the same input files and parameters')
+    parser.add_argument('--save_snapshot', type=str, metavar='file',
+            help='save parsed alignments to a snapshot file')
+    parser.add_argument('--state', type=str, metavar='file',
+            help='add input files to an assembly state saved in a file ' +
+                    'and rebuild only loci changed by them')
+    parser.add_argument('--region', type=str, metavar='chr:start-end',
+            action='append',
+            help='build gene models of loci overlapping a region ' +
+                    'or regions in a BED file from indexed input files ' +
+                    '(gimme index), can be given more than once')
+    parser.add_argument('--sweep', type=str, metavar='param=int,int,...',
+            action='append',
+            help='build gene models with each combination of values ' +
+                    'of parameters (%s) to files named after the ' %
+                    ', '.join(SWEEP_PARAMETERS) +
+                    'output file (-o) with a summary table')
+    parser.add_argument('--junction_cache', type=str, metavar='file',
+            help='load splice sites of junctions from a file ' +
+                    'and save new junctions to it')
+    parser.add_argument('-o', '--output', type=str, metavar='file',
+            help='write gene models to a file instead of standard output, ' +
+                    'BGZF-compressed if it ends with .gz or .bgz')
+    parser.add_argument('--compress', choices=['gzip', 'bgzf', 'none'],
+            help='compress output with gzip or BGZF')
+    parser.add_argument('--sort', action='store_true',
+            help='write gene models sorted by chromosome and start position')
+    parser.add_argument('--index', action='store_true',
+            help='write sorted BGZF output with a tabix index ' +
+                    '(output file + .tbi)')
+    parser.add_argument('--locus_time_limit', type=float, metavar='seconds',
+            help='a time limit of building each locus, loci over ' +
+                    'the limit fall back to minimal isoforms, then to ' +
+                    'the first MAX_ISOFORMS isoforms or are skipped')
+    parser.add_argument('--locus_memory_limit', type=int, metavar='MB',
+            help='a limit of memory used to build each locus, ' +
+                    'loci over the limit fall back as with ' +
+                    '--locus_time_limit')
+    parser.add_argument('--skipped_loci', type=str, metavar='file',
+            help='write loci over --locus_time_limit or ' +
+                    '--locus_memory_limit to a file')
+    parser.add_argument('--profile_report', type=str, metavar='file',
+            help='write time and memory usage of each stage ' +
+                    'to a JSON file')
 
     args = parser.parse_args()
     if not args.reference:
         print >> sys.stderr, "A reference file is required."
         sys.exit()
+    if args.index and (not args.output or
+                            args.compress in ('gzip', 'none')):
+        print >> sys.stderr, "--index requires BGZF output to a file (-o)."
+        sys.exit()
 
     if args.debug:
         '''Parameters are set to retain all splice junctions for
@@ -840,6 +3188,7 @@ if __name__ == '__main__':
         min_utr = 0
         min_transcript_len = 1
         min_single_exon_len = 1
+        max_paths = sys.maxint
         args.max = True
     else:
         if args.min_utr <= 0:
@@ -867,6 +3216,13 @@ if __name__ == '__main__':
             print >> sys.stderr, \
                     'User defined max_isoforms = %d' % max_isoforms
 
+        if args.max_paths <= 0:
+            raise ValueError('Invalid number of isoforms (<=0)')
+        elif args.max_paths != max_paths:
+            max_paths = args.max_paths
+            print >> sys.stderr, \
+                    'User defined max_paths = %d' % max_paths
+
         if args.min_transcript_len <= 0:
             raise ValueError('Invalid transcript size (<=0)')
         elif args.min_transcript_len != min_transcript_len:
@@ -879,5 +3235,82 @@ if __name__ == '__main__':
             min_single_exon_len = args.min_single_exon_len
             print >> sys.stderr, 'User defined min_single_exon_len = %d' % \
                                                         min_single_exon_len
+    if args.processes is not None and args.processes <= 0:
+        raise ValueError('Invalid number of processes (<=0)')
+    if args.processes and args.stream:
+        parser.error('--stream cannot be used with --processes')
+    if args.parse_processes is not None and args.parse_processes <= 0:
+        raise ValueError('Invalid number of processes (<=0)')
+    if args.parse_processes and args.stream:
+        parser.error('--stream cannot be used with --parse_processes')
+    stdin_inputs = [f for f in args.input if inputs.is_stdin(f)]
+    if len(stdin_inputs) > 1:
+        parser.error('standard input (-) can only be given once')
+    if stdin_inputs and (args.parse_processes or args.load_snapshot or
+                            args.save_snapshot):
+        parser.error('standard input (-) cannot be used with ' +
+                        '--parse_processes or snapshots')
+    if args.sweep:
+        if not args.output:
+            parser.error('--sweep requires an output file prefix (-o)')
+        if args.stream or args.processes:
+            parser.error('--sweep cannot be used with --stream ' +
+                            'or --processes')
+        try:
+            parse_sweep(args.sweep)
+        except ValueError as e:
+            parser.error(str(e))
+    if (args.load_snapshot or args.save_snapshot) and \
+            (args.stream or args.processes):
+        parser.error('snapshots cannot be used with --stream ' +
+                        'or --processes')
+    if args.state:
+        if args.stream or args.processes or args.parse_processes or \
+                args.sweep:
+            parser.error('--state cannot be used with --stream, ' +
+                            '--processes, --parse_processes or --sweep')
+        if args.load_snapshot or args.save_snapshot:
+            parser.error('--state cannot be used with snapshots')
+        if stdin_inputs:
+            parser.error('standard input (-) cannot be used with --state')
+    if args.region:
+        if args.stream or args.processes or args.parse_processes or \
+                args.sweep or args.state:
+            parser.error('--region cannot be used with --stream, ' +
+                            '--processes, --parse_processes, --sweep ' +
+                            'or --state')
+        if args.load_snapshot or args.save_snapshot:
+            parser.error('--region cannot be used with snapshots')
+        if stdin_inputs:
+            parser.error('standard input (-) cannot be used with --region')
+        for input_file in args.input:
+            if not os.path.exists(tabix.get_index_filename(input_file)):
+                parser.error('%s has no tabix index, ' % input_file +
+                                'index it with gimme index')
+        try:
+            parse_regions(args.region)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.profile_report and args.processes:
+        parser.error('--profile_report cannot be used with --processes')
+    if args.locus_time_limit is not None and args.locus_time_limit <= 0:
+        raise ValueError('Invalid time limit (<=0)')
+    if args.locus_memory_limit is not None and args.locus_memory_limit <= 0:
+        raise ValueError('Invalid memory limit (<=0)')
+    if args.locus_time_limit or args.locus_memory_limit:
+        if args.sweep:
+            parser.error('--locus_time_limit and --locus_memory_limit ' +
+                            'cannot be used with --sweep')
+        locus_budget = watchdog.Budget(args.locus_time_limit,
+                                        args.locus_memory_limit and
+                                            args.locus_memory_limit << 20)
+    elif args.skipped_loci:
+        parser.error('--skipped_loci requires --locus_time_limit ' +
+                        'or --locus_memory_limit')
+
     if args.input:
+        if args.profile_report:
+            prof = start_profiler()
         main(args.input)
+        if args.profile_report:
+            write_profile_report(prof, args.profile_report)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+'''A single command line of Gimme and its utilities.
+
+    gimme assemble -r genome.fa alignments.psl > models.bed
+    gimme psl2bed alignments.psl > alignments.bed
+    gimme help
+
+Each subcommand is a module run as a script with the rest of the
+command line. A module and its dependencies, e.g. networkx, pysam or
+Biopython, are only imported when its subcommand runs, so listing
+subcommands and running light ones start quickly. Scripts which do
+not answer -h print their docstrings instead.
+
+'''
+
+import ast
+import sys
+import runpy
+import pkgutil
+from collections import OrderedDict
+
+# subcommand: (module, description, whether a script answers -h)
+SUBCOMMANDS = OrderedDict([
+    ('assemble', ('gimme', 'build gene models from alignments', True)),
+    ('index', ('utils.tabix',
+                            'index sorted BGZF alignments for --region',
+                            True)),
+    ('psl2bed', ('utils.psl2bed', 'convert PSL alignments to BED', False)),
+    ('gff2bed', ('utils.gff2bed', 'convert GTF/GFF to BED', False)),
+    ('bed2gff', ('utils.bed2gff', 'convert BED gene models to GFF', False)),
+    ('get_min_isoforms', ('utils.get_min_isoforms',
+                            'find minimum isoforms of gene models', False)),
+    ('exclude_genes', ('utils.exclude_genes',
+                            'exclude genes with too many isoforms', False)),
+    ('shorten_utrs', ('utils.shorten_utrs',
+                            'shorten UTRs of gene models', False)),
+    ('count_genes', ('utils.count_genes',
+                            'count genes and isoforms of gene models', False)),
+    ('compare_junction', ('utils.compare_junction',
+                            'compare splice junctions of two gene models',
+                            True)),
+    ('get_transcript_seq', ('utils.get_transcript_seq',
+                            'write sequences of BED gene models', False)),
+    ('get_transcript_seq_psl', ('utils.get_transcript_seq_psl',
+                            'write sequences of PSL alignments', False)),
+    ('splice_site_seq', ('utils.splice_site_seq',
+                            'write sequences of splice junctions', False)),
+    ('assign_cds', ('utils.assign_cds',
+                            'assign ORFs from ESTScan to gene models', False)),
+    ('assign_cds2', ('utils.assign_cds2',
+                            'assign ORFs from ESTScan to gene models', False)),
+    ('find_SE', ('utils.find_SE', 'find skipped exons', False)),
+    ('find_MXE', ('utils.find_MXE', 'find mutually exclusive exons', False)),
+    ('find_RI', ('utils.find_RI', 'find retained introns', False)),
+    ('find_A3SS', ('utils.find_A3SS',
+                            "find alternative 3' splice sites", False)),
+    ('find_A5SS', ('utils.find_A5SS',
+                            "find alternative 5' splice sites", False)),
+    ('find_AFE', ('utils.find_AFE', 'find alternative first exons', False)),
+    ('find_ALE', ('utils.find_ALE', 'find alternative last exons', False)),
+    ('find_match', ('utils.find_match',
+                            'report gene models matching BLAT hits', False)),
+    ('cdhit_transcript', ('utils.cdhit_transcript',
+                            'select a transcript of each CD-HIT cluster',
+                            False)),
+    ('blast_hits', ('utils.blast_hits', 'report scores of BLAST hits', False)),
+    ('bitscore', ('utils.bitscore',
+                            'report bit score to length ratios of BLAST',
+                            True)),
+    ('count_spliced_reads', ('utils.count_spliced_reads',
+                            'count reads mapped across splice junctions',
+                            False)),
+    ('count_spliced_reads2', ('utils.count_spliced_reads2',
+                            'count reads mapped across splice junctions',
+                            False)),
+    ('cdf_spliced_reads', ('utils.cdf_spliced_reads',
+                            'plot a distribution of spliced reads', False)),
+    ('transcript_length_dist', ('utils.transcript_length_dist',
+                            'plot a distribution of transcript lengths',
+                            False)),
+    ('read_error_profile', ('utils.read_error_profile',
+                            'report SNPs by position on reads', False)),
+    ('get_reads_from_sam', ('utils.get_reads_from_sam',
+                            'write mapped reads of a BAM file in FASTA',
+                            False)),
+    ('split_sam', ('utils.split_sam',
+                            'split reads with and without mates', False)),
+    ('split_fastq', ('utils.split_fastq',
+                            'split reads at odd and even positions', False)),
+    ('split_mixed_pair', ('utils.split_mixed_pair',
+                            'split merged paired reads', False)),
+    ('mapped_seq', ('utils.mapped_seq', 'write mapped sequences', False)),
+    ('unmapped_seq', ('utils.unmapped_seq',
+                            'write unmapped sequences', False)),
+    ('size_select', ('utils.size_select',
+                            'select sequences longer than a size', False)),
+    ('rename_fasta', ('utils.rename_fasta', 'rename FASTA sequences', False)),
+    ('seq_clean', ('utils.seq_clean',
+                            'filter alignments with small gaps', False)),
+    ])
+
+
+def print_usage(output=sys.stdout):
+    print >> output, 'usage: gimme <subcommand> [arguments]\n'
+    print >> output, 'subcommands:'
+    for name, (module, description, has_help) in SUBCOMMANDS.iteritems():
+        print >> output, '  %-24s%s' % (name, description)
+    print >> output, '\nRun gimme <subcommand> -h for help of a subcommand.'
+
+
+def print_help(name, output=sys.stdout):
+    '''Prints a docstring of a module of a subcommand.
+
+    The module is not imported, so help is printed for scripts which
+    do not answer -h or need packages that are not installed.
+
+    '''
+    module, description = SUBCOMMANDS[name][:2]
+    source = pkgutil.get_loader(module).get_source(module)
+    print >> output, 'usage: gimme %s [arguments]\n' % name
+    print >> output, '%s%s.' % (description[0].upper(), description[1:])
+    docstring = ast.get_docstring(ast.parse(source))
+    if docstring:
+        print >> output, '\n' + docstring
+
+
+def run(name, arguments):
+    '''Runs a module of a subcommand as a script with arguments.
+
+    The script name, sys.argv[0], is set to a file of the module.
+    -h and --help are answered by print_help() unless the script
+    answers them itself and its imports succeed.
+
+    '''
+    module, description, has_help = SUBCOMMANDS[name]
+    asks_help = arguments[:1] in (['-h'], ['--help'])
+    if asks_help and not has_help:
+        return print_help(name)
+
+    sys.argv = sys.argv[:1] + list(arguments)
+    try:
+        runpy.run_module(module, run_name='__main__', alter_sys=True)
+    except ImportError as e:
+        if not asks_help:
+            raise
+        print >> sys.stderr, 'gimme: %s: %s\n' % (name, e)
+        print_help(name)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        if len(argv) > 1 and argv[1] in SUBCOMMANDS:
+            return run(argv[1], ['-h'])
+        print_usage()
+        return
+
+    name = argv[0]
+    if name not in SUBCOMMANDS:
+        print >> sys.stderr, 'gimme: unknown subcommand %s\n' % name
+        print_usage(sys.stderr)
+        raise SystemExit(2)
+
+    run(name, argv[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+'''Buffered output of gene models in BED format.
+
+BedWriter collects lines in a large buffer and writes them in big
+blocks. Output can be compressed with gzip or BGZF on a background
+thread, sorted by chromosome and start position and indexed with a
+tabix-compatible index (.tbi) when it is sorted and BGZF-compressed.
+
+    output = BedWriter(open('models.bed.gz', 'wb'), compress='bgzf',
+                        sort=True, index='models.bed.gz.tbi')
+    output.write(format_bed(chrom, start, end, name, strand,
+                            block_sizes, block_starts))
+    output.close()
+
+'''
+
+import sys
+import zlib
+import struct
+import threading
+import Queue
+from itertools import groupby
+from operator import itemgetter
+
+BUFFER_SIZE = 1 << 20  # bytes buffered before a write
+QUEUE_SIZE = 8  # buffers waiting for compression
+LINE_END = '\r\n'  # as written by csv.writer in earlier versions
+
+BGZF_BLOCK_SIZE = 0xff00  # uncompressed bytes in a BGZF block
+BGZF_HEADER = struct.Struct('<4BI2BH2BHH')
+BGZF_EOF = '\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC' \
+            '\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+TABIX_PSEUDO_BIN = 37450
+TABIX_LINEAR_SHIFT = 14  # 16 kb windows of a linear index
+
+
+def format_bed(chrom, chrom_start, chrom_end, name, strand,
+                block_sizes, block_starts, score=1000):
+    '''Returns a line of a gene model in BED format.
+
+    block_sizes and block_starts are comma-separated strings.
+
+    '''
+    return '%s\t%d\t%d\t%s\t%d\t%s\t%d\t%d\t0,0,0\t%d\t%s\t%s%s' % (
+                chrom, chrom_start, chrom_end, name, score, strand,
+                chrom_start, chrom_end, block_sizes.count(',') + 1,
+                block_sizes, block_starts, LINE_END)
+
+
+def bgzf_block(data, level=6):
+    '''Returns a BGZF block of at most BGZF_BLOCK_SIZE bytes of data.'''
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = BGZF_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2,
+                                BGZF_HEADER.size + len(cdata) + 7)
+    return header + cdata + struct.pack('<Ii',
+                                zlib.crc32(data) & 0xffffffff, len(data))
+
+
+class Compressor(object):
+    '''Writes data to a file object without compression.'''
+
+    def __init__(self, fobj, level=6):
+        self.fobj = fobj
+        self.level = level
+
+    def write(self, data):
+        self.fobj.write(data)
+
+    def finish(self):
+        pass
+
+
+class GzipCompressor(Compressor):
+    '''Writes data as one gzip member.'''
+
+    def __init__(self, fobj, level=6):
+        Compressor.__init__(self, fobj, level)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def write(self, data):
+        self.fobj.write(self.compressor.compress(data))
+
+    def finish(self):
+        self.fobj.write(self.compressor.flush())
+
+
+class BGZFCompressor(Compressor):
+    '''Writes data in BGZF blocks.
+
+    Blocks are cut every BGZF_BLOCK_SIZE bytes of uncompressed data,
+    so a virtual offset of an uncompressed position is known from
+    offsets of blocks in the compressed file.
+
+    '''
+    def __init__(self, fobj, level=6):
+        Compressor.__init__(self, fobj, level)
+        self.pending = ''
+        self.offset = 0  # bytes written to a file
+        self.block_offsets = []
+
+    def write_block(self, data):
+        block = bgzf_block(data, self.level)
+        self.block_offsets.append(self.offset)
+        self.fobj.write(block)
+        self.offset += len(block)
+
+    def write(self, data):
+        data = self.pending + data
+        end = len(data) - len(data) % BGZF_BLOCK_SIZE
+        for start in xrange(0, end, BGZF_BLOCK_SIZE):
+            self.write_block(data[start:start + BGZF_BLOCK_SIZE])
+        self.pending = data[end:]
+
+    def finish(self):
+        if self.pending:
+            self.write_block(self.pending)
+            self.pending = ''
+        self.block_offsets.append(self.offset)  # the EOF block
+        self.fobj.write(BGZF_EOF)
+
+    def virtual_offset(self, position):
+        '''Returns a virtual offset of an uncompressed position.'''
+
+        block, within = divmod(position, BGZF_BLOCK_SIZE)
+        return self.block_offsets[block] << 16 | within
+
+
+COMPRESSORS = {
+                None: Compressor,
+                'gzip': GzipCompressor,
+                'bgzf': BGZFCompressor,
+            }
+
+
+class CompressThread(threading.Thread):
+    '''Compresses and writes buffers from a queue.
+
+    An exception raised in the thread is kept and raised again by
+    BedWriter.close(). Remaining buffers are discarded after an error,
+    so the main thread never blocks on a full queue.
+
+    '''
+    def __init__(self, compressor):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.compressor = compressor
+        self.queue = Queue.Queue(QUEUE_SIZE)
+        self.error = None
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is None:
+                try:
+                    self.compressor.write(data)
+                except Exception:
+                    self.error = sys.exc_info()
+
+        if self.error is None:
+            try:
+                self.compressor.finish()
+            except Exception:
+                self.error = sys.exc_info()
+
+
+class BedWriter(object):
+    '''A file-like object writing BED lines through a large buffer.
+
+    fobj = a file object
+    compress = None, 'gzip' or 'bgzf'
+    sort = keep all lines and write them sorted by chromosome,
+            start and end positions when the writer is closed
+    index = a filename of a tabix index, requires sorted BGZF output
+    close_file = close the file object when the writer is closed
+
+    Compression runs on a background thread.
+
+    '''
+    def __init__(self, fobj, compress=None, sort=False, index=None,
+                    buffer_size=BUFFER_SIZE, level=6, close_file=False):
+        if compress not in COMPRESSORS:
+            raise ValueError('unknown compression: %s' % compress)
+        if index and not (sort and compress == 'bgzf'):
+            raise ValueError('an index requires sorted BGZF output')
+
+        self.sort = sort
+        self.index = index
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.position = 0  # uncompressed bytes passed to the compressor
+        self.records = []  # (chrom, start, end, line) of sorted output
+        self.closed = False
+        self.fobj = fobj
+        self.close_file = close_file
+
+        self.compressor = COMPRESSORS[compress](fobj, level)
+        if compress:
+            self.thread = CompressThread(self.compressor)
+            self.thread.start()
+        else:
+            self.thread = None
+
+    def write(self, text):
+        if self.sort:
+            for line in text.splitlines(True):
+                chrom, start, end = line.split('\t', 3)[:3]
+                self.records.append((chrom, int(start), int(end), line))
+            return
+
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = ''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.position += len(data)
+        if self.thread:
+            self.thread.queue.put(data)
+        else:
+            self.compressor.write(data)
+
+    def write_sorted(self):
+        '''Writes sorted lines and returns (chrom, start, end,
+        uncompressed start, uncompressed end) of each line.
+
+        '''
+        self.records.sort(key=itemgetter(0, 1, 2))
+        positions = []
+        sort, self.sort = self.sort, False
+        for chrom, start, end, line in self.records:
+            line_start = self.position + self.buffered
+            self.write(line)
+            positions.append((chrom, start, end, line_start,
+                                self.position + self.buffered))
+        self.sort = sort
+        self.records = []
+        return positions
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        positions = self.write_sorted() if self.sort else None
+        self.flush()
+        if self.thread:
+            self.thread.queue.put(None)
+            self.thread.join()
+            if self.thread.error:
+                raise self.thread.error[0], self.thread.error[1], \
+                        self.thread.error[2]
+        else:
+            self.compressor.finish()
+
+        if self.close_file:
+            self.fobj.close()
+        else:
+            self.fobj.flush()
+
+        if self.index:
+            voffset = self.compressor.virtual_offset
+            write_tabix_index(self.index,
+                                [(chrom, start, end, voffset(line_start),
+                                    voffset(line_end))
+                                    for chrom, start, end, line_start,
+                                        line_end in positions])
+
+
+def reg2bin(start, end):
+    '''Returns a bin of a region in the UCSC binning scheme
+    used by tabix.
+
+    '''
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if start >> shift == end >> shift:
+            return offset + (start >> shift)
+    return 0
+
+
+def build_tabix_index(records):
+    '''Returns chromosome names and (bins, linear index, pseudo bin)
+    of each chromosome from sorted (chrom, start, end, virtual start,
+    virtual end) of lines.
+
+    '''
+    names = []
+    references = []
+    for chrom, lines in groupby(records, key=itemgetter(0)):
+        bins = {}
+        linear = []
+        count = 0
+        for chrom, start, end, vstart, vend in lines:
+            end = max(end, start + 1)
+            chunks = bins.setdefault(reg2bin(start, end), [])
+            if chunks and chunks[-1][1] == vstart:
+                chunks[-1][1] = vend
+            else:
+                chunks.append([vstart, vend])
+
+            last_window = (end - 1) >> TABIX_LINEAR_SHIFT
+            if len(linear) <= last_window:
+                linear.extend([None] * (last_window + 1 - len(linear)))
+            for window in xrange(start >> TABIX_LINEAR_SHIFT,
+                                    last_window + 1):
+                if linear[window] is None:
+                    linear[window] = vstart
+
+            if not count:
+                first_offset = vstart
+            last_offset = vend
+            count += 1
+
+        fill = next(offset for offset in linear if offset is not None)
+        for window, offset in enumerate(linear):
+            if offset is None:
+                linear[window] = fill
+            else:
+                fill = offset
+
+        names.append(chrom)
+        references.append((bins, linear,
+                            [(first_offset, last_offset), (count, 0)]))
+
+    return names, references
+
+
+def write_tabix_index(filename, records, columns=(1, 2, 3)):
+    '''Writes a tabix index of lines in BGZF format.
+
+    columns are 1-based columns of a chromosome, a 0-based start
+    and an end of lines, (1, 2, 3) for BED or (14, 16, 17) for PSL.
+
+    '''
+    names, references = build_tabix_index(records)
+    name_block = ''.join(name + '\0' for name in names)
+    data = ['TBI\1', struct.pack('<8i', len(names),
+                                    0x10000,  # generic format, 0-based
+                                    columns[0], columns[1], columns[2],
+                                    ord('#'), 0, len(name_block)),
+            name_block]
+
+    for bins, linear, pseudo_bin in references:
+        data.append(struct.pack('<i', len(bins) + 1))
+        for bin in sorted(bins) + [TABIX_PSEUDO_BIN]:
+            chunks = bins.get(bin, pseudo_bin)
+            data.append(struct.pack('<Ii', bin, len(chunks)))
+            for chunk in chunks:
+                data.append(struct.pack('<QQ', *chunk))
+        data.append(struct.pack('<i', len(linear)))
+        data.append(struct.pack('<%dQ' % len(linear), *linear))
+
+    with open(filename, 'wb') as fp:
+        compressor = BGZFCompressor(fp)
+        compressor.write(''.join(data))
+        compressor.finish()
+
+
+def open_output(filename=None, compress=None, sort=False, index=False,
+                    buffer_size=BUFFER_SIZE):
+    '''Returns a BedWriter writing to a file or standard output.
+
+    Output is BGZF-compressed if compress is not given and a
+    filename ends with .gz or .bgz, or an index is requested.
+    An index is written to filename + '.tbi'.
+
+    '''
+    if compress is None and filename and \
+            filename.endswith(('.gz', '.bgz')):
+        compress = 'bgzf'
+    if compress == 'none':
+        compress = None
+    if index:
+        if not filename:
+            raise ValueError('an index requires an output file')
+        index = filename + '.tbi'
+        sort = True
+        if compress is None:
+            compress = 'bgzf'
+
+    if filename:
+        return BedWriter(open(filename, 'wb'), compress, sort, index or None,
+                            buffer_size, close_file=True)
+    return BedWriter(sys.stdout, compress, sort, None, buffer_size)
@@ -88,12 +88,10 @@ def parse_psl(filename):
 
     for pslobj in pslparser.read(open(filename)):
         exons = []
-        for i in range(len(pslobj.tStarts)):
-            start = pslobj.tStarts[i]
-            end = start + pslobj.blockSizes[i]
-            strand = pslobj.strand
-
-            exon = Exon(pslobj.tName, start, end, strand)
+        chrom = pslobj.tName
+        strand = pslobj.strand
+        for start, size in zip(pslobj.tStarts, pslobj.blockSizes):
+            exon = Exon(chrom, start, start + size, strand)
             exons.append(exon)
         yield exons
 
@@ -0,0 +1,396 @@
+'''Reference genome access without loading sequences into memory.
+
+A FASTA file is read through a samtools-compatible .fai index and
+a 2bit file through its sequence index. Both files are memory-mapped,
+so opening a genome only reads the index and a slice only reads
+the bases it covers.
+
+    genome = open_genome('genome.fa')
+    seq = genome['chr1'][1000:1100]
+    donors, acceptors = genome.splice_sites('chr1', starts, ends)
+
+'''
+
+import os
+import sys
+import mmap
+import string
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+TWOBIT_SIGNATURE = 0x1A412743
+TWOBIT_BASES = 'TCAG'
+
+complement_table = string.maketrans('ACGTUNacgtun', 'TGCAANtgcaan')
+
+
+def reverse_complement(seq):
+    '''Returns a reverse complement of a DNA sequence.'''
+
+    return seq.translate(complement_table)[::-1]
+
+
+def write_fasta(output, seq, id, chunk=60):
+    '''Writes a sequence in FASTA format with chunk bases per line.'''
+
+    output.write('>' + id + '\n')
+    pos = 0
+    while True:
+        output.write(seq[pos:pos + chunk] + '\n')
+        pos += chunk
+        if pos >= len(seq):
+            break
+
+
+class Sequence(object):
+    '''A view of a chromosome. Slicing returns a string.'''
+
+    def __init__(self, genome, chrom):
+        self.genome = genome
+        self.chrom = chrom
+        self.length = genome.lengths[chrom]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('sequence indices must be slices')
+        start, end, step = key.indices(self.length)
+        if step != 1:
+            raise ValueError('slice step is not supported')
+        if end <= start:
+            return ''
+        return self.genome.fetch(self.chrom, start, end)
+
+    def __str__(self):
+        return self.genome.fetch(self.chrom, 0, self.length)
+
+
+class Genome(object):
+    '''Base class of genome objects.
+
+    Subclasses set self.lengths, a dictionary of chromosome lengths,
+    and implement fetch(chrom, start, end).
+
+    '''
+
+    def __getitem__(self, chrom):
+        if chrom not in self.lengths:
+            raise KeyError(chrom)
+        return Sequence(self, chrom)
+
+    def __contains__(self, chrom):
+        return chrom in self.lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return sorted(self.lengths)
+
+    def fetch(self, chrom, start, end):
+        raise NotImplementedError
+
+    def splice_sites(self, chrom, starts, ends):
+        '''Returns lists of donor and acceptor dinucleotides of introns.
+
+        Introns are given as sequences of starts and ends (0-based,
+        half-open). The donor of an intron is the first two bases of
+        the intron and the acceptor is the last two bases.
+
+        '''
+        fetch = self.fetch
+        length = self.lengths[chrom]
+        donors = [fetch(chrom, start, min(start + 2, length))
+                    for start in starts]
+        acceptors = [fetch(chrom, max(end - 2, 0), end) for end in ends]
+        return donors, acceptors
+
+
+class MemoryGenome(Genome):
+    '''A genome from a dictionary of sequence strings.'''
+
+    def __init__(self, seqs):
+        self.seqs = seqs
+        self.lengths = dict((chrom, len(seq)) for chrom, seq in seqs.items())
+
+    def fetch(self, chrom, start, end):
+        return self.seqs[chrom][start:end]
+
+
+def build_fai(filename):
+    '''Scans a FASTA file and returns index records.
+
+    A record is a tuple of a name, length, offset of the first base,
+    bases per line and bytes per line as in samtools faidx.
+    All lines of a sequence except the last one must have the same
+    length.
+
+    '''
+    records = []
+    if os.path.getsize(filename) == 0:
+        return records
+
+    with open(filename, 'rb') as fp:
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        header = 0 if data[:1] == '>' else data.find('\n>') + 1
+        if header == 0 and data[:1] != '>':
+            header = -1  # no sequence
+        while header >= 0:
+            line_end = data.find('\n', header)
+            if line_end < 0:  # a header at the end of file
+                line_end = len(data)
+            name = data[header + 1:line_end].split()[0]
+            seq_offset = min(line_end + 1, len(data))
+            next_header = data.find('\n>', line_end) + 1
+            seq_end = next_header if next_header > 0 else len(data)
+            while seq_end > seq_offset and data[seq_end - 1] in '\r\n':
+                seq_end -= 1
+
+            line_end = data.find('\n', seq_offset, seq_end)
+            line_width = line_end + 1 - seq_offset if line_end >= 0 \
+                                else seq_end - seq_offset + 1
+            line_bases = len(data[seq_offset:min(seq_offset + line_width,
+                                        seq_end)].rstrip('\r\n'))
+            if line_bases == 0:
+                records.append((name, 0, seq_offset, 0, 0))
+            else:
+                newline = line_width - line_bases
+                full_lines, last_bases = divmod(seq_end - seq_offset +
+                                                newline, line_width)
+                newlines = 0
+                chunk = line_width * 1000000
+                for pos in xrange(seq_offset, seq_end, chunk):
+                    newlines += data[pos:min(pos + chunk, seq_end)] \
+                                    .count('\n')
+                if (last_bases > 0 and last_bases <= newline or
+                        newlines != full_lines - (last_bases == 0)):
+                    raise ValueError('%s has lines of different length '
+                                    'in %s' % (filename, name))
+                length = full_lines * line_bases + \
+                            max(last_bases - newline, 0)
+                records.append((name, length, seq_offset,
+                                    line_bases, line_width))
+            header = next_header if next_header > 0 else -1
+        data.close()
+
+    return records
+
+
+def read_fai(filename):
+    records = []
+    with open(filename) as fp:
+        for line in fp:
+            name, length, offset, line_bases, line_width = \
+                                                line.split('\t')[:5]
+            records.append((name, int(length), int(offset),
+                                int(line_bases), int(line_width)))
+    return records
+
+
+class FastaGenome(Genome):
+    '''A memory-mapped FASTA file with a .fai index.
+
+    The index is written next to the FASTA file if it does not exist
+    and the directory is writable.
+
+    '''
+
+    def __init__(self, filename):
+        fai_file = filename + '.fai'
+        if (os.path.exists(fai_file) and
+                os.path.getmtime(fai_file) >= os.path.getmtime(filename)):
+            records = read_fai(fai_file)
+        else:
+            records = build_fai(filename)
+            try:
+                with open(fai_file, 'w') as fp:
+                    for record in records:
+                        print >> fp, '%s\t%d\t%d\t%d\t%d' % record
+            except IOError:
+                pass
+
+        self.filename = filename
+        self.lengths = {}
+        self.index = {}
+        for name, length, offset, line_bases, line_width in records:
+            self.lengths[name] = length
+            self.index[name] = (offset, line_bases, line_width)
+
+        self.fp = open(filename, 'rb')
+        if os.path.getsize(filename) > 0:
+            self.data = mmap.mmap(self.fp.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        else:
+            self.data = ''
+
+    def __getstate__(self):
+        return self.filename
+
+    def __setstate__(self, filename):
+        self.__init__(filename)
+
+    def fetch(self, chrom, start, end):
+        offset, line_bases, line_width = self.index[chrom]
+        end = min(end, self.lengths[chrom])
+        if end <= start:
+            return ''
+
+        first = offset + start / line_bases * line_width + \
+                    start % line_bases
+        last = offset + (end - 1) / line_bases * line_width + \
+                    (end - 1) % line_bases + 1
+        seq = self.data[first:last]
+        if last - first != end - start:  # the region spans lines
+            seq = seq.replace('\n', '').replace('\r', '')
+        return seq
+
+    def splice_sites(self, chrom, starts, ends):
+        '''Returns lists of donor and acceptor dinucleotides of introns.
+
+        File offsets of all sites are computed in one pass and
+        dinucleotides that span a line break are fetched separately.
+
+        '''
+        offset, line_bases, line_width = self.index[chrom]
+        if line_bases == 0:  # an empty sequence
+            return Genome.splice_sites(self, chrom, starts, ends)
+        length = self.lengths[chrom]
+        data = self.data
+        fetch = self.fetch
+
+        donors = []
+        for start in starts:
+            col = start % line_bases
+            if col < line_bases - 1 and start + 2 <= length:
+                pos = offset + start / line_bases * line_width + col
+                donors.append(data[pos:pos + 2])
+            else:
+                donors.append(fetch(chrom, start, start + 2))
+
+        acceptors = []
+        for end in ends:
+            col = (end - 2) % line_bases
+            if col < line_bases - 1 and 2 <= end <= length:
+                pos = offset + (end - 2) / line_bases * line_width + col
+                acceptors.append(data[pos:pos + 2])
+            else:
+                acceptors.append(fetch(chrom, max(end - 2, 0), end))
+
+        return donors, acceptors
+
+
+class TwoBitGenome(Genome):
+    '''A memory-mapped 2bit file.
+
+    Block tables of a sequence are read when the sequence is
+    first accessed. Soft-masked bases are returned in lower case.
+
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fp = open(filename, 'rb')
+        self.data = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if struct.unpack('<I', self.data[:4])[0] == TWOBIT_SIGNATURE:
+            self.byteorder = '<'
+        elif struct.unpack('>I', self.data[:4])[0] == TWOBIT_SIGNATURE:
+            self.byteorder = '>'
+        else:
+            raise ValueError('%s is not a 2bit file' % filename)
+
+        version, seq_count = struct.unpack(self.byteorder + 'II',
+                                            self.data[4:12])
+        pos = 16
+        self.offsets = {}
+        for i in xrange(seq_count):
+            name_size = ord(self.data[pos])
+            name = self.data[pos + 1:pos + 1 + name_size]
+            pos += 1 + name_size
+            self.offsets[name], = struct.unpack(self.byteorder + 'I',
+                                                self.data[pos:pos + 4])
+            pos += 4
+
+        self.lengths = {}
+        for name, offset in self.offsets.items():
+            self.lengths[name], = struct.unpack(self.byteorder + 'I',
+                                            self.data[offset:offset + 4])
+        self.records = {}
+        self.table = [''.join([TWOBIT_BASES[(byte >> shift) & 3]
+                                    for shift in (6, 4, 2, 0)])
+                        for byte in range(256)]
+
+    def __getstate__(self):
+        return self.filename
+
+    def __setstate__(self, filename):
+        self.__init__(filename)
+
+    def read_blocks(self, pos, count):
+        starts = array('I', self.data[pos:pos + 4 * count])
+        sizes = array('I', self.data[pos + 4 * count:pos + 8 * count])
+        if (self.byteorder == '<') != (sys.byteorder == 'little'):
+            starts.byteswap()
+            sizes.byteswap()
+        return starts, [start + size for start, size in zip(starts, sizes)]
+
+    def get_record(self, chrom):
+        try:
+            return self.records[chrom]
+        except KeyError:
+            pass
+
+        unpack = lambda pos: struct.unpack(self.byteorder + 'I',
+                                            self.data[pos:pos + 4])[0]
+        pos = self.offsets[chrom] + 4
+        n_count = unpack(pos)
+        n_blocks = self.read_blocks(pos + 4, n_count)
+        pos += 4 + 8 * n_count
+        mask_count = unpack(pos)
+        mask_blocks = self.read_blocks(pos + 4, mask_count)
+        pos += 4 + 8 * mask_count + 4  # skip a reserved field
+
+        record = (pos, n_blocks, mask_blocks)
+        self.records[chrom] = record
+        return record
+
+    def fetch(self, chrom, start, end):
+        end = min(end, self.lengths[chrom])
+        if end <= start:
+            return ''
+
+        dna_offset, n_blocks, mask_blocks = self.get_record(chrom)
+        packed = self.data[dna_offset + start / 4:
+                            dna_offset + (end + 3) / 4]
+        table = self.table
+        seq = ''.join([table[ord(byte)] for byte in packed])
+        seq = seq[start % 4:start % 4 + end - start]
+
+        for block_starts, block_ends, replace in \
+                ((n_blocks[0], n_blocks[1], lambda s: 'N' * len(s)),
+                (mask_blocks[0], mask_blocks[1], str.lower)):
+            first = bisect_right(block_ends, start)
+            last = bisect_left(block_starts, end)
+            for i in xrange(first, last):
+                block_start = max(block_starts[i], start) - start
+                block_end = min(block_ends[i], end) - start
+                seq = seq[:block_start] + \
+                        replace(seq[block_start:block_end]) + seq[block_end:]
+        return seq
+
+
+def open_genome(filename):
+    '''Opens a genome in FASTA or 2bit format.'''
+
+    with open(filename, 'rb') as fp:
+        magic = fp.read(4)
+    if len(magic) == 4 and TWOBIT_SIGNATURE in \
+            (struct.unpack('<I', magic)[0], struct.unpack('>I', magic)[0]):
+        return TwoBitGenome(filename)
+    return FastaGenome(filename)
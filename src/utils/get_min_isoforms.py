@@ -8,6 +8,8 @@ of minimum isoforms, the script return the original transcripts.
 
 import sys
 import csv
+import heapq
+from itertools import izip
 
 import networkx as nx
 
@@ -169,10 +171,194 @@ def add_path(edges, paths, G):
         paths.add(path_str)
 
 
-def get_min_paths(G, verbose=True):
+def topological_order(G, key=None):
+    '''Returns nodes of a directed acyclic graph in topological order.
+
+    Nodes ready at the same time are taken in order of key(node), or
+    of node names if key is not given, so the order does not depend on
+    the order nodes were added. Start comes first and End last.
+
+    '''
+    if key is None:
+        key = lambda node: node
+
+    def rank(node):
+        if node == 'Start':
+            return (0,)
+        elif node == 'End':
+            return (2,)
+        return (1, key(node))
+
+    in_degrees = dict((node, G.in_degree(node)) for node in G)
+    heap = [(rank(node), node) for node in G if not in_degrees[node]]
+    heapq.heapify(heap)
+    nodes = []
+    while heap:
+        node = heapq.heappop(heap)[1]
+        nodes.append(node)
+        for succ in G.successors(node):
+            in_degrees[succ] -= 1
+            if not in_degrees[succ]:
+                heapq.heappush(heap, (rank(succ), succ))
+
+    if len(nodes) != len(in_degrees):
+        raise ValueError, "Error: a graph is not acyclic."
+    return nodes
+
+
+def get_min_paths(G, verbose=True, key=None):
+    '''Returns minimal paths including all edges.
+    G is a directed acyclic graph with Start and End nodes.
+
+    As in get_min_paths_maxflow(), paths cover all edges between
+    exons, while edges from Start and to End are only used to start
+    and end paths, so Start and End can be linked to any exon.
+    A minimum set of paths is a minimum flow from Start to End with
+    at least one unit of flow on every edge between exons.
+    A feasible flow is built in two passes over nodes in topological
+    order. The flow is then reduced by augmenting paths from End to
+    Start in the residual graph and decomposed into paths.
+
+    Many sets of paths can be equally small. Nodes and edges are
+    visited in an order given by key, e.g. positions of exons, as in
+    topological_order(), so the same graph gives the same paths
+    whatever its nodes are named or the order they were added.
+
+    '''
+    nodes = topological_order(G, key)
+    node_ids = dict((node, i) for i, node in enumerate(nodes))
+    source = node_ids['Start']
+    target = node_ids['End']
+
+    tails = []
+    heads = []
+    out_edges = [[] for node in nodes]
+    in_edges = [[] for node in nodes]
+    for i, node in enumerate(nodes):
+        for j in sorted(node_ids[succ] for succ in G.successors(node)):
+            out_edges[i].append(len(tails))
+            in_edges[j].append(len(tails))
+            tails.append(i)
+            heads.append(j)
+
+    total_edges = len(tails)
+    # every edge between exons is covered at least once
+    lower = [0 if i == source or j == target else 1
+                for i, j in izip(tails, heads)]
+    flows = list(lower)
+
+    '''Balance nodes with more outflow by adding flow to their incoming
+    edges from the end, then balance nodes with more inflow by adding
+    flow to their outgoing edges from the start.
+
+    '''
+    for i in xrange(len(nodes) - 1, -1, -1):
+        if i == source or i == target:
+            continue
+        if not in_edges[i] or not out_edges[i]:
+            raise ValueError, "Error: %s is not connected to " \
+                                        "Start and End." % nodes[i]
+        diff = sum([flows[e] for e in out_edges[i]]) - \
+                sum([flows[e] for e in in_edges[i]])
+        if diff > 0:
+            flows[in_edges[i][0]] += diff
+
+    for i in xrange(len(nodes)):
+        if i == source or i == target:
+            continue
+        diff = sum([flows[e] for e in in_edges[i]]) - \
+                sum([flows[e] for e in out_edges[i]])
+        if diff > 0:
+            flows[out_edges[i][0]] += diff
+
+    '''Reduce the flow. A flow from End to Start in the residual graph
+    goes backward along edges with more flow than their lower bounds
+    and forward along any edge.
+
+    '''
+    mf_round = 0
+    while True:
+        parents = {target: None}  # node: (parent node, edge, backward)
+        stack = [target]
+        while stack and source not in parents:
+            i = stack.pop()
+            for e in in_edges[i]:
+                if flows[e] > lower[e] and tails[e] not in parents:
+                    parents[tails[e]] = (i, e, True)
+                    stack.append(tails[e])
+            for e in out_edges[i]:
+                if heads[e] not in parents:
+                    parents[heads[e]] = (i, e, False)
+                    stack.append(heads[e])
+
+        if source not in parents:
+            break
+
+        path = []
+        i = source
+        while i != target:
+            i, e, backward = parents[i]
+            path.append((e, backward))
+
+        amount = min([flows[e] - lower[e] for e, backward in path
+                        if backward])
+        for e, backward in path:
+            if backward:
+                flows[e] -= amount
+            else:
+                flows[e] += amount
+        mf_round += 1
+
+    '''Decompose the flow into paths.'''
+    paths = []
+    next_edge = [0] * len(nodes)
+    while True:
+        path = []
+        i = source
+        while i != target:
+            edges = out_edges[i]
+            while next_edge[i] < len(edges) and \
+                    flows[edges[next_edge[i]]] == 0:
+                next_edge[i] += 1
+            if next_edge[i] == len(edges):
+                break
+            path.append(edges[next_edge[i]])
+            i = heads[path[-1]]
+
+        if not path:
+            break
+        if i != target:
+            raise ValueError, "Error: flow is not conserved."
+
+        amount = min([flows[e] for e in path])
+        for e in path:
+            flows[e] -= amount
+        paths.append([nodes[heads[e]] for e in path[:-1]])
+
+    if (total_edges > 50) and verbose:  # display progress
+        print >> sys.stderr, \
+            '\t... %d rounds found %d paths' % (mf_round, len(paths))
+
+    g = G.copy()
+    g.remove_nodes_from(['Start', 'End'])
+
+    K = nx.DiGraph()
+    for path in paths:
+        K.add_path(path)
+
+    if set(K.edges()) != set(g.edges()):
+        raise ValueError, "Error: Some edges are added or removed."
+
+    return paths
+
+
+def get_min_paths_maxflow(G, verbose=True):
     '''Returns minimal paths including all edges.
     G is a directed graph.
 
+    Paths are searched by rounds of max flow analysis on
+    a bipartite graph. This is slower than get_min_paths().
+
     '''
     total_edges = len(G.edges())
     paths = set()  # store unique paths
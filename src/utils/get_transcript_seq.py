@@ -1,6 +1,6 @@
 '''This script reads a gene model from BED file
 and writes a DNA sequence to standard output.
-The script requires pygr package.
+The reference genome can be in FASTA or 2bit format.
 
 '''
 
@@ -8,7 +8,7 @@ import sys
 import csv
 
 from collections import namedtuple
-from pygr import seqdb, sequtil
+from genome import open_genome, reverse_complement, write_fasta
 
 Exon = namedtuple('Exon', 'chrom, start, end')
 
@@ -16,12 +16,11 @@ Exon = namedtuple('Exon', 'chrom, start, end')
 def get_sequence_transcript(genome, exons, strand='positive'):
     seq = ''
     for exon in exons:
-        s = genome[exon.chrom][exon.start:exon.end]
-        seq += str(s)
+        seq += genome[exon.chrom][exon.start:exon.end]
     if strand == 'positive':
         return seq
     elif strand == 'negative':
-        return s.reverse_complement(seq)
+        return reverse_complement(seq)
     else:
         raise ValueError
 
@@ -29,13 +28,12 @@ def get_sequence_transcript(genome, exons, strand='positive'):
 def get_sequence_exon(genome, exons, strand='positive'):
     seqs = []
     for exon in exons:
-        s = genome[exon.chrom][exon.start:exon.end]
-        seqs.append(str(s))
+        seqs.append(genome[exon.chrom][exon.start:exon.end])
 
     if strand == 'positive':
         return seqs
     elif strand == 'negative':
-        rev_seqs = [s.reverse_complement(seq) for seq in seqs]
+        rev_seqs = [reverse_complement(seq) for seq in seqs]
         return rev_seqs
     else:
         raise ValueError
@@ -59,13 +57,13 @@ def write_seq(filename, genome, output, strand):
 
         if output == 'transcript':
             seq = get_sequence_transcript(genome, exons, strand)
-            sequtil.write_fasta(sys.stdout, seq, id=gene_id)
+            write_fasta(sys.stdout, seq, id=gene_id)
         elif output == 'exon':
             seqs = get_sequence_exon(genome, exons, strand)
 
             for n, seq in enumerate(seqs, start=1):
                 seq_id = gene_id + '_' + str(n)
-                sequtil.write_fasta(sys.stdout, seq, id=seq_id)
+                write_fasta(sys.stdout, seq, id=seq_id)
         else:
             print >> sys.stderr, 'Unsupported output format.'
             raise SystemExit
@@ -103,5 +101,5 @@ if __name__ == '__main__':
                 raise SystemExit
 
     # print >> sys.stderr, filename, genome_file, output, strand
-    genome = seqdb.SequenceFileDB(genome_file, verbose=False)
+    genome = open_genome(genome_file)
     write_seq(filename, genome, output, strand)
@@ -0,0 +1,200 @@
+'''Transparent input of plain, gzip and BGZF files and standard input.
+
+open_input() detects gzip-compressed data by its magic bytes, so
+.gz and .bgz files and compressed standard input ('-') are read in
+the same way as plain files. Compressed data is decompressed on a
+background thread which feeds the reader through a bounded queue.
+
+    fp = open_input('alignments.psl.gz')
+    first_line = peek_line(fp)
+    for line in fp:
+        ...
+
+'''
+
+import sys
+import zlib
+import threading
+import Queue
+
+BLOCK_SIZE = 1 << 20  # compressed bytes read at a time
+QUEUE_SIZE = 16  # decompressed blocks waiting to be read
+GZIP_MAGIC = '\x1f\x8b'
+
+
+def is_stdin(filename):
+    return filename == '-'
+
+
+class DecompressThread(threading.Thread):
+    '''Decompresses gzip members from a file object into a queue.
+
+    Concatenated members, e.g. blocks of a BGZF file, are decompressed
+    one after another. An exception raised in the thread is kept and
+    raised again by the reader.
+
+    '''
+    def __init__(self, fobj, data=''):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.fobj = fobj
+        self.data = data  # bytes already read from fobj
+        self.queue = Queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.stopped = False
+
+    def run(self):
+        try:
+            self.decompress()
+        except Exception:
+            self.error = sys.exc_info()
+        self.queue.put(None)
+
+    def decompress(self):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = self.data or self.fobj.read(BLOCK_SIZE)
+        while data and not self.stopped:
+            text = decompressor.decompress(data)
+            if text:
+                self.queue.put(text)
+            if decompressor.unused_data:  # the next member
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = self.fobj.read(BLOCK_SIZE)
+
+        text = decompressor.flush()
+        if text:
+            self.queue.put(text)
+
+
+class InputStream(object):
+    '''A read-only file-like object over decompressed or
+    non-seekable data.
+
+    Supports read(), readline(), iteration over lines and
+    peekline() to look at the first line without consuming it.
+
+    '''
+    def __init__(self, fobj, data='', compressed=False, name=None):
+        self.fobj = fobj
+        self.name = name or getattr(fobj, 'name', None)
+        self.buffer = ''
+        self.eof = False
+        if compressed:
+            self.thread = DecompressThread(fobj, data)
+            self.thread.start()
+        else:
+            self.thread = None
+            self.buffer = data
+
+    def fill(self):
+        '''Reads the next block into the buffer.
+        Returns False at the end of data.
+
+        '''
+        if self.eof:
+            return False
+        if self.thread:
+            text = self.thread.queue.get()
+            if text is None:
+                self.eof = True
+                if self.thread.error:
+                    raise self.thread.error[0], self.thread.error[1], \
+                            self.thread.error[2]
+                return False
+        else:
+            text = self.fobj.read(BLOCK_SIZE)
+            if not text:
+                self.eof = True
+                return False
+        self.buffer += text
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self.fill():
+                pass
+            size = len(self.buffer)
+        else:
+            while len(self.buffer) < size and self.fill():
+                pass
+        text, self.buffer = self.buffer[:size], self.buffer[size:]
+        return text
+
+    def readline(self):
+        end = self.buffer.find('\n')
+        while end < 0 and self.fill():
+            end = self.buffer.find('\n')
+        end = len(self.buffer) if end < 0 else end + 1
+        line, self.buffer = self.buffer[:end], self.buffer[end:]
+        return line
+
+    def peekline(self):
+        end = self.buffer.find('\n')
+        while end < 0 and self.fill():
+            end = self.buffer.find('\n')
+        return self.buffer[:end + 1] if end >= 0 else self.buffer
+
+    def __iter__(self):
+        while True:
+            if '\n' not in self.buffer and not self.fill():
+                break
+            lines = self.buffer.split('\n')
+            self.buffer = lines.pop()
+            for line in lines:
+                yield line + '\n'
+
+        if self.buffer:
+            line, self.buffer = self.buffer, ''
+            yield line
+
+    def close(self):
+        if self.thread:
+            self.thread.stopped = True
+            while self.thread.is_alive():  # unblock the thread
+                try:
+                    self.thread.queue.get(timeout=0.1)
+                except Queue.Empty:
+                    pass
+        if self.fobj is not sys.stdin:
+            self.fobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_input(filename):
+    '''Returns a file object of a plain or gzip-compressed file
+    or standard input if filename is '-'.
+
+    A plain file is returned as a built-in file object.
+
+    '''
+    if is_stdin(filename):
+        data = sys.stdin.read(len(GZIP_MAGIC))
+        return InputStream(sys.stdin, data,
+                            compressed=data == GZIP_MAGIC, name='<stdin>')
+
+    fobj = open(filename, 'rb')
+    if fobj.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+        fobj.seek(0)
+        return InputStream(fobj, compressed=True)
+    fobj.seek(0)
+    return fobj
+
+
+def peek_line(fobj):
+    '''Returns the first unread line of a file object
+    without consuming it.
+
+    '''
+    if isinstance(fobj, InputStream):
+        return fobj.peekline()
+    position = fobj.tell()
+    line = fobj.readline()
+    fobj.seek(position)
+    return line
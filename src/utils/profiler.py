@@ -0,0 +1,160 @@
+'''Timing and memory usage of stages of a run.
+
+A Profiler replaces functions of a module with wrappers that record
+calls, wall and CPU time of each stage, so functions are only timed
+when profiling is enabled. Time spent in a generator is counted while
+it produces items, not while its items are used.
+
+    profiler = Profiler()
+    profiler.patch(gimme, 'add_intron')
+    profiler.patch(split_strand, 'split', 'split_strand')
+    ...
+    profiler.write('report.json', alignments=n)
+    profiler.restore()
+
+Memory usage is the peak resident set size of the process, recorded
+when each stage returns, since tracemalloc is not available.
+
+'''
+
+import sys
+import json
+import time
+import inspect
+import resource
+from functools import wraps
+from collections import OrderedDict
+
+# ru_maxrss is in kilobytes on Linux and in bytes on Mac OS X
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def get_max_rss():
+    '''Returns the peak resident set size of the process in bytes.'''
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+class Stage(object):
+    '''Calls, items produced by a generator, time and memory
+    of a stage.
+
+    '''
+    __slots__ = ('calls', 'items', 'wall', 'cpu', 'max_rss')
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_rss = 0
+
+    def add(self, wall, cpu):
+        self.wall += wall
+        self.cpu += cpu
+        self.max_rss = get_max_rss()
+
+    def to_dict(self):
+        return OrderedDict([('calls', self.calls),
+                            ('items', self.items),
+                            ('wall_seconds', round(self.wall, 6)),
+                            ('cpu_seconds', round(self.cpu, 6)),
+                            ('max_rss_bytes', self.max_rss)])
+
+
+class Profiler(object):
+    '''Records stages of a run from the time it is created.'''
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.patched = []  # original functions of patched modules
+        self.start_wall = time.time()
+        self.start_cpu = time.clock()
+
+    def get_stage(self, name):
+        try:
+            return self.stages[name]
+        except KeyError:
+            stage = self.stages[name] = Stage()
+            return stage
+
+    def wrap(self, name, func):
+        '''Returns a function recording calls of func as a stage.'''
+
+        stage = self.get_stage(name)
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def timed_generator(*args, **kwargs):
+                stage.calls += 1
+                items = func(*args, **kwargs)
+                while True:
+                    wall, cpu = time.time(), time.clock()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        stage.add(time.time() - wall, time.clock() - cpu)
+                        return
+                    stage.add(time.time() - wall, time.clock() - cpu)
+                    stage.items += 1
+                    yield item
+
+            return timed_generator
+
+        @wraps(func)
+        def timed_function(*args, **kwargs):
+            stage.calls += 1
+            wall, cpu = time.time(), time.clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage.add(time.time() - wall, time.clock() - cpu)
+
+        return timed_function
+
+    def patch(self, module, attr, name=None):
+        '''Replaces a function of a module with a timed function.'''
+
+        func = getattr(module, attr)
+        self.patched.append((module, attr, func))
+        setattr(module, attr, self.wrap(name or attr, func))
+
+    def restore(self):
+        '''Puts back functions replaced by patch().'''
+
+        while self.patched:
+            module, attr, func = self.patched.pop()
+            setattr(module, attr, func)
+
+    def report(self, **counts):
+        '''Returns a report of all stages and throughput of counts,
+        e.g. alignments=1000, per second of the run.
+
+        '''
+        wall = time.time() - self.start_wall
+        cpu = time.clock() - self.start_cpu
+        throughput = OrderedDict()
+        for name in sorted(counts):
+            throughput[name] = counts[name]
+            throughput[name + '_per_second'] = \
+                        round(counts[name] / wall, 3) if wall > 0 else None
+
+        return OrderedDict([
+                ('total', OrderedDict([('wall_seconds', round(wall, 6)),
+                                        ('cpu_seconds', round(cpu, 6)),
+                                        ('max_rss_bytes', get_max_rss())])),
+                ('stages', OrderedDict((name, stage.to_dict())
+                            for name, stage in self.stages.iteritems())),
+                ('throughput', throughput),
+                ])
+
+    def write(self, filename, info=None, **counts):
+        '''Writes a report in JSON format with a dictionary of
+        information about the run.
+
+        '''
+        report = OrderedDict(info or {})
+        report.update(self.report(**counts))
+        with open(filename, 'w') as fp:
+            json.dump(report, fp, indent=2)
+            fp.write('\n')
@@ -3,10 +3,11 @@
 import sys
 import csv
 import pslparser
+from inputs import open_input
 
 
 def parsePSL(filename):
-    for pslObj in pslparser.read(open(filename)):
+    for pslObj in pslparser.read(open_input(filename)):
         strand = pslObj.strand
         chrom = pslObj.tName
         name = pslObj.qName
@@ -2,10 +2,44 @@
 '''The script parses PSL file (i.e. from BLAT output).
 read method returns each alignment stored in an PSL object.
 
+read_chunks method parses alignments in chunks and stores them
+in columns of numpy arrays. Block sizes and start positions of all
+alignments in a chunk are stored in flat arrays with an offset of
+each alignment.
+
 '''
 
 import sys
 
+import numpy as np
+
+CHUNK_SIZE = 1 << 23  # bytes read in a chunk
+
+FIELDS = [
+            ('matches', str),
+            ('misMatches', str),
+            ('repMatches', str),
+            ('nCount', int),
+            ('qNumInsert', str),
+            ('qBaseInsert', str),
+            ('tNumInsert', str),
+            ('tBaseInsert', str),
+            ('strand', str),
+            ('qName', str),
+            ('qSize', int),
+            ('qStart', int),
+            ('qEnd', int),
+            ('tName', str),
+            ('tSize', int),
+            ('tStart', int),
+            ('tEnd', int),
+            ('blockCount', int),
+            ('blockSizes', None),
+            ('qStarts', None),
+            ('tStarts', None),
+        ]
+FIELD_INDEX = dict((name, i) for i, (name, _) in enumerate(FIELDS))
+
 
 class PSL(object):
     def __init__(self, **kwargs):
@@ -15,6 +49,220 @@ class PSL(object):
         return self.attrib[key]
 
 
+class PSLChunk(object):
+    '''Alignments from a chunk of a PSL file in columns.
+
+    chrom_codes are indices to chrom_names, a list shared by all
+    chunks from the same file. Blocks of alignment i are stored in
+    block_sizes, q_starts and t_block_starts from offsets[i] to
+    offsets[i + 1]. Other fields are kept as strings in columns.
+
+    '''
+
+    def __init__(self, columns, chrom_names, chrom_codes, t_starts, t_ends,
+                    offsets, block_sizes, q_starts, t_block_starts):
+        self.columns = columns
+        self.chrom_names = chrom_names
+        self.chrom_codes = chrom_codes
+        self.t_starts = t_starts
+        self.t_ends = t_ends
+        self.offsets = offsets
+        self.block_sizes = block_sizes
+        self.q_starts = q_starts
+        self.t_block_starts = t_block_starts
+
+    def __len__(self):
+        return len(self.t_starts)
+
+    def __getitem__(self, i):
+        return PSLRecord(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield PSLRecord(self, i)
+
+
+class PSLRecord(object):
+    '''A view of an alignment in a chunk with attributes of PSL.'''
+
+    __slots__ = ('chunk', 'index')
+
+    def __init__(self, chunk, index):
+        self.chunk = chunk
+        self.index = index
+
+    @property
+    def tName(self):
+        return self.chunk.chrom_names[self.chunk.chrom_codes[self.index]]
+
+    @property
+    def tStart(self):
+        return int(self.chunk.t_starts[self.index])
+
+    @property
+    def tEnd(self):
+        return int(self.chunk.t_ends[self.index])
+
+    @property
+    def blockSizes(self):
+        offsets = self.chunk.offsets
+        return self.chunk.block_sizes[offsets[self.index]:
+                                        offsets[self.index + 1]].tolist()
+
+    @property
+    def qStarts(self):
+        offsets = self.chunk.offsets
+        return self.chunk.q_starts[offsets[self.index]:
+                                    offsets[self.index + 1]].tolist()
+
+    @property
+    def tStarts(self):
+        offsets = self.chunk.offsets
+        return self.chunk.t_block_starts[offsets[self.index]:
+                                        offsets[self.index + 1]].tolist()
+
+    def __getattr__(self, key):
+        try:
+            column = FIELD_INDEX[key]
+        except KeyError:
+            raise AttributeError(key)
+        return FIELDS[column][1](self.chunk.columns[column][self.index])
+
+
+def split_columns(text):
+    '''Returns 21 columns of tab-delimited lines in text or None.
+
+    All lines are split at once. None is returned if any line
+    has to be checked by split_rows(). Line ends are kept as fields,
+    so a line with too few fields and one with too many are not
+    taken for two lines of 21 fields.
+
+    '''
+    if ' ' in text or '\r' in text or '\n\n' in text:
+        return None
+
+    if not text.endswith('\n'):
+        text += '\n'
+    fields = text.replace('\n', '\t\n\t').split('\t')
+    fields.pop()
+    num_lines = len(fields) // 22
+    if len(fields) != num_lines * 22 or \
+            fields[21::22].count('\n') != num_lines:
+        return None
+
+    columns = [fields[i::22] for i in range(21)]
+    if '0' in columns[17]:  # alignments without blocks
+        return None
+    return columns
+
+
+def split_rows(lines, n):
+    '''Returns 21 columns of lines split one by one.
+
+    Lines with a wrong number of fields or without blocks are
+    written to standard error and skipped. n is the number of lines
+    read before.
+
+    '''
+    rows = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 21 or fields[17] == '0':
+            print >> sys.stderr, '>%d' % n, line
+        else:
+            rows.append(fields)
+        n += 1
+
+    if not rows:
+        return [[] for i in range(21)]
+    return [list(column) for column in zip(*rows)]
+
+
+def parse_column(column):
+    '''Returns an array of integers of a column.
+
+    np.fromstring() stops at the first value that is not a number,
+    so rows are converted one by one if fewer numbers are returned,
+    which raises ValueError for an invalid value.
+
+    '''
+    values = np.fromstring(' '.join(column), dtype=np.int64, sep=' ')
+    if len(values) == len(column):
+        return values
+
+    return np.array([int(value) for value in column], dtype=np.int64)
+
+
+def parse_blocks(column, counts):
+    '''Returns a flat array of comma-separated numbers of a column.
+
+    Numbers of all rows are converted at once if every row ends
+    with a comma. Otherwise rows are converted one by one.
+
+    '''
+    text = ''.join(column)
+    total = counts.sum()
+    blocks = np.fromstring(text, dtype=np.int64, sep=',')
+    if len(blocks) == total and text.count(',') == total:
+        return blocks
+
+    blocks = []
+    for value, count in zip(column, counts):
+        values = [int(i) for i in value.split(',') if i]
+        if len(values) != count:
+            raise ValueError('blockCount does not match blocks: ' + value)
+        blocks.extend(values)
+    return np.array(blocks, dtype=np.int64)
+
+
+def read_chunks(fobj, comment=None, chunk_size=CHUNK_SIZE):
+    '''Yields PSLChunk objects of alignments.
+
+    Lines are checked and skipped as in read().
+
+    '''
+    chrom_names = []
+    chrom_index = {}
+    n = 0
+    while True:
+        text = fobj.read(chunk_size)
+        if not text:
+            break
+        if not text.endswith('\n'):
+            text += fobj.readline()
+
+        if comment and (text.startswith(comment) or
+                            '\n' + comment in text):
+            text = ''.join([line for line in text.splitlines(True)
+                                if not line.startswith(comment)])
+
+        columns = split_columns(text)
+        if columns is None:
+            lines = text.splitlines(True)
+            columns = split_rows(lines, n)
+            n += len(lines)
+        else:
+            n += len(columns[0])
+
+        for chrom in sorted(set(columns[13]).difference(chrom_index)):
+            chrom_index[chrom] = len(chrom_names)
+            chrom_names.append(chrom)
+        chrom_codes = np.array([chrom_index[chrom] for chrom in columns[13]],
+                                dtype=np.int32)
+
+        counts = parse_column(columns[17])
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        yield PSLChunk(columns, chrom_names, chrom_codes,
+                        parse_column(columns[15]),
+                        parse_column(columns[16]),
+                        offsets,
+                        parse_blocks(columns[18], counts),
+                        parse_blocks(columns[19], counts),
+                        parse_blocks(columns[20], counts))
+
+
 def read(fobj, comment=None):
     '''Return an object of an alignment.
 
@@ -24,50 +272,8 @@ def read(fobj, comment=None):
     with comment character.
 
     '''
-    n = 0
-    for line in fobj:
-        if comment and line.startswith(comment):
-                continue
-
-        attrib = {}
-        rows = line.split()
-
-        try:
-            assert len(rows) == 21
-        except AssertionError:
-            print >> sys.stderr, '>%d' % n, line
-            n += 1
-            continue
-
-        attrib['matches'] = rows[0]
-        attrib['misMatches'] = rows[1]
-        attrib['repMatches'] = rows[2]
-        attrib['nCount'] = int(rows[3])
-        attrib['qNumInsert'] = rows[4]
-        attrib['qBaseInsert'] = rows[5]
-        attrib['tNumInsert'] = rows[6]
-        attrib['tBaseInsert'] = rows[7]
-        attrib['strand'] = rows[8]
-        attrib['qName'] = rows[9]
-        attrib['qSize'] = int(rows[10])
-        attrib['qStart'] = int(rows[11])
-        attrib['qEnd'] = int(rows[12])
-        attrib['tName'] = rows[13]
-        attrib['tSize'] = int(rows[14])
-        attrib['tStart'] = int(rows[15])
-        attrib['tEnd'] = int(rows[16])
-        attrib['blockCount'] = int(rows[17])
-        attrib['blockSizes'] = [int(i) for i in rows[18].split(',')[:-1]]
-        attrib['qStarts'] = [int(i) for i in rows[19].split(',')[:-1]]
-        attrib['tStarts'] = [int(i) for i in rows[20].split(',')[:-1]]
-
-        pobj = PSL(**attrib)  # pobj = PSL object
-        if attrib['blockCount'] == 0:
-            print >> sys.stderr, '>%d' % n, line
-            n += 1
-            continue
-        else:
-            n += 1
+    for chunk in read_chunks(fobj, comment):
+        for pobj in chunk:
             yield pobj
 
 if __name__ == '__main__':
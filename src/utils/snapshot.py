@@ -0,0 +1,123 @@
+'''Binary snapshots of numpy arrays.
+
+A snapshot file has a header with a key and a description of each
+array followed by raw data of the arrays. Arrays are loaded as
+read-only views of a memory-mapped file, so loading a snapshot
+does not read data until it is used.
+
+    key = file_digest(['a.psl', 'b.psl'], gap_size, max_intron)
+    save('db.snapshot', key, {'starts': starts, 'ends': ends})
+    snapshot = load('db.snapshot', key)  # None if the key differs
+
+'''
+
+import mmap
+import struct
+import hashlib
+import cPickle
+
+import numpy as np
+
+MAGIC = 'GIMMESNP'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, size of a description
+ALIGNMENT = 8  # arrays start at multiples of 8 bytes
+BLOCK_SIZE = 1 << 20  # bytes read at a time to compute a digest
+
+
+def file_digest(filenames, *params):
+    '''Returns a SHA-1 digest of contents of files in order
+    and parameters.
+
+    '''
+    digest = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as fp:
+            for block in iter(lambda: fp.read(BLOCK_SIZE), ''):
+                digest.update(block)
+        digest.update('\0')
+    digest.update(repr(params))
+    return digest.hexdigest()
+
+
+class Snapshot(object):
+    '''Arrays and metadata loaded from a snapshot file.
+
+    arrays = a dictionary of read-only arrays
+    meta = an object saved with the arrays
+
+    '''
+    def __init__(self, data, meta, arrays):
+        self.data = data  # a memory-mapped file
+        self.meta = meta
+        self.arrays = arrays
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays = {}
+        self.data.close()
+
+
+def save(filename, key, arrays, meta=None):
+    '''Writes a dictionary of numpy arrays to a snapshot file.'''
+
+    arrays = [(name, np.ascontiguousarray(arrays[name]))
+                for name in sorted(arrays)]
+    columns = []
+    offset = 0
+    for name, data in arrays:
+        columns.append((name, data.dtype.str, data.shape, offset))
+        offset += data.nbytes + (-data.nbytes % ALIGNMENT)
+
+    description = cPickle.dumps((key, meta, columns), 2)
+    start = HEADER.size + len(description)
+    start += -start % ALIGNMENT
+
+    with open(filename, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(description)))
+        fp.write(description)
+        fp.write('\0' * (start - fp.tell()))
+        for name, data in arrays:
+            fp.write(data.tostring())
+            fp.write('\0' * (-data.nbytes % ALIGNMENT))
+
+
+def load(filename, key=None):
+    '''Returns a Snapshot loaded from a file.
+
+    None is returned if the file is not found, it is not a snapshot
+    of this version or it was saved with another key.
+
+    '''
+    try:
+        fp = open(filename, 'rb')
+    except IOError:
+        return None
+
+    with fp:
+        header = fp.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        magic, version, size = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            return None
+        saved_key, meta, columns = cPickle.loads(fp.read(size))
+        if key is not None and saved_key != key:
+            return None
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    start = HEADER.size + size
+    start += -start % ALIGNMENT
+    arrays = {}
+    for name, dtype, shape, offset in columns:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count:
+            arrays[name] = np.frombuffer(data, dtype, count,
+                                            start + offset).reshape(shape)
+        else:
+            arrays[name] = np.zeros(shape, dtype)
+
+    return Snapshot(data, meta, arrays)
@@ -11,7 +11,7 @@ Junctions without a transcriptional direction are ignored.
 '''
 
 import sys
-from pygr import seqdb
+from genome import open_genome, reverse_complement
 
 SEQLEN = 21  # number of nucleotides on each side of the splice junction.
 
@@ -56,13 +56,13 @@ def get_splice_site(genome, intron):
         acceptor_end = start + SEQLEN if start + SEQLEN < len(ref) else None
         if acceptor_start and acceptor_end:
             acceptor_seq = ref[acceptor_start:acceptor_end]
-            acceptor_seq = acceptor_seq.reverse_complement(str(acceptor_seq))
+            acceptor_seq = reverse_complement(acceptor_seq)
 
         donor_start = end - SEQLEN if end - SEQLEN > 0 else None
         donor_end = end + SEQLEN if end + SEQLEN < len(ref) else None
         if donor_start and donor_end:
             donor_seq = ref[donor_start:donor_end]
-            donor_seq = donor_seq.reverse_complement(str(donor_seq))
+            donor_seq = reverse_complement(donor_seq)
 
         return str(donor_seq), str(acceptor_seq)
 
@@ -86,8 +86,8 @@ def get_junction_seq(genome, intron):
     if strand == '+':
         return str(donor_seq) + str(acceptor_seq)
     else:
-        donor_seq = donor_seq.reverse_complement(str(donor_seq))
-        acceptor_seq = acceptor_seq.reverse_complement(str(acceptor_seq))
+        donor_seq = reverse_complement(donor_seq)
+        acceptor_seq = reverse_complement(acceptor_seq)
         return str(acceptor_seq) + str(donor_seq)
 
 
@@ -95,7 +95,7 @@ def main():
     infile = sys.argv[1]
     refseq = sys.argv[2]
 
-    refseq = seqdb.SequenceFileDB(refseq)
+    refseq = open_genome(refseq)
     # op1 = open('donor_sites', 'w')
     # op2 = open('acceptor_sites', 'w')
     for n, intron in enumerate(parse_input(infile), start=1):
@@ -1,20 +1,31 @@
+import sys
 import string
+import cPickle
 
 import networkx as nx
 
 table = string.maketrans('ACGT', 'TGCA')
 
 
-def get_splice_sites(genome, exon1, exon2):
-    chrom, pos = exon1.split(':')
-    start, end = [int(p) for p in pos.split('-')]
-    donor = genome[chrom][end:end + 2]
+def get_splice_sites(genome, edges, exons, junctions=None):
+    '''Returns (donor, acceptor, strand) of introns between exons.
 
-    chrom, pos = exon2.split(':')
-    start, end = [int(p) for p in pos.split('-')]
-    acceptor = genome[chrom][start - 2:start]
+    Edges are pairs of exon IDs, indices of exon objects in exons.
+    All edges are from the same chromosome, so splice sites not in
+    a junction cache are fetched in one batch.
 
-    return str(donor), str(acceptor)
+    '''
+    if not edges:
+        return []
+
+    if junctions is None:
+        junctions = JunctionCache()
+
+    chrom = exons[edges[0][0]].chrom
+    starts = [exons[exon1].end for exon1, exon2 in edges]
+    ends = [exons[exon2].start for exon1, exon2 in edges]
+
+    return junctions.get(genome, chrom, starts, ends)
 
 
 def identify_strand(splice_sites):
@@ -30,12 +41,86 @@ def identify_strand(splice_sites):
         return 0
 
 
-def compare_edges(edge):
-    return int(edge[0].split(':')[1].split('-')[0])
+class JunctionCache(object):
+    '''Donor and acceptor dinucleotides and a strand of junctions.
+
+    A cache is shared across loci, so each junction is looked up in
+    the genome once per run. Junctions are stored by chromosome and
+    keyed by start << 32 | end as in IntronTable.
+
+    '''
+    def __init__(self, lengths=None):
+        self.lengths = lengths  # chromosome lengths of the genome
+        self.junctions = {}
+
+    def __len__(self):
+        return sum(len(junctions) for junctions in self.junctions.values())
+
+    def get(self, genome, chrom, starts, ends):
+        '''Returns a list of (donor, acceptor, strand) of junctions.'''
+
+        junctions = self.junctions.setdefault(chrom, {})
+        keys = [start << 32 | end for start, end in zip(starts, ends)]
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in junctions:
+                missing.setdefault(key, i)
+        missing = sorted(missing.values())
+        if missing:
+            donors, acceptors = genome.splice_sites(chrom,
+                                            [starts[i] for i in missing],
+                                            [ends[i] for i in missing])
+            for i, donor, acceptor in zip(missing, donors, acceptors):
+                junctions[keys[i]] = (intern(donor), intern(acceptor),
+                                        identify_strand((donor, acceptor)))
+
+        return [junctions[key] for key in keys]
+
+    def save(self, filename):
+        with open(filename, 'wb') as fp:
+            cPickle.dump((self.lengths, self.junctions), fp, 2)
+
 
+def load_junction_cache(filename, genome):
+    '''Returns a junction cache saved in a file.
 
-def split(graph, genome):
-    '''genome = pygr sequence DB object'''
+    An empty cache is returned if the file is not found or it was
+    saved with a genome with different chromosome lengths.
+
+    '''
+    lengths = dict(genome.lengths)
+    cache = JunctionCache(lengths)
+    try:
+        with open(filename, 'rb') as fp:
+            saved_lengths, junctions = cPickle.load(fp)
+    except IOError:
+        return cache
+
+    if saved_lengths != lengths:
+        print >> sys.stderr, 'WARNING: %s was built from another ' \
+                                'genome and is not used.' % filename
+        return cache
+
+    cache.junctions = junctions
+    return cache
+
+
+def compare_edges(edge, exons):
+    '''Returns a sort key of an edge from exon coordinates.
+
+    Edges from the same exon are ordered by their acceptor exons,
+    so the order does not depend on the order of edges in a graph.
+
+    '''
+    return [(exons[exon].start, exons[exon].end) for exon in edge]
+
+
+def split(graph, genome, exons, junctions=None):
+    '''graph = a splice graph of exon IDs
+    genome = a genome object from utils.genome
+    exons = exon objects indexed by exon IDs
+    junctions = a JunctionCache shared across loci
+    '''
 
     class Edgeobj(object):
         def __init__(self, edge, ss, strand):
@@ -50,10 +135,11 @@ def split(graph, genome):
     neg_graph = nx.DiGraph(strand='-')  # a graph for negative strand
 
     strand_scores = []
-    sorted_edges = sorted(graph.edges(), key=compare_edges)
-    for edge in sorted_edges:
-        splice_sites = get_splice_sites(genome, *edge)
-        strand = identify_strand(splice_sites)
+    sorted_edges = sorted(graph.edges(),
+                            key=lambda edge: compare_edges(edge, exons))
+    for edge, (donor, acceptor, strand) in zip(sorted_edges,
+                get_splice_sites(genome, sorted_edges, exons, junctions)):
+        splice_sites = (donor, acceptor)
         edges[edge] = Edgeobj(edge, splice_sites, strand)
         strand_scores.append(strand)
 
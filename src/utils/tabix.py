@@ -0,0 +1,371 @@
+'''Random access to coordinate-sorted, BGZF-compressed alignments
+with a tabix index (.tbi).
+
+build_index() writes a tabix-compatible index of PSL or BED lines
+sorted by chromosome and start position and compressed with bgzip
+or bedwriter. TabixFile reads lines overlapping a region by seeking
+to BGZF blocks listed in the index, so only a small part of a large
+file is decompressed.
+
+    build_index('alignments.psl.gz')
+    with TabixFile('alignments.psl.gz') as fp:
+        for start, end, line in fp.fetch('chr1', 10000, 20000):
+            ...
+
+Run as a script to index files:
+
+    python tabix.py alignments.psl.gz
+
+'''
+
+import sys
+import zlib
+import struct
+import argparse
+
+import bedwriter
+
+# 1-based columns of a chromosome, a 0-based start and an end
+PRESETS = {
+            'psl': (14, 16, 17),
+            'bed': (1, 2, 3),
+        }
+
+MAX_POSITION = 1 << 29  # the largest position of the binning scheme
+CACHE_BLOCKS = 64  # decompressed blocks kept by a BGZFReader
+BGZF_MAGIC = '\x1f\x8b\x08\x04'
+BLOCK_HEADER = struct.Struct('<4BI2BH')
+
+
+def get_index_filename(filename):
+    return filename + '.tbi'
+
+
+def reg2bins(start, end):
+    '''Returns bins which may contain lines overlapping a region.'''
+
+    bins = [0]
+    end -= 1
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(xrange(offset + (start >> shift),
+                            offset + (end >> shift) + 1))
+    return bins
+
+
+class BGZFReader(object):
+    '''Reads blocks of a BGZF file at compressed offsets.
+
+    Recently read blocks are cached, so overlapping queries do not
+    decompress the same blocks again.
+
+    '''
+    def __init__(self, fobj):
+        self.fobj = fobj
+        self.cache = {}
+
+    def read_block(self, coffset):
+        '''Returns decompressed data of a block at a compressed offset
+        and an offset of the next block. Data is None at the end of
+        a file.
+
+        '''
+        try:
+            return self.cache[coffset]
+        except KeyError:
+            pass
+
+        self.fobj.seek(coffset)
+        header = self.fobj.read(BLOCK_HEADER.size)
+        if not header:
+            return None, coffset
+        if len(header) < BLOCK_HEADER.size or \
+                header[:4] != BGZF_MAGIC:
+            raise ValueError('not a BGZF block at offset %d' % coffset)
+
+        extra = self.fobj.read(BLOCK_HEADER.unpack(header)[-1])
+        block_size = None
+        position = 0
+        while position + 4 <= len(extra):
+            length = struct.unpack_from('<H', extra, position + 2)[0]
+            if extra[position:position + 2] == 'BC' and length == 2:
+                block_size = struct.unpack_from('<H', extra,
+                                                position + 4)[0] + 1
+            position += 4 + length
+        if block_size is None:
+            raise ValueError('not a BGZF block at offset %d' % coffset)
+
+        cdata = self.fobj.read(block_size - BLOCK_HEADER.size -
+                                len(extra))
+        data = zlib.decompress(cdata[:-8], -zlib.MAX_WBITS)
+        if len(self.cache) >= CACHE_BLOCKS:
+            self.cache.clear()
+        self.cache[coffset] = data, coffset + block_size
+        return data, coffset + block_size
+
+    def iter_lines(self, vstart=0, vend=None):
+        '''Yields (line, virtual start, virtual end) of lines starting
+        from a virtual offset vstart before a virtual offset vend.
+
+        '''
+        coffset, within = vstart >> 16, vstart & 0xffff
+        pending = ''
+        pending_start = vstart
+        while True:
+            data, next_coffset = self.read_block(coffset)
+            if data is None:
+                break
+            while True:
+                if not pending and vend is not None and \
+                        coffset << 16 | within >= vend:
+                    return
+                newline = data.find('\n', within)
+                if newline < 0:
+                    break
+                if pending:
+                    line_start = pending_start
+                    line = pending + data[within:newline + 1]
+                    pending = ''
+                else:
+                    line_start = coffset << 16 | within
+                    line = data[within:newline + 1]
+                within = newline + 1
+                if within == len(data):
+                    yield line, line_start, next_coffset << 16
+                else:
+                    yield line, line_start, coffset << 16 | within
+
+            if within < len(data):
+                if not pending:
+                    pending_start = coffset << 16 | within
+                pending += data[within:]
+            coffset, within = next_coffset, 0
+
+        if pending:
+            yield pending, pending_start, coffset << 16
+
+
+def is_bgzf(filename):
+    with open(filename, 'rb') as fp:
+        header = fp.read(BLOCK_HEADER.size + 6)
+    return header[:4] == BGZF_MAGIC and header[12:14] == 'BC'
+
+
+def detect_preset(line):
+    '''Returns a preset of a line, psl for 21 columns or bed.'''
+
+    return 'psl' if len(line.split()) == 21 else 'bed'
+
+
+def iter_records(reader, columns, filename):
+    '''Yields (chrom, start, end, virtual start, virtual end) of lines
+    of a BGZF file. Raises ValueError if lines are not sorted by
+    chromosome and start position.
+
+    '''
+    chrom_col, start_col, end_col = [column - 1 for column in columns]
+    last_chrom = None
+    last_start = 0
+    chroms = set()
+    for n, (line, vstart, vend) in enumerate(reader.iter_lines(), start=1):
+        if line.startswith('#') or not line.strip():
+            continue
+        cols = line.split()
+        try:
+            chrom = cols[chrom_col]
+            start = int(cols[start_col])
+            end = int(cols[end_col])
+        except (IndexError, ValueError):
+            raise ValueError('%s: line %d: missing or invalid positions' %
+                                (filename, n))
+        if chrom != last_chrom:
+            if chrom in chroms:
+                raise ValueError('%s: line %d: %s is not contiguous, '
+                                    'sort lines by chromosome and start '
+                                    'position' % (filename, n, chrom))
+            chroms.add(chrom)
+            last_chrom = chrom
+        elif start < last_start:
+            raise ValueError('%s: line %d: lines are not sorted by '
+                                'start position' % (filename, n))
+        last_start = start
+        yield chrom, start, end, vstart, vend
+
+
+def build_index(filename, preset=None, index_filename=None):
+    '''Writes a tabix index of a sorted, BGZF-compressed PSL or BED
+    file to index_filename or filename + '.tbi'.
+
+    A preset, psl or bed, is detected from the first line if not given.
+    Raises ValueError if a file is not BGZF-compressed or not sorted.
+
+    '''
+    if not is_bgzf(filename):
+        raise ValueError('%s is not BGZF-compressed, compress it with '
+                            'bgzip' % filename)
+
+    with open(filename, 'rb') as fp:
+        reader = BGZFReader(fp)
+        if preset is None:
+            preset = 'bed'
+            for line, vstart, vend in reader.iter_lines():
+                if line.strip() and not line.startswith('#'):
+                    preset = detect_preset(line)
+                    break
+        columns = PRESETS[preset]
+        bedwriter.write_tabix_index(index_filename or
+                                        get_index_filename(filename),
+                                    iter_records(reader, columns, filename),
+                                    columns)
+
+
+def decompress(data):
+    '''Returns data of concatenated gzip members.'''
+
+    text = []
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        text.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return ''.join(text)
+
+
+class TabixIndex(object):
+    '''Chromosome names, columns, bins and linear indexes
+    of a tabix index.
+
+    '''
+    def __init__(self, names, columns, references):
+        self.names = names
+        self.tids = dict((name, tid) for tid, name in enumerate(names))
+        self.columns = columns
+        self.references = references  # (bins, linear index)
+
+    def get_chunks(self, chrom, start, end):
+        '''Returns sorted and merged (virtual start, virtual end) of
+        chunks which may contain lines overlapping a region.
+
+        '''
+        try:
+            bins, linear = self.references[self.tids[chrom]]
+        except KeyError:
+            return []
+
+        if linear:
+            min_offset = linear[min(start >> bedwriter.TABIX_LINEAR_SHIFT,
+                                    len(linear) - 1)]
+        else:
+            min_offset = 0
+        chunks = sorted(chunk for bin in reg2bins(start, end)
+                            for chunk in bins.get(bin, ())
+                            if chunk[1] > min_offset)
+
+        merged = []
+        for vstart, vend in chunks:
+            if merged and vstart <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], vend)
+            else:
+                merged.append([vstart, vend])
+        return merged
+
+
+def read_index(filename):
+    '''Returns a TabixIndex read from a file.'''
+
+    with open(filename, 'rb') as fp:
+        data = decompress(fp.read())
+    if data[:4] != 'TBI\1':
+        raise ValueError('%s is not a tabix index' % filename)
+
+    (n_ref, file_format, col_seq, col_beg, col_end, meta, skip,
+        name_size) = struct.unpack_from('<8i', data, 4)
+    position = 36
+    names = data[position:position + name_size].split('\0')[:n_ref]
+    position += name_size
+
+    references = []
+    for i in xrange(n_ref):
+        bins = {}
+        n_bin = struct.unpack_from('<i', data, position)[0]
+        position += 4
+        for j in xrange(n_bin):
+            bin, n_chunk = struct.unpack_from('<Ii', data, position)
+            position += 8
+            chunks = [struct.unpack_from('<QQ', data, position + k * 16)
+                        for k in xrange(n_chunk)]
+            position += n_chunk * 16
+            if bin != bedwriter.TABIX_PSEUDO_BIN:
+                bins[bin] = chunks
+        n_intv = struct.unpack_from('<i', data, position)[0]
+        position += 4
+        linear = list(struct.unpack_from('<%dQ' % n_intv, data, position))
+        position += n_intv * 8
+        references.append((bins, linear))
+
+    return TabixIndex(names, (col_seq, col_beg, col_end), references)
+
+
+class TabixFile(object):
+    '''A BGZF-compressed file of sorted lines with a tabix index.'''
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index = read_index(index_filename or
+                                get_index_filename(filename))
+        self.fobj = open(filename, 'rb')
+        self.reader = BGZFReader(self.fobj)
+
+    def fetch(self, chrom, start=0, end=MAX_POSITION):
+        '''Yields (start, end, line) of lines overlapping a region
+        in order of lines in a file.
+
+        '''
+        chrom_col, start_col, end_col = [column - 1
+                                            for column in self.index.columns]
+        for vstart, vend in self.index.get_chunks(chrom, start, end):
+            for line, voffset, next_voffset in \
+                    self.reader.iter_lines(vstart, vend):
+                if line.startswith('#'):
+                    continue
+                cols = line.split()
+                if not cols or cols[chrom_col] != chrom:
+                    continue
+                line_start = int(cols[start_col])
+                if line_start >= end:
+                    return
+                line_end = int(cols[end_col])
+                if line_end > start:
+                    yield line_start, line_end, line
+
+    def close(self):
+        self.fobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tabix.py',
+                description='Index sorted, BGZF-compressed PSL or BED ' +
+                            'files for random access with --region.')
+    parser.add_argument('input', type=str, nargs='+',
+            help='BGZF-compressed file(s) sorted by chromosome and ' +
+                    'start position, e.g. sort -k14,14 -k16,16n for PSL')
+    parser.add_argument('-p', '--preset', choices=sorted(PRESETS),
+            help='a format of input files (default: detected from ' +
+                    'the first line)')
+    args = parser.parse_args(argv)
+
+    for filename in args.input:
+        try:
+            build_index(filename, args.preset)
+        except (IOError, ValueError) as e:
+            print >> sys.stderr, 'ERROR: %s' % e
+            raise SystemExit(1)
+        print >> sys.stderr, 'Indexed %s' % filename
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''Time and memory budgets of a block of code.
+
+A Budget checks elapsed time and growth of resident memory of the
+process on a timer signal and raises BudgetExceeded in the main
+thread when a limit is reached, so a long computation is stopped
+wherever it is.
+
+    budget = Budget(time_limit=60, memory_limit=2 << 30)
+    try:
+        with budget:
+            paths = list(find_paths(graph))
+    except BudgetExceeded as e:
+        print e.reason  # 'time' or 'memory'
+
+Only one budget can be active at a time and it must be used in the
+main thread of a process.
+
+'''
+
+import os
+import time
+import signal
+import resource
+
+INTERVAL = 0.05  # seconds between checks
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def get_rss():
+    '''Returns the current resident set size of the process in bytes.
+
+    The peak resident set size is returned if /proc is not available.
+
+    '''
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname()[0] == 'Darwin' else rss * 1024
+
+
+class BudgetExceeded(Exception):
+    '''Raised when a budget runs out of time or memory.'''
+
+    def __init__(self, reason, limit):
+        Exception.__init__(self, '%s limit of %s exceeded' % (reason, limit))
+        self.reason = reason
+        self.limit = limit
+
+
+class Budget(object):
+    '''A time limit in seconds and a limit of memory in bytes
+    allocated in a with block. Either limit can be None.
+
+    '''
+    def __init__(self, time_limit=None, memory_limit=None,
+                    interval=INTERVAL):
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.interval = interval
+        if time_limit:
+            self.interval = min(interval, time_limit)
+        self.active = False
+        self.start_time = None
+        self.start_rss = None
+        self.handler = None
+
+    def check(self, signum=None, frame=None):
+        '''Raises BudgetExceeded if a limit is reached.'''
+
+        if not self.active:
+            return
+        if self.time_limit and \
+                time.time() - self.start_time > self.time_limit:
+            self.stop()
+            raise BudgetExceeded('time', self.time_limit)
+        if self.memory_limit and \
+                get_rss() - self.start_rss > self.memory_limit:
+            self.stop()
+            raise BudgetExceeded('memory', self.memory_limit)
+
+    def start(self):
+        self.start_time = time.time()
+        if self.memory_limit:
+            self.start_rss = get_rss()
+        self.handler = signal.signal(signal.SIGALRM, self.check)
+        self.active = True
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self.handler or signal.SIG_DFL)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
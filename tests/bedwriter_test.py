@@ -0,0 +1,100 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import gzip
+import shutil
+import struct
+import tempfile
+import zlib
+from StringIO import StringIO
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import bedwriter
+
+
+def make_lines(n):
+    lines = []
+    for i in range(n):
+        start = i * 7919 % 100000
+        lines.append(bedwriter.format_bed('chr%d' % (i % 3), start,
+                                            start + 100, 'g%d' % i, '+',
+                                            '10,20', '0,80'))
+    return lines
+
+
+class TestBedWriter(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_format_bed(self):
+        line = bedwriter.format_bed('chr1', 100, 250, 'chr1:1.1', '-',
+                                    '50,20', '0,130')
+        self.assertEqual(line, 'chr1\t100\t250\tchr1:1.1\t1000\t-\t100\t250'
+                                '\t0,0,0\t2\t50,20\t0,130\r\n')
+
+    def test_plain(self):
+        lines = make_lines(200)
+        output = StringIO()
+        writer = bedwriter.BedWriter(output, buffer_size=100)
+        for line in lines:
+            writer.write(line)
+        writer.close()
+        self.assertEqual(output.getvalue(), ''.join(lines))
+
+    def test_sorted(self):
+        lines = make_lines(200)
+        output = StringIO()
+        writer = bedwriter.BedWriter(output, sort=True)
+        writer.write(''.join(lines))
+        writer.close()
+
+        def key(line):
+            fields = line.split('\t')
+            return fields[0], int(fields[1]), int(fields[2])
+        self.assertEqual(output.getvalue(), ''.join(sorted(lines, key=key)))
+
+    def test_gzip(self):
+        lines = make_lines(1000)
+        filename = os.path.join(self.tmpdir, 'models.bed.gz')
+        writer = bedwriter.open_output(filename, 'gzip', buffer_size=1000)
+        for line in lines:
+            writer.write(line)
+        writer.close()
+        self.assertEqual(gzip.open(filename).read(), ''.join(lines))
+
+    def test_bgzf_index(self):
+        lines = make_lines(5000)
+        filename = os.path.join(self.tmpdir, 'models.bed.gz')
+        writer = bedwriter.open_output(filename, index=True,
+                                        buffer_size=1000)
+        for line in lines:
+            writer.write(line)
+        writer.close()
+
+        data = open(filename, 'rb').read()
+        self.assertTrue(data.endswith(bedwriter.BGZF_EOF))
+        text = gzip.open(filename).read()
+        self.assertEqual(sorted(text.splitlines(True)), sorted(lines))
+
+        index = zlib.decompress(open(filename + '.tbi', 'rb').read(),
+                                    31)  # the first BGZF block
+        self.assertEqual(index[:4], 'TBI\1')
+        n_ref = struct.unpack('<i', index[4:8])[0]
+        self.assertEqual(n_ref, 3)
+
+    def test_index_requires_bgzf(self):
+        self.assertRaises(ValueError, bedwriter.BedWriter, StringIO(),
+                            'gzip', True, 'x.tbi')
+        self.assertRaises(ValueError, bedwriter.BedWriter, StringIO(),
+                            None, False, 'x.tbi')
+        self.assertRaises(ValueError, bedwriter.BedWriter, StringIO(),
+                            'xz')
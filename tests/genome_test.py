@@ -0,0 +1,135 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import shutil
+import struct
+import tempfile
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import genome
+
+SEQS = {
+        'chr1': 'ACGTTGCAaaccGGTTNNNNNacgtACGTAGGTACCAGTA',
+        'chr2': 'GTAGNNAG',
+        }
+
+
+def write_fasta(filename, seqs, width):
+    with open(filename, 'w') as fp:
+        for name in sorted(seqs):
+            print >> fp, '>%s description' % name
+            seq = seqs[name]
+            for i in range(0, len(seq), width):
+                print >> fp, seq[i:i + width]
+
+
+def blocks(seq, func):
+    '''Returns starts and sizes of runs of bases for which func is true.'''
+    starts, sizes = [], []
+    for i, base in enumerate(seq):
+        if func(base):
+            if starts and starts[-1] + sizes[-1] == i:
+                sizes[-1] += 1
+            else:
+                starts.append(i)
+                sizes.append(1)
+    return starts, sizes
+
+
+def write_twobit(filename, seqs):
+    codes = {'T': 0, 'C': 1, 'A': 2, 'G': 3, 'N': 0}
+    names = sorted(seqs)
+    header = struct.pack('<IIII', genome.TWOBIT_SIGNATURE, 0, len(names), 0)
+    offset = len(header) + sum(1 + len(name) + 4 for name in names)
+
+    index, records = '', ''
+    for name in names:
+        seq = seqs[name]
+        n_blocks = blocks(seq, lambda base: base in 'Nn')
+        mask_blocks = blocks(seq, lambda base: base.islower())
+        record = struct.pack('<I', len(seq))
+        for starts, sizes in (n_blocks, mask_blocks):
+            record += struct.pack('<I', len(starts))
+            record += struct.pack('<%dI' % len(starts), *starts)
+            record += struct.pack('<%dI' % len(sizes), *sizes)
+        record += struct.pack('<I', 0)
+        padded = seq.upper() + 'T' * (-len(seq) % 4)
+        for i in range(0, len(padded), 4):
+            byte = 0
+            for base in padded[i:i + 4]:
+                byte = byte << 2 | codes[base]
+            record += chr(byte)
+        index += chr(len(name)) + name + struct.pack('<I',
+                                            offset + len(records))
+        records += record
+
+    with open(filename, 'wb') as fp:
+        fp.write(header + index + records)
+
+
+class TestGenome(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_genome(self, g):
+        self.assertEqual(g.keys(), ['chr1', 'chr2'])
+        for name, seq in SEQS.items():
+            self.assertEqual(len(g[name]), len(seq))
+            self.assertEqual(str(g[name]), seq)
+            for start in range(len(seq)):
+                for end in range(start, len(seq) + 3):
+                    self.assertEqual(g[name][start:end], seq[start:end])
+
+        starts = range(len(SEQS['chr1']) - 1)
+        ends = range(2, len(SEQS['chr1']) + 1)
+        donors, acceptors = g.splice_sites('chr1', starts, ends)
+        self.assertEqual(donors, [SEQS['chr1'][s:s + 2] for s in starts])
+        self.assertEqual(acceptors, [SEQS['chr1'][e - 2:e] for e in ends])
+
+    def test_fasta(self):
+        for width in (7, 8, 60):
+            filename = os.path.join(self.tmpdir, 'genome%d.fa' % width)
+            write_fasta(filename, SEQS, width)
+            g = genome.open_genome(filename)
+            self.assertTrue(isinstance(g, genome.FastaGenome))
+            self.check_genome(g)
+            self.assertTrue(os.path.exists(filename + '.fai'))
+            self.check_genome(genome.open_genome(filename))  # from .fai
+
+    def test_fasta_empty_sequence(self):
+        filename = os.path.join(self.tmpdir, 'empty.fa')
+        with open(filename, 'w') as fp:
+            fp.write('>a\nACGT\nAC\n>e\n>b\r\nAAA\r\nCC')
+        g = genome.open_genome(filename)
+        self.assertEqual(str(g['a']), 'ACGTAC')
+        self.assertEqual(str(g['e']), '')
+        self.assertEqual(str(g['b']), 'AAACC')
+        self.assertEqual(g['b'][2:4], 'AC')
+
+    def test_fasta_different_line_length(self):
+        filename = os.path.join(self.tmpdir, 'bad.fa')
+        with open(filename, 'w') as fp:
+            fp.write('>a\nACGT\nA\nAC\n')
+        self.assertRaises(ValueError, genome.open_genome, filename)
+
+    def test_twobit(self):
+        filename = os.path.join(self.tmpdir, 'genome.2bit')
+        write_twobit(filename, SEQS)
+        g = genome.open_genome(filename)
+        self.assertTrue(isinstance(g, genome.TwoBitGenome))
+        self.check_genome(g)
+
+    def test_memory(self):
+        self.check_genome(genome.MemoryGenome(SEQS))
+
+    def test_reverse_complement(self):
+        self.assertEqual(genome.reverse_complement('AACGTn'), 'nACGTT')
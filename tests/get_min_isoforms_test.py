@@ -0,0 +1,97 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+
+from unittest import TestCase
+import networkx as nx
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import get_min_isoforms
+
+
+def covered_edges(paths):
+    edges = set()
+    for path in paths:
+        edges.update(zip(path[:-1], path[1:]))
+    return edges
+
+
+def exon_edges(g):
+    return set(edge for edge in g.edges()
+                if 'Start' not in edge and 'End' not in edge)
+
+
+class TestGetMinPaths(TestCase):
+    def setUp(self):
+        '''Start is linked to c, which is also linked from a.'''
+
+        self.g = nx.DiGraph()
+        self.g.add_path(['Start', 'a', 'b', 'd', 'e', 'End'])
+        self.g.add_path(['a', 'c', 'd', 'f', 'End'])
+        self.g.add_path(['Start', 'c'])
+
+    def check_paths(self, g, paths):
+        self.assertEqual(covered_edges(paths), exon_edges(g))
+        for path in paths:
+            self.assertTrue(g.has_edge('Start', path[0]))
+            self.assertTrue(g.has_edge(path[-1], 'End'))
+
+    def test_diamond(self):
+        g = nx.DiGraph()
+        g.add_path(['Start', 'a', 'b', 'd', 'End'])
+        g.add_path(['a', 'c', 'd'])
+        paths = get_min_isoforms.get_min_paths(g, False)
+        self.assertEqual(len(paths), 2)
+        self.check_paths(g, paths)
+
+    def test_cover_exon_edges(self):
+        paths = get_min_isoforms.get_min_paths(self.g, False)
+        self.assertEqual(len(paths), 2)
+        self.check_paths(self.g, paths)
+
+    def test_end_from_internal_exon(self):
+        g = nx.DiGraph()
+        g.add_path(['Start', 'a', 'b', 'c', 'End'])
+        g.add_path(['b', 'End'])
+        g.add_path(['a', 'd', 'c'])
+        paths = get_min_isoforms.get_min_paths(g, False)
+        self.assertEqual(len(paths), 2)
+        self.check_paths(g, paths)
+
+    def test_not_more_than_maxflow(self):
+        g = nx.DiGraph()
+        g.add_path(['Start', 'a', 'b', 'd', 'e', 'End'])
+        g.add_path(['a', 'c', 'd', 'f', 'End'])
+        g.add_path(['Start', 'g', 'c'])
+        for graph in [self.g, g]:
+            paths = get_min_isoforms.get_min_paths(graph, False)
+            maxflow_paths = get_min_isoforms.get_min_paths_maxflow(
+                                                    graph.copy(), False)
+            self.check_paths(graph, maxflow_paths)
+            self.assertTrue(len(paths) <= len(maxflow_paths))
+
+    def test_ties_by_key(self):
+        '''Paths do not depend on node names if ties are broken by key.'''
+
+        g = nx.DiGraph()
+        g.add_path(['Start', 'a', 'b', 'c', 'd', 'End'])
+        g.add_path(['a', 'c', 'e', 'End'])
+        g.add_path(['b', 'e'])
+        positions = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5}
+        paths = get_min_isoforms.get_min_paths(g, False, key=positions.get)
+        self.assertEqual(len(paths), 3)
+        self.check_paths(g, paths)
+
+        names = {'Start': 'Start', 'End': 'End', 'a': 'a', 'b': 'b',
+                    'c': 'c', 'd': 'e', 'e': 'd'}
+        relabeled = nx.relabel_nodes(g, names)
+        relabeled_positions = dict((names[node], position)
+                                    for node, position in positions.items())
+        self.assertEqual(get_min_isoforms.get_min_paths(relabeled, False,
+                                            key=relabeled_positions.get),
+                            [[names[node] for node in path]
+                                for path in paths])
@@ -0,0 +1,97 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import shutil
+import tempfile
+import subprocess
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+import gimme_cli
+
+# prints modules imported by a subcommand after it runs
+LOADED_MODULES = '''
+import sys
+sys.path.insert(0, %r)
+import gimme_cli
+try:
+    gimme_cli.main(sys.argv[1:])
+finally:
+    sys.stderr.write(' '.join(sorted(name for name in sys.modules
+                                        if sys.modules[name])))
+'''
+
+
+class TestDispatcher(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_subcommand(self, *args):
+        process = subprocess.Popen([sys.executable, '-c',
+                                    LOADED_MODULES % source_path] +
+                                    list(args),
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+        output, modules = process.communicate()
+        return process.returncode, output, modules.split()
+
+    def test_modules(self):
+        for name, (module, description, has_help) in \
+                gimme_cli.SUBCOMMANDS.iteritems():
+            filename = os.path.join(source_path,
+                                    *module.split('.')) + '.py'
+            self.assertTrue(os.path.exists(filename), filename)
+
+    def test_usage(self):
+        returncode, output, modules = self.run_subcommand('help')
+        self.assertEqual(returncode, 0)
+        self.assertTrue('  assemble ' in output)
+        self.assertTrue('  psl2bed ' in output)
+        self.assertFalse('numpy' in modules)
+        self.assertFalse('networkx' in modules)
+
+    def test_unknown_subcommand(self):
+        returncode, output, modules = self.run_subcommand('assembly')
+        self.assertEqual(returncode, 2)
+
+    def test_run(self):
+        filename = os.path.join(self.tmpdir, 'models.bed')
+        with open(filename, 'w') as fp:
+            fp.write('chr1\t0\t10\tchr1:1.1\n')
+            fp.write('chr1\t20\t30\tchr1:1.2\n')
+            fp.write('chr1\t40\t50\tchr1:2.1\n')
+
+        returncode, output, modules = self.run_subcommand('count_genes',
+                                                            filename)
+        self.assertEqual(returncode, 0)
+        self.assertTrue('2' in output and '3' in output)
+        self.assertFalse('numpy' in modules)
+        self.assertFalse('networkx' in modules)
+
+    def test_assemble_help(self):
+        returncode, output, modules = self.run_subcommand('help',
+                                                            'assemble')
+        self.assertEqual(returncode, 0)
+        self.assertTrue(output.startswith('usage: gimme.py'))
+        self.assertTrue('networkx' in modules)
+
+    def test_help(self):
+        returncode, output, modules = self.run_subcommand('psl2bed', '-h')
+        self.assertEqual(returncode, 0)
+        self.assertTrue(output.startswith('usage: gimme psl2bed'))
+        self.assertTrue('PSL format to BED format' in output)
+        self.assertFalse('numpy' in modules)
+
+    def test_help_of_subcommands(self):
+        for name in gimme_cli.SUBCOMMANDS:
+            returncode, output, modules = self.run_subcommand('help', name)
+            self.assertEqual(returncode, 0, name)
+            self.assertTrue(output.startswith('usage:'), name)
@@ -2,16 +2,22 @@
 
 import sys
 import os
+import shutil
+import tempfile
 
 from unittest import TestCase
 import unittest
 import networkx as nx
+import numpy as np
+from cStringIO import StringIO
 
 source_path = os.path.abspath('src')
 if source_path not in sys.path:
     sys.path.append(os.path.abspath('src'))
 
 import gimme
+from utils import split_strand, watchdog, bedwriter, tabix
+from utils.genome import MemoryGenome
 
 
 class TestCollapseExons(TestCase):
@@ -23,19 +29,28 @@ class TestCollapseExons(TestCase):
 
         while n < 7:
             e = gimme.ExonObj('chr1', start, start + 100)
-            self.align_db.exon_db[str(e)] = e
+            self.align_db.add_exon(e)
             exons.append(str(e))
             start += 300
             n += 1
 
-        self.align_db.exon_db[exons[0]].terminal = 1  # mark a left terminal
-        self.align_db.exon_db[exons[-1]].terminal = 2  # mark a right terminal
+        self.align_db.exons[0].terminal = 1  # mark a left terminal
+        self.align_db.exons[-1].terminal = 2  # mark a right terminal
 
         self.exon_graph = nx.DiGraph()
         self.exon_graph.add_path(exons)
 
+    def collapse_exon(self):
+        '''Collapses exons of a graph of exon names.'''
+
+        names = dict((str(e), e.id) for e in self.align_db.exons)
+        g = nx.relabel_nodes(self.exon_graph, names)
+        gimme.collapse_exon(g, self.align_db)
+        self.exon_graph = nx.relabel_nodes(g,
+                            dict((e.id, str(e)) for e in self.align_db.exons))
+
     def test_building_base_exon_db_and_exon_graph(self):
-        self.assertEqual(len(self.align_db.exon_db), 6)
+        self.assertEqual(len(self.align_db.exons), 6)
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
         self.assertItemsEqual(self.exon_graph.nodes(), ['chr1:1000-1100',
@@ -65,12 +80,12 @@ class TestCollapseExons(TestCase):
 
         e = gimme.ExonObj('chr1', 1050, 1100)
         e.terminal = 1
-        self.align_db.exon_db[str(e)] = e
+        self.align_db.add_exon(e)
         self.exon_graph.add_edge(str(e), 'chr1:1300-1400')
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -88,12 +103,12 @@ class TestCollapseExons(TestCase):
 
         e = gimme.ExonObj('chr1', 2500, 2550)
         e.terminal = 2
-        self.align_db.exon_db[str(e)] = e
+        self.align_db.add_exon(e)
         self.exon_graph.add_edge('chr1:2200-2300', str(e))
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -111,17 +126,17 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 700, 800)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 900, 1100)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -147,17 +162,17 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 2550, 2600)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 2800, 2900)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -185,17 +200,17 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1900, 2000)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 2500, 2550)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         #print >> sys.stderr, self.exon_graph.edges()
 
@@ -229,17 +244,17 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1050, 1100)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1700)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -267,14 +282,14 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1050, 1100)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1700)
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 1900, 1950)
         e3.terminal = 2
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -282,7 +297,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -310,14 +325,14 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1190, 1400)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1700)
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 1900, 1950)
         e3.terminal = 2
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -325,7 +340,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -351,14 +366,14 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1250, 1400)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1700)
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 1900, 1950)
         e3.terminal = 2
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -366,7 +381,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -385,14 +400,14 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1050, 1100)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1300, 1400)
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 1600, 1850)
         e3.terminal = 2
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -400,7 +415,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 7)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -428,18 +443,18 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1150, 1400)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1850)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
@@ -465,18 +480,18 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1250, 1400)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1750)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -494,14 +509,14 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1050, 1100)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1300, 1400)
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 1600, 1750)
         e3.terminal = 2
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -509,7 +524,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -527,18 +542,18 @@ class TestCollapseExons(TestCase):
 
         e1 = gimme.ExonObj('chr1', 1350, 1400)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1600, 1650)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         self.exon_graph.add_edge(str(e1), str(e2))
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 6)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 6)
         self.assertEqual(len(self.exon_graph.edges()), 5)
@@ -557,18 +572,18 @@ class TestCollapseExons(TestCase):
         '''
         e1 = gimme.ExonObj('chr1', 990, 1010)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 1300, 1400)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 950, 1100)
         e3.terminal = 1
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         e4 = gimme.ExonObj('chr1', 1030, 1040)
-        self.align_db.exon_db[str(e4)] = e4
+        self.align_db.add_exon(e4)
 
         self.exon_graph.add_edge(str(e1), str(e4))
         self.exon_graph.add_edge(str(e3), str(e2))
@@ -577,7 +592,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 9)
         self.assertEqual(len(self.exon_graph.edges()), 8)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
@@ -594,15 +609,15 @@ class TestCollapseExons(TestCase):
         '''
         e1 = gimme.ExonObj('chr1', 2510, 2520)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 2530, 2600)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 2700, 2800)
         e3.terminal = 1
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -610,7 +625,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 9)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 9)
         self.assertEqual(len(self.exon_graph.edges()), 7)
@@ -627,15 +642,15 @@ class TestCollapseExons(TestCase):
         '''
         e1 = gimme.ExonObj('chr1', 2400, 2450)
         e1.terminal = 1
-        self.align_db.exon_db[str(e1)] = e1
+        self.align_db.add_exon(e1)
 
         e2 = gimme.ExonObj('chr1', 2500, 2600)
         e2.terminal = 2
-        self.align_db.exon_db[str(e2)] = e2
+        self.align_db.add_exon(e2)
 
         e3 = gimme.ExonObj('chr1', 2700, 2800)
         e3.terminal = 1
-        self.align_db.exon_db[str(e3)] = e3
+        self.align_db.add_exon(e3)
 
         self.exon_graph.add_edge(str(e1), str(e2))
         self.exon_graph.add_edge(str(e2), str(e3))
@@ -643,7 +658,7 @@ class TestCollapseExons(TestCase):
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
 
-        gimme.collapse_exon(self.exon_graph, self.align_db)
+        self.collapse_exon()
 
         self.assertEqual(len(self.exon_graph.nodes()), 8)
         self.assertEqual(len(self.exon_graph.edges()), 7)
@@ -666,10 +681,119 @@ class TestAddIntrons(TestCase):
         self.exons[-1].terminal = 2  # mark a right terminal
 
     def test_simple(self):
-        gimme.add_intron(self.exons, self.align_db, {}, 0)
+        gimme.add_intron(self.exons, self.align_db)
 
         self.assertEqual(len(self.align_db.intron_db), 5)
 
+    def test_shared_intron(self):
+        gimme.add_exon(self.align_db, self.exons)
+        gimme.add_intron(self.exons, self.align_db)
+
+        exons = [gimme.ExonObj('chr1', 1050, 1100),
+                    gimme.ExonObj('chr1', 1300, 1400)]
+        gimme.add_exon(self.align_db, exons)
+        gimme.add_intron(exons, self.align_db)
+
+        intron_db = self.align_db.intron_db
+        intron = intron_db.get('chr1', 1101, 1299)
+        self.assertEqual(len(intron_db), 5)
+        self.assertEqual(intron_db.get_name(intron), 'chr1:1101-1299')
+        self.assertEqual([(str(self.align_db.exons[donor]),
+                            str(self.align_db.exons[acceptor]))
+                            for donor, acceptor in intron_db.edges(intron)],
+                            [('chr1:1000-1100', 'chr1:1300-1400'),
+                                ('chr1:1050-1100', 'chr1:1300-1400')])
+        self.assertEqual(len(intron_db.clusters.groups()), 1)
+
+    def test_merge_clusters(self):
+        alignments = [[(1000, 1100), (1300, 1400)],
+                        [(1600, 1700), (1900, 2000)],
+                        [(2200, 2300), (2500, 2600)],
+                        [(1300, 1400), (1600, 1700), (1900, 2000)],
+                    ]
+        for alignment in alignments:
+            exons = [gimme.ExonObj('chr1', s, e) for s, e in alignment]
+            gimme.add_exon(self.align_db, exons)
+            gimme.add_intron(exons, self.align_db)
+
+        intron_db = self.align_db.intron_db
+        self.assertEqual(intron_db.clusters.groups(), [[0], [1, 3], [2]])
+        self.assertEqual(gimme.merge_cluster(self.align_db),
+                            [[0], [1, 3], [2]])
+
+
+class TestAlignmentDB(TestCase):
+    alignments = [[[(1000, 1100), (1300, 1400)],
+                    [(1600, 1700), (1900, 2000)],
+                    [(5000, 5800)]],
+                    [[(2200, 2300), (2500, 2600)],
+                    [(1300, 1400), (1600, 1700), (1900, 2000)],
+                    [(1000, 1100), (1300, 1400), (1600, 1700)],
+                    [(6000, 6900)]],
+                ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def build_db(self, alignments):
+        align_db = gimme.AlignmentDB()
+        for alignment in alignments:
+            exons = [gimme.ExonObj('chr1', s, e) for s, e in alignment]
+            gimme.add_alignment(align_db, exons)
+        return align_db
+
+    def get_state(self, align_db):
+        intron_db = align_db.intron_db
+        return ([(str(e), e.id, e.terminal, e.intron)
+                    for e in align_db.exons],
+                [(intron_db.get_name(i), intron_db.edges(i))
+                    for i in xrange(len(intron_db))],
+                intron_db.clusters.groups(),
+                [str(e) for e in align_db.single_exons_db['chr1']])
+
+    def test_snapshot(self):
+        align_db = self.build_db(self.alignments[0] + self.alignments[1])
+        filename = os.path.join(self.tmpdir, 'snapshot')
+        gimme.save_snapshot(align_db, filename, 'key')
+        self.assertEqual(gimme.load_snapshot(filename, 'other key'), None)
+
+        loaded_db = gimme.load_snapshot(filename, 'key')
+        self.assertEqual(self.get_state(loaded_db), self.get_state(align_db))
+        self.assertEqual(loaded_db.get_exon('chr1', 1600, 1700).id, 2)
+        self.assertEqual(loaded_db.intron_db.get('chr1', 1101, 1299), 0)
+        self.assertEqual(loaded_db.chain_counts, align_db.chain_counts)
+
+    def test_update(self):
+        align_db = self.build_db(self.alignments[0] + self.alignments[1])
+        other_db = self.build_db(self.alignments[0])
+        other_db.update(self.build_db(self.alignments[1]))
+        self.assertEqual(self.get_state(other_db), self.get_state(align_db))
+        self.assertEqual(other_db.chain_counts, align_db.chain_counts)
+
+    def test_chain_counts(self):
+        align_db = self.build_db(self.alignments[0] + self.alignments[1])
+        dup_db = self.build_db(self.alignments[0] + self.alignments[1] +
+                                self.alignments[1] + self.alignments[0][:1])
+        self.assertEqual(self.get_state(dup_db), self.get_state(align_db))
+        self.assertEqual(len(dup_db.chain_counts), 7)
+
+        def get_count(alignment):
+            return dup_db.get_chain_count([gimme.ExonObj('chr1', s, e)
+                                            for s, e in alignment])
+        self.assertEqual(get_count([(1000, 1100), (1300, 1400)]), 2)
+        self.assertEqual(get_count([(1600, 1700), (1900, 2000)]), 1)
+        self.assertEqual(get_count([(6000, 6900)]), 2)
+        self.assertEqual(get_count([(1000, 1100), (1600, 1700)]), 0)
+        self.assertEqual(get_count([(1000, 1101), (1300, 1400)]), 0)
+
+        merged_db = self.build_db(self.alignments[0] + self.alignments[1])
+        merged_db.update(self.build_db(self.alignments[1] +
+                                        self.alignments[0][:1]))
+        self.assertEqual(merged_db.chain_counts, dup_db.chain_counts)
+
 
 class TestMergeExons(TestCase):
     def setUp(self):
@@ -766,6 +890,60 @@ class TestMergeExons(TestCase):
         self.assertEqual(len(self.merged_exons['chr1']), 3)
 
 
+class TestRemoveRedundantExons(TestCase):
+    def setUp(self):
+        self.align_db = gimme.AlignmentDB()
+        self.align_db.single_exons_db = {'chr1': [
+                gimme.ExonObj('chr1', 1020, 1080),  # contained
+                gimme.ExonObj('chr1', 1250, 1350),  # short overhang
+                gimme.ExonObj('chr1', 1500, 1900),  # long overhang
+                gimme.ExonObj('chr1', 2150, 2400),  # spans an exon
+                gimme.ExonObj('chr1', 3000, 3100),  # no overlap
+                ]}
+        gimme.build_single_exon_intervals(self.align_db)
+
+    def test_remove(self):
+        exons = [gimme.ExonObj('chr1', 2200, 2300),
+                    gimme.ExonObj('chr1', 1000, 1100),
+                    gimme.ExonObj('chr1', 1300, 1400),
+                    gimme.ExonObj('chr1', 1600, 1700)]
+        gimme.remove_redundant_exons(exons,
+                            self.align_db.single_exons_intervals['chr1'])
+        self.assertEqual(
+                self.align_db.single_exons_intervals['chr1'].removed.tolist(),
+                            [True, True, False, False, False])
+
+    def test_remove_any_exon(self):
+        exons = [gimme.ExonObj('chr1', 1500, 1600),
+                    gimme.ExonObj('chr1', 1450, 1880),
+                    gimme.ExonObj('chr1', 2180, 2380)]
+        gimme.remove_redundant_exons(exons,
+                            self.align_db.single_exons_intervals['chr1'])
+        self.assertEqual(
+                self.align_db.single_exons_intervals['chr1'].removed.tolist(),
+                            [False, False, True, True, False])
+
+
+class TestSingleExonIndex(TestCase):
+    def setUp(self):
+        self.index = gimme.SingleExonIndex('chr1',
+                            np.array([3000, 1000, 1500, 5000, 1200, 2000]),
+                            np.array([4000, 2000, 1800, 6000, 2500, 2100]))
+
+    def test_merge(self):
+        self.assertEqual(self.index.starts.tolist(), [1000, 3000, 5000])
+        self.assertEqual(self.index.ends.tolist(), [2500, 4000, 6000])
+        self.assertEqual([str(exon) for exon in self.index],
+                            ['chr1:1000-2500', 'chr1:3000-4000',
+                                'chr1:5000-6000'])
+
+    def test_find(self):
+        queries, overlaps = self.index.find(np.array([0, 2400, 4000, 100]),
+                                            np.array([1000, 3100, 7000, 200]))
+        self.assertEqual(zip(queries.tolist(), overlaps.tolist()),
+                            [(1, 0), (1, 1), (2, 2)])
+
+
 class TestSplitExonGroups(TestCase):
     max_intron = 200
 
@@ -841,5 +1019,526 @@ class TestSplitExonGroups(TestCase):
                                         )
         self.assertEqual(len(split), 3)
 
+class TestPaths(TestCase):
+    def setUp(self):
+        self.g = nx.DiGraph()
+        self.g.add_path(['Start', 'A', 'B', 'C', 'D', 'End'])
+        self.g.add_path(['A', 'C'])
+        self.g.add_path(['B', 'D'])
+        self.g.add_path(['Start', 'E', 'C'])
+
+    def test_count_paths(self):
+        self.assertEqual(gimme.count_paths(self.g, 'Start', 'End'), 4)
+
+    def test_iter_paths(self):
+        self.assertEqual(list(gimme.iter_paths(self.g, 'Start', 'End')),
+                    list(nx.all_simple_paths(self.g, 'Start', 'End')))
+
+
+class TestLocusBudget(TestCase):
+    def setUp(self):
+        self.align_db = gimme.AlignmentDB()
+        ids = {'Start': 'Start', 'End': 'End'}
+        for i, name in enumerate('EABCD'):
+            exon = gimme.ExonObj('chr1', 1000 + i * 300, 1100 + i * 300)
+            self.align_db.add_exon(exon)
+            ids[name] = exon.id
+
+        self.g = nx.DiGraph()
+        for path in [['Start', 'A', 'B', 'C', 'D', 'End'], ['A', 'C'],
+                        ['B', 'D'], ['Start', 'E', 'C']]:
+            self.g.add_path([ids[node] for node in path])
+        self.budget = watchdog.Budget(time_limit=0.05, interval=0.01)
+        self.iter_paths = gimme.iter_paths
+        self.get_min_paths = gimme.get_min_isoforms.get_min_paths
+
+    def tearDown(self):
+        gimme.iter_paths = self.iter_paths
+        gimme.get_min_isoforms.get_min_paths = self.get_min_paths
+
+    def stall(self, *args, **kwargs):
+        while True:
+            pass
+
+    def get_transcripts(self, find_max, max_isoforms):
+        return gimme.get_transcripts_in_budget(self.g, self.align_db,
+                                                find_max,
+                                                max_isoforms, 1000,
+                                                self.budget)
+
+    def test_within_budget(self):
+        method, transcripts, reason = self.get_transcripts(True, 20)
+        self.assertEqual(method, 'all_paths')
+        self.assertEqual(len(transcripts), 4)
+        self.assertEqual(reason, None)
+
+    def test_min_isoforms(self):
+        gimme.iter_paths = self.stall
+        method, transcripts, reason = self.get_transcripts(True, 20)
+        self.assertEqual(method, 'min_isoforms')
+        self.assertEqual(reason, 'time')
+        exons = self.align_db.exons
+        self.assertEqual(transcripts, self.get_min_paths(self.g, False,
+                                key=lambda node: (exons[node].start,
+                                                    exons[node].end)))
+
+    def test_capped_paths(self):
+        gimme.get_min_isoforms.get_min_paths = self.stall
+        method, transcripts, reason = self.get_transcripts(False, 2)
+        self.assertEqual(method, 'capped_paths')
+        self.assertEqual(reason, 'time')
+        paths = list(self.iter_paths(self.g, 'Start', 'End'))
+        self.assertEqual(transcripts, [path[1:-1] for path in paths[:2]])
+
+    def test_skipped(self):
+        gimme.iter_paths = self.stall
+        gimme.get_min_isoforms.get_min_paths = self.stall
+        self.assertEqual(self.get_transcripts(True, 20), (None, [], 'time'))
+
+
+class TestAssembleChrom(TestCase):
+    def setUp(self):
+        gimme.worker_genome = MemoryGenome({'chr1': 'N' * 10000})
+        self.alignments = [[(1000, 1100), (1300, 1400), (1600, 1700)],
+                            [(1000, 1100), (1600, 1700)],
+                            [(5000, 6000)],
+                        ]
+
+    def test_gene_ids_start_from_one(self):
+        chrom, models, gene_id, transcripts_num, excluded, singles, \
+            junctions, over_budget = gimme.assemble_chrom(('chr1',
+                                                self.alignments, True, None))
+
+        rows = [row.split('\t') for row in models.splitlines()]
+        self.assertEqual(chrom, 'chr1')
+        self.assertEqual(gene_id, 2)
+        self.assertEqual(singles, 1)
+        self.assertEqual(transcripts_num, 2)
+        self.assertEqual([row[3] for row in rows], ['chr1:1.1', 'chr1:2.1'])
+        self.assertEqual(rows[0][-1], '0,300,600')
+        self.assertEqual(rows[1][1:3], ['5000', '6000'])
+        self.assertEqual(over_budget, [])
+
+    def test_junctions(self):
+        junctions = gimme.assemble_chrom(('chr1', self.alignments,
+                                            True, {}))[-2]
+        self.assertEqual(sorted(junctions),
+                            [1100 << 32 | 1300, 1400 << 32 | 1600])
+        self.assertEqual(junctions[1100 << 32 | 1300], ('NN', 'NN', 0))
+
+    def test_add_alignment(self):
+        align_db = gimme.AlignmentDB()
+        for alignment in self.alignments:
+            exons = [gimme.ExonObj('chr1', s, e) for s, e in alignment]
+            gimme.add_alignment(align_db, exons)
+
+        self.assertEqual(len(align_db.exons), 3)
+        self.assertEqual(len(align_db.intron_db), 3)
+        self.assertEqual(len(align_db.single_exons_db['chr1']), 1)
+
+
+class TestJunctionCache(TestCase):
+    def setUp(self):
+        self.genome = MemoryGenome({'chr1': 'A' * 100 + 'GT' + 'A' * 96 +
+                                    'AG' + 'A' * 100 + 'CT' + 'A' * 98})
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get(self):
+        junctions = split_strand.JunctionCache()
+        sites = junctions.get(self.genome, 'chr1', [100, 100], [200, 302])
+        self.assertEqual(sites, [('GT', 'AG', 1), ('GT', 'CT', 0)])
+        self.assertEqual(len(junctions), 2)
+
+        # cached junctions are not looked up in the genome
+        self.assertEqual(junctions.get(None, 'chr1', [100], [200]),
+                            [('GT', 'AG', 1)])
+
+    def test_save_and_load(self):
+        filename = os.path.join(self.tmpdir, 'junctions')
+        junctions = split_strand.load_junction_cache(filename, self.genome)
+        self.assertEqual(len(junctions), 0)
+        junctions.get(self.genome, 'chr1', [100], [200])
+        junctions.save(filename)
+
+        junctions = split_strand.load_junction_cache(filename, self.genome)
+        self.assertEqual(junctions.get(None, 'chr1', [100], [200]),
+                            [('GT', 'AG', 1)])
+
+        other_genome = MemoryGenome({'chr1': 'A' * 10})
+        junctions = split_strand.load_junction_cache(filename, other_genome)
+        self.assertEqual(len(junctions), 0)
+
+
+class TestAssemblyState(TestCase):
+    first = [[(1000, 1200), (1400, 1600)],
+                [(1400, 1600), (1800, 2000)],
+                [(5000, 5200), (5400, 5600), (5800, 6000)],
+                [(5000, 5200), (5800, 6000)],
+                [(8000, 9000)],
+            ]
+    second = [[(5000, 5200), (5400, 5600)],
+                [(5500, 5550)],
+                [(7000, 7400)],
+            ]
+
+    def setUp(self):
+        self.genome = MemoryGenome({'chr1': 'N' * 10000})
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def add_alignments(self, align_db, alignments):
+        for alignment in alignments:
+            exons = [gimme.ExonObj('chr1', s, e) for s, e in alignment]
+            gimme.add_alignment(align_db, exons)
+
+    def assemble(self, alignments, params=None):
+        align_db = gimme.AlignmentDB()
+        self.add_alignments(align_db, alignments)
+        output = StringIO()
+        return_items = gimme.assemble(self.genome, align_db, True,
+                                        output=output, verbose=False,
+                                        params=params)
+        return return_items, output.getvalue()
+
+    def assemble_incremental(self, align_db, loci, params=None):
+        output = StringIO()
+        return_items, loci = gimme.assemble_incremental(self.genome,
+                                    align_db, True, loci,
+                                    align_db.changed_spans, output,
+                                    verbose=False, params=params)
+        return return_items, output.getvalue(), loci
+
+    def test_incremental(self):
+        filename = os.path.join(self.tmpdir, 'state')
+        align_db = gimme.AlignmentDB()
+        align_db.changed_spans = []
+        self.add_alignments(align_db, self.first)
+        arrays, meta = gimme.get_snapshot_arrays(align_db)
+        return_items, output, loci = self.assemble_incremental(align_db, {})
+        self.assertEqual((return_items, output), self.assemble(self.first))
+        self.assertEqual(len(loci), 3)
+        gimme.save_state(filename, arrays, meta, loci)
+
+        align_db, loaded, meta = gimme.load_state(filename)
+        self.assertEqual(sorted(loaded), sorted(loci))
+        for key in loci:
+            self.assertEqual(loaded[key].span, loci[key].span)
+            self.assertEqual(loaded[key].models, loci[key].models)
+            self.assertEqual(loaded[key].exon_starts.tolist(),
+                                loci[key].exon_starts.tolist())
+
+        align_db.changed_spans = []
+        self.add_alignments(align_db, self.second)
+        self.assertEqual(align_db.changed_spans, [('chr1', 5000, 5600)])
+        return_items, output, loci = self.assemble_incremental(align_db,
+                                                                loaded)
+        self.assertEqual((return_items, output),
+                            self.assemble(self.first + self.second))
+        # loci sharing the exon at 1400-1600 are not rebuilt
+        unchanged = [key for key in loci if loci[key] is loaded[key]]
+        self.assertEqual(len(unchanged), 2)
+        self.assertEqual(sorted(loci[key].span for key in unchanged),
+                            [('chr1', 1000, 1600), ('chr1', 1400, 2000)])
+
+    def test_incremental_parameters(self):
+        params = gimme.Parameters(min_single_exon_len=2000)
+        align_db = gimme.AlignmentDB()
+        align_db.changed_spans = []
+        self.add_alignments(align_db, self.first)
+        return_items, output, loci = self.assemble_incremental(align_db, {},
+                                                                params)
+        self.assertEqual((return_items, output),
+                            self.assemble(self.first, params))
+        self.assertNotEqual(output, self.assemble(self.first)[1])
+
+    def test_overlapping_loci(self):
+        align_db = gimme.AlignmentDB()
+        self.add_alignments(align_db, self.first)
+        genes = gimme.merge_cluster(align_db)
+        loci = dict((introns[0], gimme.AssembledLocus(
+                        gimme.get_cluster_span(align_db, introns),
+                        0, 0, 0, '', None, None)) for introns in genes)
+        spans = [loci[introns[0]].span for introns in genes]
+
+        self.assertEqual(gimme.find_changed_loci(align_db, genes, loci, []),
+                            [False, False, False])
+        changed = gimme.find_changed_loci(align_db, genes, loci,
+                                            [('chr1', 1800, 2000)])
+        self.assertEqual([span for span, is_changed in zip(spans, changed)
+                            if is_changed],
+                            [('chr1', 1000, 1600), ('chr1', 1400, 2000)])
+        changed = gimme.find_changed_loci(align_db, genes, {}, [])
+        self.assertEqual(changed, [True, True, True])
+
+    def test_state_key(self):
+        filename = os.path.join(self.tmpdir, 'state')
+        self.assertEqual(gimme.load_state(filename), None)
+        arrays, meta = gimme.get_snapshot_arrays(gimme.AlignmentDB())
+        gimme.save_state(filename, arrays, meta, {})
+        self.assertEqual(gimme.load_state(filename)[1:], ({}, meta))
+
+        gap_size = gimme.gap_size
+        gimme.gap_size = gap_size + 1
+        try:
+            self.assertRaises(SystemExit, gimme.load_state, filename)
+        finally:
+            gimme.gap_size = gap_size
+
+        params = gimme.Parameters(max_intron=1000)
+        self.assertRaises(SystemExit, gimme.load_state, filename, params)
+        gimme.save_state(filename, arrays, meta, {}, params)
+        self.assertEqual(gimme.load_state(filename, params)[1:], ({}, meta))
+        self.assertNotEqual(gimme.get_assembly_settings(True, params),
+                            gimme.get_assembly_settings(True,
+                                    params.replace(locus_time_limit=5)))
+
+
+class TestAssembler(TestCase):
+    alignments = [[('chr1', 1000, 1200), ('chr1', 1400, 1600),
+                    ('chr1', 1800, 2000)],
+                    [('chr1', 1000, 1200), ('chr1', 1800, 2000)],
+                    [('chr2', 5000, 6000)],
+                    [('chr1', 1350, 1600), ('chr1', 1800, 2000)],
+                ]
+
+    def setUp(self):
+        self.genome = MemoryGenome({'chr1': 'N' * 10000,
+                                    'chr2': 'N' * 10000})
+
+    def get_alignments(self):
+        return [[gimme.ExonObj(*exon) for exon in alignment]
+                    for alignment in self.alignments]
+
+    def test_parameters(self):
+        params = gimme.Parameters(min_utr=50)
+        self.assertEqual(params.gap_size, gimme.gap_size)
+        self.assertEqual(params.replace(max_isoforms=5).max_isoforms, 5)
+        self.assertEqual(params.replace(max_isoforms=5).min_utr, 50)
+        self.assertEqual(params, gimme.Parameters(min_utr=50))
+        self.assertNotEqual(params, gimme.Parameters())
+        self.assertRaises(TypeError, params.replace, min_utrs=5)
+        self.assertEqual(params.get_budget(), None)
+        budget = params.replace(locus_time_limit=5).get_budget()
+        self.assertEqual(budget.time_limit, 5)
+
+    def test_assemble(self):
+        assembler = gimme.Assembler(self.genome)
+        transcripts = list(assembler.assemble(self.get_alignments()))
+        self.assertEqual([t.name for t in transcripts],
+                            ['chr1:1.1', 'chr2:1.1'])
+        self.assertEqual(transcripts[0].exons,
+                            [(1000, 1200), (1400, 1600), (1800, 2000)])
+        self.assertEqual(transcripts[1].exons, [(5000, 6000)])
+
+        output = StringIO()
+        totals = assembler.write(self.get_alignments(), output)
+        self.assertEqual(totals, (2, 2, 0, 1))
+        self.assertEqual(output.getvalue(),
+                            ''.join(t.to_bed() for t in transcripts))
+        self.assertEqual(sorted(assembler.junctions.junctions),
+                            ['chr1', 'chr2'])
+
+    def test_parameters_of_each_run(self):
+        min_utr = gimme.min_utr
+        assembler = gimme.Assembler(self.genome)
+        transcripts = list(assembler.assemble(self.get_alignments(),
+                                gimme.Parameters(min_utr=10)))
+        self.assertEqual([t.exons[0] for t in transcripts],
+                            [(1000, 1200), (1350, 1600), (5000, 6000)])
+        self.assertEqual(gimme.min_utr, min_utr)
+
+        # the default min_utr collapses the exon at 1350-1600
+        transcripts = list(assembler.assemble(self.get_alignments()))
+        self.assertEqual([t.exons[0] for t in transcripts],
+                            [(1000, 1200), (5000, 6000)])
+
+    def test_reuse_alignments(self):
+        assembler = gimme.Assembler(self.genome)
+        alignments = self.get_alignments()
+        exons = [[(exon.chrom, exon.start, exon.end) for exon in alignment]
+                    for alignment in alignments]
+        first = [t.exons for t in assembler.assemble(alignments)]
+        self.assertEqual([[(exon.chrom, exon.start, exon.end)
+                            for exon in alignment]
+                            for alignment in alignments], exons)
+        self.assertEqual([t.exons for t in assembler.assemble(alignments)],
+                            first)
+
+    def test_processes(self):
+        self.assertRaises(ValueError, gimme.Assembler, self.genome,
+                            processes=2)
+
+
+class TestRegions(TestCase):
+    alignments = [('chr1', [(1000, 1200), (1400, 1600)]),
+                    ('chr1', [(1500, 1600), (1800, 2000)]),
+                    ('chr1', [(2000, 2100)]),
+                    ('chr1', [(5000, 5200), (5400, 5600)]),
+                    ('chr2', [(1000, 1200), (1400, 1600)]),
+                ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        lines = []
+        for i, (chrom, exons) in enumerate(self.alignments):
+            start, end = exons[0][0], exons[-1][1]
+            lines.append('%s\t%d\t%d\tread%d\t0\t+\t%d\t%d\t0\t%d\t%s\t%s\n'
+                            % (chrom, start, end, i, start, end, len(exons),
+                                ','.join(str(e - s) for s, e in exons),
+                                ','.join(str(s - start) for s, e in exons)))
+        self.filename = os.path.join(self.tmpdir, 'alignments.bed.gz')
+        with open(self.filename, 'wb') as fp:
+            compressor = bedwriter.BGZFCompressor(fp)
+            compressor.write(''.join(lines))
+            compressor.finish()
+        tabix.build_index(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_regions(self):
+        self.assertEqual(gimme.parse_regions(['chr1:1,001-2,000',
+                                                'chr2', 'chr1:1500-3000']),
+                            [('chr1', 1000, 3000),
+                                ('chr2', 0, tabix.MAX_POSITION)])
+
+        filename = os.path.join(self.tmpdir, 'regions.bed')
+        with open(filename, 'w') as fp:
+            fp.write('track name=regions\nchr1\t100\t200\nchr1\t200\t300\n')
+        self.assertEqual(gimme.parse_regions([filename]),
+                            [('chr1', 100, 300)])
+
+        for spec in ['chr1:100', 'chr1:200-100', 'chr1:0-100']:
+            self.assertRaises(ValueError, gimme.parse_regions, [spec])
+
+    def test_expand_regions(self):
+        with tabix.TabixFile(self.filename) as fp:
+            # alignments overlapping the region and adjacent to them
+            self.assertEqual(gimme.expand_regions([fp],
+                                                    [('chr1', 1900, 1950)]),
+                                [('chr1', 1000, 2100)])
+            self.assertEqual(gimme.expand_regions([fp],
+                                                    [('chr1', 3000, 4000)]),
+                                [('chr1', 3000, 4000)])
+
+    def test_read_region_alignments(self):
+        alignments = [[(exon.chrom, exon.start, exon.end) for exon in exons]
+                        for exons in gimme.read_region_alignments(
+                                [self.filename], [('chr1', 1900, 1950),
+                                                    ('chr2', 0, 100)])]
+        self.assertEqual(alignments,
+                            [[('chr1', start, end) for start, end in exons]
+                                for chrom, exons in self.alignments[:3]])
+
+    def test_assembler(self):
+        genome = MemoryGenome({'chr1': 'N' * 10000, 'chr2': 'N' * 10000})
+        assembler = gimme.Assembler(genome)
+        transcripts = list(assembler.assemble(assembler.read(
+                                            [self.filename],
+                                            [('chr1', 5100, 5101)])))
+        self.assertEqual([t.exons for t in transcripts],
+                            [[(5000, 5200), (5400, 5600)]])
+
+
+class TestSweep(TestCase):
+    def test_parse_sweep(self):
+        names, settings = gimme.parse_sweep(['min_utr=50,100',
+                                                'max_isoforms=5'])
+        self.assertEqual(names, ['min_utr', 'max_isoforms'])
+        self.assertEqual([(s['min_utr'], s['max_isoforms'])
+                            for s in settings], [(50, 5), (100, 5)])
+        self.assertEqual(settings[0]['min_transcript_len'],
+                            gimme.min_transcript_len)
+        self.assertEqual(gimme.get_sweep_label(names, settings[1]),
+                            'min_utr_100.max_isoforms_5')
+
+    def test_invalid_sweep(self):
+        self.assertRaises(ValueError, gimme.parse_sweep, ['gap_size=10'])
+        self.assertRaises(ValueError, gimme.parse_sweep, ['min_utr=a'])
+        self.assertRaises(ValueError, gimme.parse_sweep, ['min_utr=0,10'])
+        self.assertRaises(ValueError, gimme.parse_sweep,
+                            ['min_utr=10', 'min_utr=20'])
+
+
+class TestReadLoci(TestCase):
+    def make_alignments(self, alignments):
+        return [[gimme.ExonObj(chrom, s, e) for s, e in exons]
+                    for chrom, exons in alignments]
+
+    def test_split_loci(self):
+        alignments = self.make_alignments([
+                        ('chr1', [(1000, 1100), (1300, 1400)]),
+                        ('chr1', [(1350, 1400), (1600, 1700)]),
+                        ('chr1', [(1800, 1900), (2000, 2100)]),
+                        ('chr2', [(1000, 1100), (1300, 1400)]),
+                    ])
+        loci = list(gimme.read_loci(alignments))
+
+        self.assertEqual(len(loci), 3)
+        self.assertEqual([len(locus) for locus in loci], [2, 1, 1])
+        self.assertEqual(loci[2][0][0].chrom, 'chr2')
+
+        # alignments are split at introns larger than max_intron
+        loci = list(gimme.read_loci(alignments,
+                                    gimme.Parameters(max_intron=150)))
+        self.assertEqual([len(locus) for locus in loci], [1, 2, 1, 1, 1, 1])
+        self.assertEqual(len(loci[3][0]), 2)
+
+    def test_unsorted_input(self):
+        alignments = self.make_alignments([
+                        ('chr1', [(1800, 1900), (2000, 2100)]),
+                        ('chr1', [(1000, 1100), (1300, 1400)]),
+                    ])
+
+        self.assertRaises(SystemExit, list, gimme.read_loci(alignments))
+
+
+class TestMergeSortedAlignments(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_bed(self, name, alignments):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'w') as fp:
+            for chrom, start, end in alignments:
+                fp.write('%s\t%d\t%d\tread\t0\t+\t%d\t%d\t0\t1\t%d\t0\n'
+                            % (chrom, start, end, start, end, end - start))
+        return filename
+
+    def merge(self, *input_files):
+        return [(exons[0].chrom, exons[0].start) for exons in
+                    gimme.merge_sorted_alignments(list(input_files))]
+
+    def test_chromosome_order_of_files(self):
+        first = self.write_bed('first.bed', [('chr2', 100, 200),
+                                                ('chr10', 100, 200),
+                                                ('chr10', 500, 600)])
+        second = self.write_bed('second.bed', [('chr10', 300, 400),
+                                                ('chr3', 100, 200)])
+        self.assertEqual(self.merge(first, second),
+                            [('chr2', 100), ('chr10', 100), ('chr10', 300),
+                                ('chr10', 500), ('chr3', 100)])
+
+    def test_different_orders(self):
+        first = self.write_bed('first.bed', [('chr2', 100, 200),
+                                                ('chr10', 100, 200)])
+        second = self.write_bed('second.bed', [('chr10', 300, 400),
+                                                ('chr2', 300, 400)])
+        try:
+            self.merge(first, second)
+        except SystemExit as e:
+            self.assertEqual(e.code, 1)
+        else:
+            self.fail('SystemExit not raised')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import inputs
+
+TEXT = ''.join('chr%d\t%d\t%d\n' % (i % 3, i * 10, i * 10 + 5)
+                for i in range(2000)) + 'last line without newline'
+
+
+class TestInputs(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.block_size = inputs.BLOCK_SIZE
+        inputs.BLOCK_SIZE = 100  # split lines between blocks
+
+    def tearDown(self):
+        inputs.BLOCK_SIZE = self.block_size
+        shutil.rmtree(self.tmpdir)
+
+    def write_gzip(self, name, members):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'wb') as fp:
+            for member in members:
+                compressed = StringIO()
+                with gzip.GzipFile(fileobj=compressed, mode='wb') as gz:
+                    gz.write(member)
+                fp.write(compressed.getvalue())
+        return filename
+
+    def test_plain(self):
+        filename = os.path.join(self.tmpdir, 'plain.txt')
+        with open(filename, 'w') as fp:
+            fp.write(TEXT)
+        fp = inputs.open_input(filename)
+        self.assertTrue(isinstance(fp, file))
+        self.assertEqual(inputs.peek_line(fp), 'chr0\t0\t5\n')
+        self.assertEqual(fp.read(), TEXT)
+
+    def test_gzip(self):
+        filename = self.write_gzip('text.gz', [TEXT])
+        with inputs.open_input(filename) as fp:
+            self.assertEqual(inputs.peek_line(fp), 'chr0\t0\t5\n')
+            self.assertEqual(list(fp), TEXT.splitlines(True))
+
+    def test_members(self):
+        filename = self.write_gzip('text.bgz',
+                                    [TEXT[i:i + 777]
+                                        for i in range(0, len(TEXT), 777)])
+        with inputs.open_input(filename) as fp:
+            self.assertEqual(fp.readline(), 'chr0\t0\t5\n')
+            self.assertEqual(fp.read(10), 'chr1\t10\t15')
+            self.assertEqual(fp.read(), TEXT[19:])
+            self.assertEqual(fp.read(), '')
+
+    def test_stdin(self):
+        stdin = sys.stdin
+        try:
+            sys.stdin = StringIO(TEXT)
+            fp = inputs.open_input('-')
+            self.assertEqual(inputs.peek_line(fp), 'chr0\t0\t5\n')
+            self.assertEqual(''.join(fp), TEXT)
+
+            sys.stdin = open(self.write_gzip('stdin.gz', [TEXT]), 'rb')
+            fp = inputs.open_input('-')
+            self.assertEqual(fp.read(), TEXT)
+        finally:
+            sys.stdin = stdin
+
+    def test_close_early(self):
+        filename = self.write_gzip('text.gz', [TEXT * 20])
+        fp = inputs.open_input(filename)
+        fp.readline()
+        fp.close()
+        self.assertFalse(fp.thread.is_alive())
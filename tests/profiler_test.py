@@ -0,0 +1,86 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import types
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import profiler
+
+
+def count_up(n):
+    for i in range(n):
+        yield i
+
+
+def add(a, b):
+    return a + b
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_function(self):
+        prof = profiler.Profiler()
+        timed_add = prof.wrap('add', add)
+        self.assertEqual(timed_add.__name__, 'add')
+        for i in range(5):
+            self.assertEqual(timed_add(i, 1), i + 1)
+        stage = prof.stages['add']
+        self.assertEqual(stage.calls, 5)
+        self.assertEqual(stage.items, 0)
+        self.assertTrue(stage.wall >= 0)
+        self.assertTrue(stage.max_rss > 0)
+
+    def test_generator(self):
+        prof = profiler.Profiler()
+        timed_count_up = prof.wrap('count', count_up)
+        self.assertEqual(list(timed_count_up(3)), [0, 1, 2])
+        self.assertEqual(list(timed_count_up(4)), [0, 1, 2, 3])
+        self.assertEqual(prof.stages['count'].calls, 2)
+        self.assertEqual(prof.stages['count'].items, 7)
+
+    def test_shared_stage(self):
+        prof = profiler.Profiler()
+        first = prof.wrap('parse', count_up)
+        second = prof.wrap('parse', count_up)
+        list(first(2))
+        list(second(3))
+        self.assertEqual(prof.stages.keys(), ['parse'])
+        self.assertEqual(prof.stages['parse'].items, 5)
+
+    def test_patch_restore(self):
+        module = types.ModuleType('module')
+        module.add = add
+        prof = profiler.Profiler()
+        prof.patch(module, 'add', 'sum')
+        self.assertNotEqual(module.add, add)
+        self.assertEqual(module.add(1, 2), 3)
+        self.assertEqual(prof.stages['sum'].calls, 1)
+        prof.restore()
+        self.assertEqual(module.add, add)
+
+    def test_write(self):
+        prof = profiler.Profiler()
+        list(prof.wrap('count', count_up)(10))
+        filename = os.path.join(self.tmpdir, 'report.json')
+        prof.write(filename, {'version': '1'}, alignments=10)
+
+        report = json.load(open(filename))
+        self.assertEqual(report['version'], '1')
+        self.assertEqual(report['stages']['count']['items'], 10)
+        self.assertEqual(report['throughput']['alignments'], 10)
+        self.assertTrue('alignments_per_second' in report['throughput'])
+        self.assertTrue(report['total']['max_rss_bytes'] > 0)
@@ -0,0 +1,106 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+
+from unittest import TestCase
+from cStringIO import StringIO
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import pslparser
+
+LINES = [
+    '567\t6\t0\t0\t0\t0\t4\t915\t+\tread1\t573\t0\t573\tchr1\t2031799\t'
+    '1969045\t1970533\t3\t260,89,224,\t0,260,349,\t'
+    '1969045,1969612,1970309,\n',
+    '361\t0\t0\t0\t1\t1\t2\t1031\t-\tread2\t362\t0\t362\tchr2\t2031799\t'
+    '1556673\t1558065\t2\t136,226,\t0,136,\t1556673,1557839,\n',
+    '100\t0\t0\t0\t0\t0\t0\t0\t+\tread3\t100\t0\t100\tchr1\t2031799\t'
+    '5000\t5100\t1\t100,\t0,\t5000,\n',
+]
+
+
+class TestRead(TestCase):
+    def check_records(self, records):
+        self.assertEqual(len(records), 3)
+        self.assertEqual([r.tName for r in records], ['chr1', 'chr2', 'chr1'])
+        self.assertEqual([r.qName for r in records],
+                            ['read1', 'read2', 'read3'])
+        self.assertEqual(records[0].tStarts, [1969045, 1969612, 1970309])
+        self.assertEqual(records[0].blockSizes, [260, 89, 224])
+        self.assertEqual(records[1].qStarts, [0, 136])
+        self.assertEqual(records[1].strand, '-')
+        self.assertEqual(records[1].tStart, 1556673)
+        self.assertEqual(records[1].tEnd, 1558065)
+        self.assertEqual(records[1].blockCount, 2)
+        self.assertEqual(records[1].qSize, 362)
+        self.assertEqual(records[1].matches, '361')
+
+    def test_read(self):
+        self.check_records(list(pslparser.read(StringIO(''.join(LINES)))))
+
+    def test_small_chunks(self):
+        records = [record for chunk in pslparser.read_chunks(
+                                StringIO(''.join(LINES)), chunk_size=10)
+                            for record in chunk]
+        self.check_records(records)
+
+    def test_columns(self):
+        chunks = list(pslparser.read_chunks(StringIO(''.join(LINES))))
+        self.assertEqual(len(chunks), 1)
+        chunk = chunks[0]
+        self.assertEqual(chunk.chrom_names, ['chr1', 'chr2'])
+        self.assertEqual(chunk.chrom_codes.tolist(), [0, 1, 0])
+        self.assertEqual(chunk.offsets.tolist(), [0, 3, 5, 6])
+        self.assertEqual(chunk.t_starts.tolist(), [1969045, 1556673, 5000])
+        self.assertEqual(chunk.block_sizes.tolist(),
+                            [260, 89, 224, 136, 226, 100])
+
+    def test_skip_invalid_lines(self):
+        no_block = LINES[2].replace('\t1\t100,\t0,\t5000,',
+                                    '\t0\t100,\t0,\t5000,')
+        lines = ['#comment\n', LINES[0], '\n', 'short line\n',
+                    no_block, LINES[1], LINES[2].replace('\t', ' ')]
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            records = list(pslparser.read(StringIO(''.join(lines)), '#'))
+        finally:
+            sys.stderr = stderr
+        self.assertEqual([r.qName for r in records],
+                            ['read1', 'read2', 'read3'])
+
+    def test_skip_shifted_lines(self):
+        short_line = LINES[0].replace('567\t', '', 1)
+        long_line = LINES[1].replace('361\t', '361\t0\t', 1)
+        lines = [short_line, long_line, LINES[2]]
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            records = list(pslparser.read(StringIO(''.join(lines))))
+            skipped = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual([r.qName for r in records], ['read3'])
+        self.assertTrue('read1' in skipped and 'read2' in skipped)
+
+    def test_without_trailing_comma(self):
+        lines = [LINES[0].replace('224,\t', '224\t'), LINES[1]]
+        records = list(pslparser.read(StringIO(''.join(lines))))
+        self.assertEqual(records[0].blockSizes, [260, 89, 224])
+        self.assertEqual(records[1].blockSizes, [136, 226])
+
+    def test_invalid_position(self):
+        lines = [LINES[0], LINES[1].replace('\t1556673\t', '\t1556673x\t'),
+                    LINES[2]]
+        self.assertRaises(ValueError, list,
+                            pslparser.read(StringIO(''.join(lines))))
+
+    def test_parse_column(self):
+        self.assertEqual(pslparser.parse_column(['10', '20']).tolist(),
+                            [10, 20])
+        self.assertRaises(ValueError, pslparser.parse_column,
+                            ['10', 'x', '30'])
@@ -0,0 +1,62 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+import numpy as np
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import snapshot
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.snapshot')
+        self.arrays = {
+                'starts': np.array([5, 1, 3], dtype=np.int64),
+                'flags': np.array([1, 0, 1], dtype=np.int8),
+                'chroms': np.array([0, 0, 1], dtype=np.int32),
+                'empty': np.zeros(0, dtype=np.int64),
+                }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_and_load(self):
+        snapshot.save(self.filename, 'key', self.arrays, {'chroms': ['a']})
+        saved = snapshot.load(self.filename, 'key')
+        self.assertEqual(saved.meta, {'chroms': ['a']})
+        self.assertEqual(sorted(saved.arrays), sorted(self.arrays))
+        for name, values in self.arrays.items():
+            self.assertEqual(saved[name].dtype, values.dtype)
+            self.assertEqual(saved[name].tolist(), values.tolist())
+        saved.close()
+
+    def test_key(self):
+        snapshot.save(self.filename, 'key', self.arrays)
+        self.assertEqual(snapshot.load(self.filename, 'other key'), None)
+        self.assertEqual(snapshot.load(os.path.join(self.tmpdir, 'none')),
+                            None)
+
+    def test_not_snapshot(self):
+        with open(self.filename, 'w') as fp:
+            fp.write('chr1\t100\t200\n')
+        self.assertEqual(snapshot.load(self.filename), None)
+
+    def test_file_digest(self):
+        filename = os.path.join(self.tmpdir, 'input')
+        with open(filename, 'w') as fp:
+            fp.write('alignments')
+        key = snapshot.file_digest([filename], 50, 300000)
+        self.assertEqual(key, snapshot.file_digest([filename], 50, 300000))
+        self.assertNotEqual(key, snapshot.file_digest([filename], 0, 300000))
+        with open(filename, 'a') as fp:
+            fp.write('more alignments')
+        self.assertNotEqual(key, snapshot.file_digest([filename], 50, 300000))
@@ -0,0 +1,139 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import gzip
+import shutil
+import random
+import tempfile
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import bedwriter, tabix
+
+
+def make_bed_lines(n, seed=0):
+    '''Returns sorted BED lines of three chromosomes.'''
+
+    random.seed(seed)
+    lines = []
+    for chrom in ['chr2', 'chr10', 'chr1']:
+        start = 0
+        for i in range(n):
+            start += random.randint(0, 300)
+            length = random.randint(1, 40000 if i % 20 == 0 else 2000)
+            lines.append('%s\t%d\t%d\tr%d\t0\t+\n' % (chrom, start,
+                                                    start + length, i))
+    return lines
+
+
+def make_psl_line(chrom, start, end):
+    cols = [end - start, 0, 0, 0, 0, 0, 0, 0, '+', 'read', end - start, 0,
+            end - start, chrom, 100000, start, end, 1, '%d,' % (end - start),
+            '0,', '%d,' % start]
+    return '\t'.join(str(col) for col in cols) + '\n'
+
+
+def overlaps(line, columns, chrom, start, end):
+    cols = line.split()
+    return cols[columns[0] - 1] == chrom and \
+            int(cols[columns[1] - 1]) < end and \
+            int(cols[columns[2] - 1]) > start
+
+
+class TestTabix(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_bgzf(self, name, lines):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'wb') as fp:
+            compressor = bedwriter.BGZFCompressor(fp)
+            compressor.write(''.join(lines))
+            compressor.finish()
+        return filename
+
+    def test_reg2bins(self):
+        self.assertEqual(tabix.reg2bins(0, 1), [0, 1, 9, 73, 585, 4681])
+        bins = tabix.reg2bins(100000, 300000)
+        for start, end in [(100000, 100001), (150000, 160000),
+                            (299000, 300000), (0, 1 << 20)]:
+            self.assertTrue(bedwriter.reg2bin(start, end) in bins)
+
+    def test_fetch(self):
+        lines = make_bed_lines(5000)
+        filename = self.write_bgzf('lines.bed.gz', lines)
+        tabix.build_index(filename)
+
+        with tabix.TabixFile(filename) as fp:
+            self.assertEqual(fp.index.names, ['chr2', 'chr10', 'chr1'])
+            self.assertEqual(fp.index.columns, (1, 2, 3))
+            random.seed(1)
+            for i in range(100):
+                chrom = random.choice(['chr1', 'chr2', 'chr10', 'chrX'])
+                start = random.randint(0, 800000)
+                end = start + random.randint(1, 50000)
+                self.assertEqual([line for line_start, line_end, line
+                                    in fp.fetch(chrom, start, end)],
+                                    [line for line in lines if
+                                        overlaps(line, (1, 2, 3),
+                                                    chrom, start, end)])
+            self.assertEqual(len(list(fp.fetch('chr10'))), 5000)
+
+    def test_psl(self):
+        lines = [make_psl_line('chr1', 100, 500),
+                    make_psl_line('chr1', 300, 900),
+                    make_psl_line('chr1', 2000, 2500),
+                    make_psl_line('chr2', 50, 80)]
+        filename = self.write_bgzf('lines.psl.gz', lines)
+        tabix.build_index(filename)
+
+        with tabix.TabixFile(filename) as fp:
+            self.assertEqual(fp.index.columns, (14, 16, 17))
+            self.assertEqual(list(fp.fetch('chr1', 400, 1000)),
+                                [(100, 500, lines[0]),
+                                    (300, 900, lines[1])])
+            self.assertEqual(list(fp.fetch('chr1', 900, 2000)), [])
+            self.assertEqual(list(fp.fetch('chr2', 0, 100)),
+                                [(50, 80, lines[3])])
+
+    def test_bedwriter_index(self):
+        filename = os.path.join(self.tmpdir, 'models.bed.gz')
+        output = bedwriter.open_output(filename, index=True)
+        lines = make_bed_lines(100)
+        for line in lines:
+            output.write(line)
+        output.close()
+
+        with tabix.TabixFile(filename) as fp:
+            self.assertEqual([line for start, end, line in
+                                fp.fetch('chr1', 1000, 5000)],
+                                [line for line in lines if
+                                    overlaps(line, (1, 2, 3),
+                                                'chr1', 1000, 5000)])
+
+    def test_unsorted(self):
+        lines = [make_psl_line('chr1', 300, 900),
+                    make_psl_line('chr1', 100, 500)]
+        filename = self.write_bgzf('unsorted.psl.gz', lines)
+        self.assertRaises(ValueError, tabix.build_index, filename)
+
+        lines = [make_psl_line('chr1', 100, 500),
+                    make_psl_line('chr2', 100, 500),
+                    make_psl_line('chr1', 300, 900)]
+        filename = self.write_bgzf('unsorted.psl.gz', lines)
+        self.assertRaises(ValueError, tabix.build_index, filename)
+        self.assertFalse(os.path.exists(filename + '.tbi'))
+
+    def test_not_bgzf(self):
+        filename = os.path.join(self.tmpdir, 'lines.bed.gz')
+        with gzip.open(filename, 'wb') as fp:
+            fp.write(''.join(make_bed_lines(10)))
+        self.assertRaises(ValueError, tabix.build_index, filename)
@@ -0,0 +1,57 @@
+'''Please run nosetests from a program main directory.'''
+
+import sys
+import os
+import signal
+import time
+
+from unittest import TestCase
+
+source_path = os.path.abspath('src')
+if source_path not in sys.path:
+    sys.path.append(source_path)
+
+from utils import watchdog
+
+
+class TestBudget(TestCase):
+    def test_time_limit(self):
+        budget = watchdog.Budget(time_limit=0.05, interval=0.01)
+        start = time.time()
+        try:
+            with budget:
+                while True:
+                    pass
+        except watchdog.BudgetExceeded as e:
+            self.assertEqual(e.reason, 'time')
+            self.assertEqual(e.limit, 0.05)
+        else:
+            self.fail('BudgetExceeded not raised')
+        self.assertTrue(time.time() - start < 1)
+
+    def test_memory_limit(self):
+        budget = watchdog.Budget(memory_limit=16 << 20, interval=0.01)
+        blocks = []
+        try:
+            with budget:
+                while True:
+                    blocks.append('x' * (1 << 20))
+                    time.sleep(0.001)
+        except watchdog.BudgetExceeded as e:
+            self.assertEqual(e.reason, 'memory')
+        else:
+            self.fail('BudgetExceeded not raised')
+        self.assertTrue(len(blocks) >= 16)
+
+    def test_within_budget(self):
+        budget = watchdog.Budget(time_limit=1, memory_limit=1 << 30)
+        handler = signal.getsignal(signal.SIGALRM)
+        for i in range(3):
+            with budget:
+                total = sum(range(1000))
+        self.assertEqual(total, 499500)
+        self.assertEqual(signal.getsignal(signal.SIGALRM), handler)
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+
+    def test_get_rss(self):
+        self.assertTrue(watchdog.get_rss() > 0)